@@ -0,0 +1,144 @@
+from flask import g, has_app_context, has_request_context, session as flask_session
+from sqlalchemy import event, inspect, or_, select, update
+from sqlalchemy.orm import Session
+from models import db, User, Space, SpaceMembership
+from redis_store import redis_for
+from versions import MemoryVersions, RedisVersions, VersionedCache
+
+
+# ---------------- Private spaces ----------------
+#
+# A private space and its discussions are visible to its creator and members
+# only. Every check goes through member_space_ids(user_id), the set of spaces
+# a user belongs to, memoized on g for the request and kept across requests in
+# a VersionedCache keyed by user id and membership_version. Adding or removing
+# members, directly or by deleting the space, bumps the affected users'
+# membership_version and publishes it on commit, like user cards do with
+# profile_version. A check against a cached set costs no query at all.
+
+class SpaceAccess:
+    def __init__(self, app=None):
+        self.cache = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if app.config["SPACE_ACCESS_BACKEND"] == "redis":
+            client = app.config.get("SESSION_REDIS") or redis_for(app)
+            versions = RedisVersions(client, app.config["SPACE_ACCESS_VERSION_TTL"], prefix="user:memberships:")
+        else:
+            versions = MemoryVersions()
+        self.cache = VersionedCache(versions, app.config["SPACE_ACCESS_CACHE_SIZE"])
+        app.teardown_request(self.teardown_request)
+
+    def teardown_request(self, exception):
+        g.pop("member_space_ids", None)
+
+    def _load(self, user_ids):
+        rows = db.session.execute(
+            select(User.id, User.membership_version, SpaceMembership.space_id)
+            .outerjoin(SpaceMembership, SpaceMembership.user_id == User.id)
+            .where(User.id.in_(user_ids))
+        )
+        loaded = {}
+        for user_id, version, space_id in rows:
+            _, space_ids = loaded.setdefault(user_id, (version, set()))
+            if space_id is not None:
+                space_ids.add(space_id)
+        return {user_id: (version, frozenset(space_ids)) for user_id, (version, space_ids) in loaded.items()}
+
+    def member_space_ids(self, user_id):
+        if not user_id:
+            return frozenset()
+        memo = g.setdefault("member_space_ids", {}) if has_request_context() else {}
+        if user_id not in memo:
+            entry = self.cache.get_many([user_id], self._load).get(user_id)
+            memo[user_id] = entry[1] if entry else frozenset()
+        return memo[user_id]
+
+
+space_access = SpaceAccess()
+
+
+def viewer_id():
+    return flask_session.get("user_id") if has_request_context() else None
+
+
+def member_space_ids(user_id):
+    """Return the ids of the spaces user_id is a member of."""
+    return space_access.member_space_ids(user_id)
+
+
+def can_view_space(space, user_id=None):
+    user_id = user_id or viewer_id()
+    return space.is_public is not False or (user_id is not None and (
+        space.creator_id == user_id or space.id in member_space_ids(user_id)
+    ))
+
+
+def visible_space_ids(space_ids, user_id=None):
+    """Return the subset of space_ids the user may see. Spaces the user is a
+    member of are answered from the cache; only the rest are looked up."""
+    user_id = user_id or viewer_id()
+    space_ids = set(space_ids)
+    visible = space_ids & member_space_ids(user_id)
+    rest = space_ids - visible
+    if rest:
+        visible.update(db.session.scalars(
+            select(Space.id).where(Space.id.in_(rest), visible_spaces(user_id, with_members=False))
+        ))
+    return visible
+
+
+def visible_spaces(user_id=None, with_members=True):
+    """A filter on Space for the spaces the user may see, for list queries."""
+    user_id = user_id or viewer_id()
+    conditions = [Space.is_public.isnot(False)]
+    if user_id:
+        conditions.append(Space.creator_id == user_id)
+        if with_members:
+            conditions.append(Space.id.in_(member_space_ids(user_id)))
+    return or_(*conditions)
+
+
+# ---------------- Membership versions ----------------
+
+@event.listens_for(Session, "before_flush")
+def _collect_membership_changes(session, flush_context, instances):
+    changed = set()
+    for obj in (*session.new, *session.dirty):
+        if isinstance(obj, Space):
+            history = inspect(obj).attrs.members.history
+            changed.update(member.id for member in (*history.added, *history.deleted))
+    for obj in session.deleted:
+        if isinstance(obj, Space):
+            changed.update(member.id for member in obj.members)
+    if changed:
+        session.info.setdefault("changed_memberships", set()).update(changed)
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _bump_membership_versions(session, flush_context):
+    changed = session.info.pop("changed_memberships", None)
+    if changed:
+        # Incremented in SQL so concurrent writers can't both publish the same version
+        session.execute(
+            update(User).where(User.id.in_(changed)).values(membership_version=User.membership_version + 1),
+            execution_options={"synchronize_session": False},
+        )
+        rows = session.execute(select(User.id, User.membership_version).where(User.id.in_(changed)))
+        session.info.setdefault("membership_versions", {}).update(rows.all())
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_membership_versions(session):
+    versions = session.info.pop("membership_versions", None)
+    if versions and has_app_context() and space_access.cache is not None:
+        for user_id, version in versions.items():
+            space_access.cache.publish(user_id, version)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_membership_versions(session, previous_transaction):
+    session.info.pop("changed_memberships", None)
+    session.info.pop("membership_versions", None)
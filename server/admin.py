@@ -0,0 +1,112 @@
+from flask_admin import Admin
+from flask_admin.contrib.sqla import ModelView
+from sqlalchemy import UniqueConstraint, text
+from sqlalchemy.orm import joinedload
+from models import db, User, Post, Comment, Space, Discussion, DiscussionComment
+from fts import has_fts, fts_query, fts_filter
+
+
+def estimate_row_count(model):
+    table = model.__table__.name
+    dialect = db.engine.dialect.name
+
+    if dialect == "sqlite":
+        # MAX(rowid) is answered from the end of the table b-tree; it overcounts
+        # after deletes, which is fine for sizing the pager
+        return db.session.execute(text(f"SELECT MAX(rowid) FROM {table}")).scalar() or 0
+    if dialect == "postgresql":
+        return db.session.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE relname = :table"),
+            {"table": table},
+        ).scalar() or 0
+
+    return db.session.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+
+
+def indexed_columns(model):
+    # Columns that lead the primary key, a unique constraint or an index, so
+    # ORDER BY on them is an index walk instead of a sort of the whole table
+    table = model.__table__
+    leading = [list(table.primary_key.columns)[0]]
+    leading += [list(index.columns)[0] for index in table.indexes]
+    leading += [
+        list(constraint.columns)[0] for constraint in table.constraints
+        if isinstance(constraint, UniqueConstraint) and constraint.columns
+    ]
+    leading += [column for column in table.columns if column.unique or column.index]
+    return tuple(dict.fromkeys(column.key for column in leading))
+
+
+class ScalableModelView(ModelView):
+    page_size = 50
+    can_set_page_size = False
+
+    # Relationships rendered in the list, loaded with the page instead of per row
+    list_eager_loads = ()
+
+    def __init__(self, model, session, **kwargs):
+        self.column_sortable_list = indexed_columns(model)
+        super().__init__(model, session, **kwargs)
+
+    def get_query(self):
+        return super().get_query().options(*[loader() for loader in self.list_eager_loads])
+
+    def _apply_search(self, query, count_query, joins, count_joins, search):
+        if not has_fts(self.model) or db.engine.dialect.name != "sqlite":
+            return super()._apply_search(query, count_query, joins, count_joins, search)
+
+        if not fts_query(search):
+            return query, count_query, joins, count_joins
+
+        query = query.filter(fts_filter(self.model, search))
+        if count_query is not None:
+            count_query = count_query.filter(fts_filter(self.model, search))
+        return query, count_query, joins, count_joins
+
+    def get_list(self, page, sort_column, sort_desc, search, filters, execute=True, page_size=None):
+        if search or filters:
+            # Searches are narrowed by the FTS index, so an exact count is cheap
+            return super().get_list(page, sort_column, sort_desc, search, filters, execute, page_size)
+
+        query, _ = self._apply_sorting(self.get_query(), {}, sort_column, sort_desc)
+        query = self._apply_pagination(query, page, page_size)
+        if execute:
+            query = query.all()
+
+        return estimate_row_count(self.model), query
+
+
+class UserView(ScalableModelView):
+    column_exclude_list = ("password",)
+    column_searchable_list = ("first_name", "last_name", "email", "occupation")
+
+
+class PostView(ScalableModelView):
+    column_list = ("user", "first_name", "last_name", "content", "post_image", "created_at")
+    column_searchable_list = ("content", "first_name", "last_name")
+    list_eager_loads = (
+        lambda: joinedload(Post.user).load_only(User.first_name, User.last_name, User.email),
+    )
+
+
+class CommentView(ScalableModelView):
+    column_list = ("user", "post", "content", "created_at")
+    column_searchable_list = ("content",)
+    list_eager_loads = (
+        lambda: joinedload(Comment.user).load_only(User.first_name, User.last_name, User.email),
+        lambda: joinedload(Comment.post).load_only(Post.first_name, Post.last_name, Post.created_at),
+    )
+
+
+def init_admin(app):
+    admin = Admin()
+    admin.init_app(app)
+
+    admin.add_view(UserView(User, db.session))
+    admin.add_view(PostView(Post, db.session))
+    admin.add_view(CommentView(Comment, db.session))
+    admin.add_view(ScalableModelView(Space, db.session))
+    admin.add_view(ScalableModelView(Discussion, db.session))
+    admin.add_view(ScalableModelView(DiscussionComment, db.session))
+
+    return admin
@@ -1,43 +1,116 @@
 import re
-from flask import Flask, request, jsonify, session, render_template, send_from_directory, redirect
+from flask import Flask, Blueprint, request, jsonify, session, render_template, send_from_directory, redirect, current_app, stream_with_context
 from flask_bcrypt import Bcrypt
 from flask_cors import CORS, cross_origin
-from flask_session import Session
 from flask_migrate import Migrate
 from sqlalchemy import or_
 from sqlalchemy.orm.exc import StaleDataError
 from sqlalchemy.exc import SQLAlchemyError
-from flask_admin import Admin
-from flask_admin .contrib.sqla import ModelView
+import click
+from flask.cli import with_appcontext
 import os
 from config import ApplicationConfig
-from models import db, User, Post, Comment, Space, Discussion, DiscussionComment, likes_association, dislikes_association
+from models import db, User, Post, Comment, Space, Discussion, DiscussionComment, Upload, friends_association, likes_association, dislikes_association
+from projection import post_projection, user_projection, search_user_projection, search_space_projection, search_post_projection, requested_fields
+from redis_store import redis_for
+from sessions import init_session
+from fts import rebuild_fts
+from jobs import jobs_cli
+from tasks import save_image
+from jobs import enqueue
+from occupations import occupations_cli, similar_users
+from feed import feed_cli, fan_out_later, feed_cursor, parse_feed_cursor, read_feed, remove_post
+from trending import trending
+from ratelimit import rate_limiter
+from idempotency import idempotency
+from surrogate_keys import keys_cli
+from export import EXPORTS, export_command, export_lines
+from bulk_import import import_command
+from replicas import read_only, replicas, replicas_cli
+from partitions import partitions, discussions_cli
+from archive import archive, archive_cli
+from query_plans import compare_command
+from profiler import profiler, profile_cli
+from settings import user_settings, notification_preferences
+from uploads import UploadError, completed_upload, create_upload, uploads_cli, write_chunk
+from cards import cards, user_cards
+from access import space_access, can_view_space, member_space_ids, visible_space_ids, visible_spaces
+import hmac
 import traceback
 from string import ascii_uppercase
 
-app = Flask(__name__)
-app.config.from_object(ApplicationConfig)
 basedir = os.path.abspath(os.path.dirname(__file__))
-admin = Admin()
-
-bcrypt = Bcrypt(app)
-CORS(app, supports_credentials=True, resources={r"/*/*": {"origins": "*"}})
-server_session = Session(app)
-db.init_app(app)
-admin.init_app(app)
-migrate = Migrate(app, db)
-
-admin.add_view(ModelView(User, db.session))
-admin.add_view(ModelView(Post, db.session))
-admin.add_view(ModelView(Comment, db.session))
-admin.add_view(ModelView(Space, db.session))
-admin.add_view(ModelView(Discussion, db.session))
-admin.add_view(ModelView(DiscussionComment, db.session))
-
-with app.app_context():
-    db.create_all()
 
-@app.route("/@me", methods=['POST'])
+api = Blueprint("api", __name__)
+bcrypt = Bcrypt()
+migrate = Migrate()
+
+def create_app(config_class=ApplicationConfig):
+    app = Flask(__name__)
+    app.config.from_object(config_class)
+    # Spawned job workers build their apps from the same class
+    app.config["CONFIG_CLASS"] = config_class
+
+    # Only connect the session store to Redis when it is actually used
+    if app.config["SESSION_TYPE"] == "redis" and app.config.get("SESSION_REDIS") is None:
+        app.config["SESSION_REDIS"] = redis_for(app)
+
+    bcrypt.init_app(app)
+    CORS(app, supports_credentials=True, resources={r"/*/*": {"origins": "*"}})
+    init_session(app)
+    db.init_app(app)
+    replicas.init_app(app)
+    partitions.init_app(app)
+    archive.init_app(app)
+    user_settings.init_app(app)
+    cards.init_app(app)
+    space_access.init_app(app)
+    migrate.init_app(app, db)
+    trending.init_app(app)
+    rate_limiter.init_app(app)
+    idempotency.init_app(app)
+    profiler.init_app(app)
+    app.register_blueprint(api)
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(rebuild_fts_command)
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(occupations_cli)
+    app.cli.add_command(feed_cli)
+    app.cli.add_command(keys_cli)
+    app.cli.add_command(export_command)
+    app.cli.add_command(import_command)
+    app.cli.add_command(replicas_cli)
+    app.cli.add_command(uploads_cli)
+    app.cli.add_command(discussions_cli)
+    app.cli.add_command(archive_cli)
+    app.cli.add_command(compare_command)
+    app.cli.add_command(profile_cli)
+
+    if app.config["ADMIN_ENABLED"]:
+        # Flask-Admin and its views are only imported by processes that serve them
+        from admin import init_admin
+        init_admin(app)
+
+    return app
+
+@click.command("init-db")
+@with_appcontext
+def init_db_command():
+    """Create any missing tables for the configured database."""
+    db.create_all()
+    partitions.create_all()
+    archive.create_all()
+    click.echo("Database tables created.")
+
+@click.command("rebuild-fts")
+@with_appcontext
+def rebuild_fts_command():
+    """Create the full-text search tables and reindex existing rows."""
+    with db.engine.begin() as connection:
+        rebuild_fts(connection)
+    click.echo("Full-text search index rebuilt.")
+
+@api.route("/@me", methods=['POST'])
 def get_current_user():
     user_id = session.get("user_id")
 
@@ -50,37 +123,29 @@ def get_current_user():
         "email": user.email
     }) 
 
-@app.route("/users/<email>", methods=["GET"])
+@api.route("/users/<email>", methods=["GET"])
 def get_user_by_email(email):
     try:
-        user = User.query.filter_by(email=email).first()
+        fields = requested_fields(user_projection)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        user = user_projection.query(fields).filter_by(email=email).first()
 
         if not user:
             return jsonify({"error": "User not found"}), 404
-        
-        space_list = [{
-                "id": space.id,
-                "title": space.title,
-            } for space in user.spaces]
 
-        return jsonify({
-            "id": user.id,
-            "email": user.email,
-            "firstName": user.first_name,
-            "lastName": user.last_name,
-            "occupation": user.occupation,
-            "user_picture": user.picture_path,
-            "user_space": space_list,
-        })
+        return jsonify(user_projection.serialize(user, fields))
 
     except Exception as e:
         return jsonify({"error": f"Internal Server Error: {str(e)}"}), 500
     
-@app.route('/assets/<path:filename>')
+@api.route('/assets/<path:filename>')
 def serve_static(filename):
     return send_from_directory('assets', filename)
     
-@app.route("/register", methods=["POST"])
+@api.route("/register", methods=["POST"])
 def register_user():
     try:
         data = request.get_json()
@@ -128,16 +193,17 @@ def register_user():
         if user_picture:
             print(user_picture)
             # Process and save the picture as needed
-            user_picture_path = os.path.join(basedir, "assets", user_picture.filename)
-            user_picture.save(user_picture_path)
+            picture_path = save_image(user_picture)
             
-            new_user = User(first_name=first_name, last_name=last_name, email=email, password=hashed_password, picture_path=user_picture.filename, occupation=occupation)
+            new_user = User(first_name=first_name, last_name=last_name, email=email, password=hashed_password, picture_path=picture_path, occupation=occupation)
             
         else: 
             new_user = User(first_name=first_name, last_name=last_name, email=email, password=hashed_password, occupation=occupation)
         
         print(response_data)
         db.session.add(new_user)
+        db.session.flush()
+        enqueue("refresh_occupation_matches", {"user_id": new_user.id})
         db.session.commit()
 
         session["user_id"] = new_user.id
@@ -169,7 +235,7 @@ def register_user():
         print(e)
         return jsonify({"error": f"Internal Server Error: {str(e)}"}), 500
 
-@app.route("/login", methods=["POST"])
+@api.route("/login", methods=["POST"])
 def login_user():
     try:
         data = request.get_json()
@@ -211,12 +277,12 @@ def login_user():
         print(e)
         return jsonify({"error": f"Internal Server Error: {str(e)}"}), 500
 
-@app.route("/logout", methods=["POST"])
+@api.route("/logout", methods=["POST"])
 def logout_user():
     session.pop("user_id", None)
     return jsonify({"message": "Successfully logged out"}), 200
 
-@app.route("/additional-details", methods=["POST"])
+@api.route("/additional-details", methods=["POST"])
 def additional_details():
     user_picture = request.files.get("picture")
     user_id = session.get("user_id")
@@ -225,14 +291,26 @@ def additional_details():
     if not user:
         return jsonify({"error": "User not found"}), 400
     
-    if user_picture:
+    upload_id = request.form.get("upload_id")
+    if upload_id:
+        picture_path = completed_upload(user.id, upload_id)
+        if picture_path is None:
+            return jsonify({"error": "Upload is not complete"}), 400
+        user.picture_path = picture_path
+        db.session.commit()
+
+    elif user_picture:
             print(user_picture)
             # Process and save the picture as needed
-            user_picture_path = os.path.join(basedir, "assets", user_picture.filename)
-            user_picture.save(user_picture_path)
-            user.picture_path = user_picture.filename
+            user.picture_path = save_image(user_picture)
             
             db.session.commit()
+
+    occupation = request.form.get("occupation")
+    if occupation and occupation != user.occupation:
+        user.occupation = occupation
+        enqueue("refresh_occupation_matches", {"user_id": user.id})
+        db.session.commit()
     
     friends_list = [{
                 "id": friend.id,
@@ -251,33 +329,125 @@ def additional_details():
             "occupation": user.occupation,
         })       
    
-users_settings = {}
+def parse_if_match(value):
+    """Return the settings version named by an If-Match header, or None to skip the check."""
+    if value is None or value.strip() == "*":
+        return None
+    match = re.fullmatch(r'\s*(?:W/)?"(\d+)"\s*', value)
+    if match is None:
+        raise ValueError("If-Match must be a quoted version ETag")
+    return int(match.group(1))
+
+@api.route("/settings", methods=["GET", "PATCH"])
+def handle_settings():
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    try:
+        if request.method == "GET":
+            version, settings = user_settings.get(user_id)
+        else:
+            patch = request.get_json(silent=True)
+            if not isinstance(patch, dict):
+                return jsonify({"error": "Expected a JSON merge patch object"}), 400
+
+            try:
+                expected_version = parse_if_match(request.headers.get("If-Match"))
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            version, settings = user_settings.patch(user_id, patch, expected_version)
+
+        response = jsonify({"settings": settings, "version": version})
+        response.set_etag(str(version))
+        return response
+
+    except StaleDataError as e:
+        db.session.rollback()
+        return jsonify({"error": "Settings were changed by another request"}), 412
+    except Exception as e:
+        db.session.rollback()
+        print(e)
+        return jsonify({"error": f"Internal Server Error: {str(e)}"}), 500
 
-@app.route('/update-settings', methods=['POST'])
+@api.route('/update-settings', methods=['POST'])
 def update_settings():
     data = request.json
+    user_id = session.get("user_id")
+    user = User.query.filter_by(id=user_id).first()
 
-    # Extracting data from the request
-    user_id = data.get('user_id')  
-    first_name = data.get('firstName')
-    last_name = data.get('lastName')
-    email = data.get('email')
-    password = data.get('password')
-    notification_preferences = data.get('notificationPreferences')
+    if not user:
+        return jsonify({"error": "Unauthorized"}), 401
 
-    # Update user settings in backend logic
-    # to perform validation, authentication, and then update the settings accordingly
-    users_settings[user_id] = {
-        'firstName': first_name,
-        'lastName': last_name,
-        'email': email,
-        'password': password,
-        'notification_preferences': notification_preferences
-    }
+    # Names belong to the profile; only preferences go into the settings document
+    user.first_name = data.get('firstName') or user.first_name
+    user.last_name = data.get('lastName') or user.last_name
+
+    notification_preferences = data.get('notificationPreferences')
+    try:
+        if notification_preferences is not None:
+            user_settings.patch(user_id, {'notification_preferences': notification_preferences})
+        else:
+            db.session.commit()
+    except StaleDataError:
+        # No If-Match here, so a concurrent write is a conflict to retry rather than a failed precondition
+        db.session.rollback()
+        return jsonify({"error": "Settings were changed by another request"}), 409
 
     return jsonify({'message': 'User settings updated successfully'})
 
-@app.route("/posts", methods=["POST"])
+# ---------------- Uploads ----------------
+
+def upload_status(upload):
+    response = jsonify({
+        "id": upload.id,
+        "offset": upload.offset,
+        "size": upload.size,
+        "status": upload.status,
+        "path": upload.path,
+    })
+    response.headers["Upload-Offset"] = str(upload.offset)
+    return response
+
+@api.route("/uploads", methods=["POST"])
+def start_upload():
+    user_id = session.get("user_id")
+    if user_id is None:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    data = request.get_json(silent=True) or {}
+    try:
+        upload = create_upload(user_id, data.get("filename"), data.get("size"), data.get("sha256"))
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+
+    return upload_status(upload), 201
+
+@api.route("/uploads/<string:upload_id>", methods=["GET", "PATCH"])
+def upload_chunk(upload_id):
+    user_id = session.get("user_id")
+    if user_id is None:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    upload = Upload.query.filter_by(id=upload_id, user_id=user_id).first()
+    if not upload:
+        return jsonify({"error": "Upload not found"}), 404
+
+    if request.method == "GET":
+        return upload_status(upload)
+
+    offset = request.headers.get("Upload-Offset", type=int)
+    if offset is None:
+        return jsonify({"error": "Upload-Offset is required"}), 400
+
+    try:
+        write_chunk(upload, offset, request.stream, request.content_length, request.headers.get("Upload-Checksum"))
+    except UploadError as e:
+        return jsonify({"error": str(e), "offset": upload.offset}), e.status, {"Upload-Offset": str(upload.offset)}
+
+    return upload_status(upload)
+
+@api.route("/posts", methods=["POST"])
 def create_post():
     try:
         user_id = session.get("user_id")
@@ -296,8 +466,7 @@ def create_post():
         content = request.form.get("description")
         created_at = request.form.get("created_at")
         picture = request.files.get("picture")
-        last_name = request.form.get("lastName")
-        first_name = request.form.get("firstName")
+        upload_id = request.form.get("upload_id")
 
         print("Content:", content)
 
@@ -305,42 +474,28 @@ def create_post():
             print("no content found")
             return jsonify({"error": "Content is required"}), 400
 
-        if picture:
+        if upload_id:
+            picture_path = completed_upload(user.id, upload_id)
+            if picture_path is None:
+                return jsonify({"error": "Upload is not complete"}), 400
+            new_post = Post(user_id=user.id, content=content, created_at=created_at, post_image=picture_path, last_name=user.last_name, first_name=user.first_name)
+
+        elif picture:
             print(picture)
             # Process and save the picture as needed
-            picture_path = os.path.join(basedir, "assets", picture.filename)
-            picture.save(picture_path)
-            new_post = Post(user_id=user.id, content=content, created_at=created_at, post_image=picture.filename, last_name=last_name, first_name=first_name)
+            picture_path = save_image(picture)
+            new_post = Post(user_id=user.id, content=content, created_at=created_at, post_image=picture_path, last_name=user.last_name, first_name=user.first_name)
 
         else:
-            new_post = Post(user_id=user.id, content=content, created_at=created_at, last_name=last_name, first_name=first_name)
+            new_post = Post(user_id=user.id, content=content, created_at=created_at, last_name=user.last_name, first_name=user.first_name)
 
 
         db.session.add(new_post)
+        db.session.flush()
+        fan_out_later(new_post)
         db.session.commit()
-        posts = Post.query.all()
-       
-
-        post_list = [{
-            "id": post.id,
-            "user_id": post.user_id,
-            "content": post.content,
-            "created_at": post.created_at,
-            "picture": post.post_image,
-            "lastName": post.last_name,
-            "firstName": post.first_name,
-            "userPicturePath": post.user.picture_path,
-            "likes": post.like_count,
-            "dislikes": post.dislike_count,
-            "comments": [{
-                "content": comment.content,
-                "user_id": comment.user_id,
-                "post_id": comment.post_id,
-                "firstName": comment.user.first_name,
-                "lastName": comment.user.last_name,
-                "userPicturePath": comment.user.picture_path,
-            } for comment in Comment.query.filter_by(post_id=post.id).all()]
-        } for post in posts]
+        fields = list(post_projection.fields)
+        post_list = post_projection.serialize_many(post_projection.query(fields).all(), fields)
 
         return jsonify(post_list)
     
@@ -348,103 +503,109 @@ def create_post():
         print(e)
         return jsonify({"error": f"Internal Server Error: {str(e)}"}), 500
 
-@app.route("/posts", methods=["GET"])
+def list_posts(session, fields):
+    posts = session.scalars(post_projection.statement(fields)).all()
+    return post_projection.serialize_many(posts, fields)
+
+@api.route("/posts", methods=["GET"])
 def get_all_posts():
     try:
-        posts = Post.query.all()
+        fields = requested_fields(post_projection)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        post_list = [{
-            "id": post.id,
-            "user_id": post.user_id,
-            "content": post.content,
-            "created_at": post.created_at,
-            "picture": post.post_image,
-            "lastName": post.last_name,
-            "firstName": post.first_name,
-            "userPicturePath": post.user.picture_path,
-            "likes": post.like_count,
-            "dislikes": post.dislike_count,
-            "comments": [{
-                "content": comment.content,
-                "user_id": comment.user_id,
-                "post_id": comment.post_id,
-                "firstName": comment.user.first_name,
-                "lastName": comment.user.last_name,
-                "userPicturePath": comment.user.picture_path,
-            } for comment in post.comments]
-        } for post in posts]
+    try:
+        post_list = list_posts(db.session, fields)
 
         return jsonify(post_list)
     except Exception as e:
         return jsonify({"error": f"Internal Server Error: {str(e)}"}), 500
     
-@app.route("/delete/<id>", methods=["POST", "OPTIONS"])
+@api.route("/feed", methods=["GET"])
+def get_feed():
+    user_id = session.get("user_id")
+
+    if not user_id:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    user = User.query.filter_by(id=user_id).first()
+
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    limit = max(1, min(request.args.get("limit", 20, type=int), 100))
+    try:
+        before = parse_feed_cursor(request.args.get("before"))
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
+
+    try:
+        fields = requested_fields(post_projection)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        entries = read_feed(user, limit, before)
+        post_ids = [post_id for post_id, _ in entries]
+        posts = {post.id: post for post in post_projection.query(fields).filter(Post.id.in_(post_ids))}
+
+        return jsonify({
+            "posts": post_projection.serialize_many([posts[post_id] for post_id in post_ids if post_id in posts], fields),
+            "nextCursor": feed_cursor(entries[-1]) if len(entries) == limit else None,
+        })
+    except Exception as e:
+        return jsonify({"error": f"Internal Server Error: {str(e)}"}), 500
+
+@api.route("/delete/<id>", methods=["POST", "OPTIONS"])
 @cross_origin(supports_credentials=True)
 def delete_post(id):
     if request.method == "OPTIONS":
         return jsonify(), 200
 
-    post = Post.query.get(id)
     user_id = session.get('user_id')
     logged_user = User.query.filter_by(id=user_id).first()
     
     if not logged_user:
             return jsonify({"error": "User not found"}), 404
 
+    post = Post.query.filter_by(id=id).first()
     if not post:
-        return jsonify({"Error": "Post not found"}), 404
-
-    try:
-        # Delete all comments associated with the post
-        for comment in post.comments:
-            db.session.delete(comment)
-            db.session.commit()
+        # An archived post is deleted where it lies instead of being moved back first
+        if not archive.delete(id):
+            return jsonify({"Error": "Post not found"}), 404
+    else:
+        try:
+            # Delete all comments associated with the post
+            for comment in post.comments:
+                db.session.delete(comment)
+                db.session.commit()
 
-        # Delete the likes and dislikes associated with the post
-        db.session.query(likes_association).filter(likes_association.c.post_id == post.id).delete()
-        db.session.query(dislikes_association).filter(dislikes_association.c.post_id == post.id).delete()
+            # Delete the likes and dislikes associated with the post
+            db.session.query(likes_association).filter(likes_association.c.post_pk == post.pk).delete()
+            db.session.query(dislikes_association).filter(dislikes_association.c.post_pk == post.pk).delete()
+            remove_post(post.id)
 
-        # Delete the post
-        db.session.delete(post)
-        db.session.commit()
-    except StaleDataError as e:
-        db.session.rollback()
-        print(e)
-        return jsonify({"Error": "Stale Data Error - Row may have been deleted by another process"}), 500
-    except Exception as e:
-        db.session.rollback()
-        print(e)
-        return jsonify({"Error": f"Internal Server Error: {str(e)}"}), 500
+            # Delete the post
+            db.session.delete(post)
+            db.session.commit()
+        except StaleDataError as e:
+            db.session.rollback()
+            print(e)
+            return jsonify({"Error": "Stale Data Error - Row may have been deleted by another process"}), 500
+        except Exception as e:
+            db.session.rollback()
+            print(e)
+            return jsonify({"Error": f"Internal Server Error: {str(e)}"}), 500
 
     # Retrieve all the updated posts
-    posts = Post.query.all()
-
-    post_list = [{
-        "id": post.id,
-        "user_id": post.user_id,
-        "content": post.content,
-        "created_at": post.created_at,
-        "picture": post.post_image,
-        "lastName": post.last_name,
-        "firstName": post.first_name,
-        "userPicturePath": post.user.picture_path,
-        "likes": post.like_count,
-        "dislikes": post.dislike_count,
-        "comments": [{
-            "content": comment.content,
-            "user_id": comment.user_id,
-            "post_id": comment.post_id,
-            "firstName": comment.user.first_name,
-            "lastName": comment.user.last_name,
-            "userPicturePath": comment.user.picture_path,
-        } for comment in Comment.query.filter_by(post_id=post.id).all()]
-    } for post in posts]
+    fields = list(post_projection.fields)
+    post_list = post_projection.serialize_many(post_projection.query(fields).all(), fields)
     
     return jsonify(post_list), 200
 
-@app.route("/users/<user_id>/friends", methods=["GET"])
+@api.route("/users/<user_id>/friends", methods=["GET"])
 def get_friends(user_id):
-    user = User.query.get(user_id)
+    user = User.query.filter_by(id=user_id).first()
 
     if not user:
             return jsonify({"error": "User or friend not found"}), 404
@@ -464,7 +625,36 @@ def get_friends(user_id):
 
     return response
 
-@app.route("/users/<user_id>/<friend_id>", methods=["PATCH", "DELETE"])
+@api.route("/users/<user_id>/similar", methods=["GET"])
+def get_similar_users(user_id):
+    page = request.args.get("page", 1, type=int)
+    per_page = min(request.args.get("per_page", 20, type=int), 100)
+
+    if page < 1 or per_page < 1:
+        return jsonify({"error": "page and per_page must be positive"}), 400
+
+    user = User.query.filter_by(id=user_id).first()
+
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    matches, has_more = similar_users(user, page, per_page)
+
+    return jsonify({
+        "users": [{
+            "id": match.id,
+            "firstName": match.first_name,
+            "lastName": match.last_name,
+            "occupation": match.occupation,
+            "picturePath": match.picture_path,
+            "score": score,
+        } for match, score in matches],
+        "page": page,
+        "perPage": per_page,
+        "hasMore": has_more,
+    })
+
+@api.route("/users/<user_id>/<friend_id>", methods=["PATCH", "DELETE"])
 @cross_origin(supports_credentials=True)
 def update_friend_list(user_id, friend_id):
     if request.method == "DELETE":
@@ -538,7 +728,21 @@ def update_friend_list(user_id, friend_id):
             print(f"Error during friend addition: {e}")
             return jsonify({"error": f"Internal Server Error: {str(e)}"}), 500     
         
-@app.route("/posts/<post_id>/like", methods=["PATCH"])
+@api.route("/posts/<post_id>", methods=["GET"])
+def get_post(post_id):
+    try:
+        fields = requested_fields(post_projection)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Archived posts are read from the cold store without moving them back
+    post = post_projection.query(fields).filter_by(id=post_id).first() or archive.load(post_id)
+    if not post:
+        return jsonify({"error": "Post not found"}), 404
+
+    return jsonify(post_projection.serialize_many([post], fields)[0])
+
+@api.route("/posts/<post_id>/like", methods=["PATCH"])
 def like_post(post_id):
     try:
         user_id = session.get("user_id")
@@ -552,18 +756,19 @@ def like_post(post_id):
         if not user:
             return jsonify({"error": "User not found"}), 404
 
-        post = Post.query.filter_by(id=post_id).first()
+        post = Post.query.filter_by(id=post_id).first() or archive.restore(post_id)
 
         if not post:
             return jsonify({"error": "Post not found"}), 404
 
-        if post in user.liked:
+        if post in user.liked_posts:
             return jsonify({"error": "User already liked the post"}), 400
         if user in post.disliked_by:
             post.disliked_by.remove(user)
 
-        user.liked.append(post)
+        user.liked_posts.append(post)
         db.session.commit()
+        trending.record("posts", post.id, "like")
         
         post_data = {
             "id": post.id,
@@ -585,7 +790,7 @@ def like_post(post_id):
         print(e)
         return jsonify({"error": f"Internal Server Error: {str(e)}"}), 500
     
-@app.route("/posts/<post_id>/dislike", methods=["PATCH"])
+@api.route("/posts/<post_id>/dislike", methods=["PATCH"])
 def dislike_post(post_id):
     try:
         user_id = session.get("user_id")
@@ -598,7 +803,7 @@ def dislike_post(post_id):
         if not user:
             return jsonify({"error": "User not found"}), 404
 
-        post = Post.query.filter_by(id=post_id).first()
+        post = Post.query.filter_by(id=post_id).first() or archive.restore(post_id)
 
         if not post:
             return jsonify({"error": "Post not found"}), 404
@@ -607,13 +812,14 @@ def dislike_post(post_id):
 
         post.disliked_by.append(user)
         db.session.commit()
+        trending.record("posts", post.id, "dislike")
         return jsonify({"message": "Post dislike successful"}), 200
 
     except Exception as e:
         print(e)
         return jsonify({"error": f"Internal Server Error: {str(e)}"}), 500
     
-@app.route("/posts/<post_id>/comment", methods=["POST"])
+@api.route("/posts/<post_id>/comment", methods=["POST"])
 def post_comment(post_id):
     try:
         user_id = session.get("user_id")
@@ -626,7 +832,7 @@ def post_comment(post_id):
         if not user:
             return jsonify({"error": "User not found"}), 404
 
-        post = Post.query.filter_by(id=post_id).first()
+        post = Post.query.filter_by(id=post_id).first() or archive.restore(post_id)
 
         if not post:
             return jsonify({"error": "Post not found"}), 404
@@ -639,6 +845,7 @@ def post_comment(post_id):
         comment = Comment(user_id=user.id, post_id=post.id, content=content)
         post.comments.append(comment)
         db.session.commit()
+        trending.record("posts", post.id, "comment")
 
         return jsonify({"message": "Comment posted successfully"}), 200
 
@@ -646,16 +853,70 @@ def post_comment(post_id):
         print(e)
         return jsonify({"error": f"Internal Server Error: {str(e)}"}), 500
 
-@app.route("/spaces", methods=["POST"])
+@api.route("/trending/posts", methods=["GET"])
+def get_trending_posts():
+    limit = max(1, min(request.args.get("limit", 20, type=int), 100))
+    ranked = trending.top("posts", limit)
+
+    posts = {post.id: post for post in Post.query.filter(Post.id.in_([post_id for post_id, _ in ranked]))}
+    authors = user_cards(post.user_id for post in posts.values())
+
+    return jsonify([{
+        "id": post_id,
+        "content": posts[post_id].content,
+        "firstName": authors.get(posts[post_id].user_id, {}).get("firstName"),
+        "lastName": authors.get(posts[post_id].user_id, {}).get("lastName"),
+        "score": score,
+    } for post_id, score in ranked if post_id in posts])
+
+@api.route("/trending/spaces", methods=["GET"])
+def get_trending_spaces():
+    limit = max(1, min(request.args.get("limit", 20, type=int), 100))
+    ranked = trending.top("spaces", limit)
+
+    spaces = {space.id: space for space in Space.query.filter(Space.id.in_([space_id for space_id, _ in ranked]), visible_spaces())}
+
+    return jsonify([{
+        "id": space_id,
+        "title": spaces[space_id].title,
+        "isPublic": spaces[space_id].is_public,
+        "score": score,
+    } for space_id, score in ranked if space_id in spaces])
+
+@api.route("/export/<resource>", methods=["GET"])
+def export_resource(resource):
+    token = current_app.config["EXPORT_TOKEN"]
+    if not token:
+        return jsonify({"error": "Exports are disabled"}), 404
+
+    supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+    if not hmac.compare_digest(supplied.encode(), token.encode()):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    if resource not in EXPORTS:
+        return jsonify({"error": "Unknown export"}), 404
+
+    after = request.args.get("after")
+    batch_size = max(1, min(request.args.get("batch_size", 1000, type=int), 10000))
+    return current_app.response_class(
+        stream_with_context(export_lines(resource, after, batch_size)),
+        mimetype="application/x-ndjson",
+    )
+
+@api.route("/spaces", methods=["POST"])
 def create_space():
     try:
+        user_id = session.get("user_id")
+        if not user_id:
+            return jsonify({"error": "Unauthorized"}), 401
+
         data = request.get_json()
         title = data.get("title")
         is_public = data.get("isPublic", True)
 
         # Validate the data as needed
 
-        new_space = Space(title=title, is_public=is_public)
+        new_space = Space(title=title, is_public=is_public, creator_id=user_id)
         db.session.add(new_space)
         db.session.commit()
 
@@ -665,7 +926,7 @@ def create_space():
         print(e)
         return jsonify({"error": f"Internal Server Error: {str(e)}"}), 500
     
-@app.route("/spaces/<space_id>", methods=["GET"])
+@api.route("/spaces/<space_id>", methods=["GET"])
 def get_space(space_id):
     try:
         space = Space.query.filter_by(id=space_id).first()
@@ -673,6 +934,9 @@ def get_space(space_id):
         if not space:
             return jsonify({"error": "Space not found"}), 404
 
+        if not can_view_space(space):
+            return jsonify({"error": "This space is private"}), 403
+
         space_data = {
             "id": space.id,
             "title": space.title,
@@ -686,10 +950,10 @@ def get_space(space_id):
         print(e)
         return jsonify({"error": f"Internal Server Error: {str(e)}"}), 500
     
-@app.route("/spaces", methods=["GET"])
+@api.route("/spaces", methods=["GET"])
 def get_spaces():
     try:
-        spaces = Space.query.all()
+        spaces = Space.query.filter(visible_spaces()).all()
         space_list = [{"id": space.id, "title": space.title, "isPublic": space.is_public} for space in spaces]
 
         return jsonify({"spaces": space_list}), 200
@@ -698,14 +962,14 @@ def get_spaces():
         print(e)
         return jsonify({"error": f"Internal Server Error: {str(e)}"}), 500
     
-@app.route("/users/<user_id>/spaces", methods=["GET"])
+@api.route("/users/<user_id>/spaces", methods=["GET"])
 def get_user_spaces(user_id):
     try:
-        user = User.query.get(user_id)
+        user = User.query.filter_by(id=user_id).first()
         if not user:
             return jsonify({"error": "User not found"}), 404
 
-        user_spaces = user.joined_spaces.all()
+        user_spaces = user.spaces.filter(visible_spaces()).all()
         space_list = [{"id": space.id, "title": space.title} for space in user_spaces]
         return jsonify({"spaces": space_list}), 200
 
@@ -714,9 +978,15 @@ def get_user_spaces(user_id):
         db.session.rollback()
         return jsonify({"error": f"Internal Server Error: {str(e)}"}), 500
     
-@app.route("/spaces/<space_id>/join", methods=["POST"])
+@api.route("/spaces/<space_id>/join", methods=["POST"])
 def join_space(space_id):
     try:
+        # Members join as themselves; the user comes from the session, never the body
+        user_id = session.get("user_id")
+        if not user_id:
+            print("Unauthorized: User not authenticated")
+            return jsonify({"error": "Unauthorized"}), 401
+
         # Check if the space exists
         space = Space.query.filter_by(id=space_id).first()
 
@@ -724,15 +994,13 @@ def join_space(space_id):
             print("Space not found")
             return jsonify({"error": "Space not found"}), 404
 
-        # Add the user to the space's members
-        user_id = request.json.get("user_id")  # Assuming user_id is sent in the request body
-
-        if not user_id:
-            print("No user ID provided")
-            return jsonify({"error": "No user ID provided"}), 400
+        # Only the creator adds members to a private space, through PUT /spaces/<id>/members
+        if space.is_public is False and space.creator_id != user_id:
+            return jsonify({"error": "This space is private"}), 403
 
         space.add_member(user_id)
         db.session.commit()
+        trending.record("spaces", space.id, "join")
 
         print("User joined the space successfully.")
 
@@ -743,22 +1011,21 @@ def join_space(space_id):
         db.session.rollback()
         return jsonify({"error": f"Internal Server Error: {str(e)}"}), 500
     
-@app.route("/spaces/<int:space_id>/leave", methods=["POST"])
+@api.route("/spaces/<space_id>/leave", methods=["POST"])
 def leave_space(space_id):
     try:
+        user_id = session.get("user_id")
+        if not user_id:
+            print("Unauthorized: User not authenticated")
+            return jsonify({"error": "Unauthorized"}), 401
+
         # Check if the space exists
         space = Space.query.filter_by(id=space_id).first()
         if not space:
             print("Space not found")
             return jsonify({"error": "Space not found"}), 404
         
-        # Remove the user from the space's members
-        user_id = request.json.get("user_id")
-        if not user_id:
-            print("No user ID provided")
-            return jsonify({"error": "No user ID provided"}), 400
-        
-        space.remove_member(user_id)  # Assuming you have a method to remove member
+        space.remove_member(user_id)
         db.session.commit()
         print("User left the space successfully.")
         return jsonify({"success": True, "message": "User left the space successfully."}), 200
@@ -768,7 +1035,7 @@ def leave_space(space_id):
         db.session.rollback()
         return jsonify({"error": f"Internal Server Error: {str(e)}"}), 500
     
-@app.route("/spaces/<int:space_id>", methods=["DELETE"])
+@api.route("/spaces/<space_id>", methods=["DELETE"])
 def delete_space(space_id):
     try:
         user_id = session.get("user_id")  # Retrieve user_id from the session
@@ -776,7 +1043,7 @@ def delete_space(space_id):
             print("Unauthorized: User not authenticated")
             return jsonify({"error": "Unauthorized"}), 401
 
-        user = User.query.get(user_id)
+        user = User.query.filter_by(id=user_id).first()
         if not user:
             print("User not found")
             return jsonify({"error": "User not found"}), 404
@@ -791,6 +1058,7 @@ def delete_space(space_id):
             print("Permission denied. User is not the creator of this space")
             return jsonify({"error": "Permission denied. You are not the creator of this space"}), 403
 
+        partitions.drop_space(space.id)
         db.session.delete(space)
         db.session.commit()
         print("Space deleted successfully")
@@ -801,7 +1069,7 @@ def delete_space(space_id):
         db.session.rollback()
         return jsonify({"error": f"Internal Server Error: {str(e)}"}), 500
     
-@app.route("/memberships", methods=["GET"])
+@api.route("/memberships", methods=["GET"])
 def get_membership():
     space_id = request.args.get('spaceId')
     user_id = request.args.get('userId')
@@ -813,16 +1081,20 @@ def get_membership():
     if not space:
         return jsonify({"error": "Space not found"}), 404
 
-    user = User.query.get(user_id)
+    user = User.query.filter_by(id=user_id).first()
     if not user:
         return jsonify({"error": "User not found"}), 404
 
-    is_member = space.is_member(user_id)
+    is_member = space.id in member_space_ids(user.id)
     return jsonify({"isMember": is_member})
 
-@app.route("/spaces/<space_id>/members", methods=["PUT"])
+@api.route("/spaces/<space_id>/members", methods=["PUT"])
 def update_membership(space_id):
     try:
+        user_id = session.get("user_id")
+        if not user_id:
+            return jsonify({"error": "Unauthorized"}), 401
+
         data = request.get_json()
         user_ids = data.get("userIds", [])
 
@@ -834,7 +1106,10 @@ def update_membership(space_id):
         if not space:
             return jsonify({"error": "Space not found"}), 404
 
-        space.members = [User.query.get(user_id) for user_id in user_ids]
+        if space.creator_id != user_id:
+            return jsonify({"error": "Permission denied. You are not the creator of this space"}), 403
+
+        space.members = User.query.filter(User.id.in_(user_ids)).all()
         db.session.commit()
 
         return jsonify({"success": True, "message": "Membership updated successfully"}), 200
@@ -845,7 +1120,7 @@ def update_membership(space_id):
         return jsonify({"error": f"Internal Server Error: {str(e)}"}), 500
     
 # Create and Get Discussions for a Space
-@app.route("/spaces/<space_id>/discussions", methods=["POST", "GET"])
+@api.route("/spaces/<space_id>/discussions", methods=["POST", "GET"])
 def handle_space_discussions(space_id):
     try:
         if request.method == "POST":
@@ -858,6 +1133,9 @@ def handle_space_discussions(space_id):
             if not space:
                 return jsonify({"error": "Space not found"}), 404
 
+            if not can_view_space(space):
+                return jsonify({"error": "This space is private"}), 403
+
             data = request.get_json()
             title = data.get("title")
             thoughts = data.get("thoughts")
@@ -866,8 +1144,8 @@ def handle_space_discussions(space_id):
                 return jsonify({"error": "Title and thoughts are required"}), 400
 
             new_discussion = Discussion(user_id=user_id, space_id=space.id, title=title, content=thoughts)
-            db.session.add(new_discussion)
-            db.session.commit()
+            if partitions.add(new_discussion) is None:
+                return jsonify({"error": "Space is being moved, try again shortly"}), 503
 
             return jsonify({
                 "discussion_id": new_discussion.id,
@@ -884,7 +1162,11 @@ def handle_space_discussions(space_id):
             if not space:
                 return jsonify({"error": "Space not found"}), 404
 
-            discussions = Discussion.query.filter_by(space_id=space.id).all()
+            if not can_view_space(space):
+                return jsonify({"error": "This space is private"}), 403
+
+            discussions = partitions.session_for_space(space.id).query(Discussion) \
+                .filter_by(space_id=space.id).order_by(Discussion.created_at.desc()).all()
             discussions_data = [{
                 "discussion_id": discussion.id,
                 "user_id": discussion.user_id,
@@ -901,14 +1183,17 @@ def handle_space_discussions(space_id):
         return jsonify({"error": f"Internal Server Error: {str(e)}"}), 500
 
 # Get, Update, and Delete Discussion Details
-@app.route("/discussions/<discussion_id>", methods=["GET", "PUT", "DELETE"])
+@api.route("/discussions/<discussion_id>", methods=["GET", "PUT", "DELETE"])
 def handle_discussion_details(discussion_id):
     try:
-        discussion = Discussion.query.filter_by(id=discussion_id).first()
+        partition, discussion = partitions.locate(discussion_id)
 
         if not discussion:
             return jsonify({"error": "Discussion not found"}), 404
 
+        if not visible_space_ids([discussion.space_id]):
+            return jsonify({"error": "This space is private"}), 403
+
         if request.method == "GET":
             # Get Discussion Details
             discussion_data = {
@@ -921,18 +1206,21 @@ def handle_discussion_details(discussion_id):
             }
             return jsonify(discussion_data)
 
-        elif request.method == "PUT":
+        if partitions.session_for_space(discussion.space_id, write=True) is None:
+            return jsonify({"error": "Space is being moved, try again shortly"}), 503
+
+        if request.method == "PUT":
             # Update Discussion
             data = request.get_json()
             discussion.title = data.get("title", discussion.title)
             discussion.content = data.get("content", discussion.content)
-            db.session.commit()
+            partition.commit()
             return jsonify({"message": "Discussion updated successfully"})
 
         elif request.method == "DELETE":
             # Delete Discussion
-            db.session.delete(discussion)
-            db.session.commit()
+            partition.delete(discussion)
+            partition.commit()
             return jsonify({"message": "Discussion deleted successfully"})
 
     except SQLAlchemyError as e:
@@ -940,17 +1228,21 @@ def handle_discussion_details(discussion_id):
         return jsonify({"error": f"Internal Server Error: {str(e)}"}), 500
 
 # Get Comments for a Discussion and Add Comment to a Discussion
-@app.route("/discussions/<discussion_id>/comments", methods=["GET", "POST"])
+@api.route("/discussions/<discussion_id>/comments", methods=["GET", "POST"])
 def handle_discussion_comments(discussion_id):
     try:
-        discussion = Discussion.query.filter_by(id=discussion_id).first()
+        partition, discussion = partitions.locate(discussion_id)
 
         if not discussion:
             return jsonify({"error": "Discussion not found"}), 404
 
+        if not visible_space_ids([discussion.space_id]):
+            return jsonify({"error": "This space is private"}), 403
+
         if request.method == "GET":
             # Get Comments for a Discussion
-            comments = DiscussionComment.query.filter_by(discussion_id=discussion.id).all()
+            comments = partition.query(DiscussionComment) \
+                .filter_by(discussion_id=discussion.id).order_by(DiscussionComment.created_at).all()
             comments_data = [{
                 "comment_id": comment.id,
                 "user_id": comment.user_id,
@@ -976,8 +1268,8 @@ def handle_discussion_comments(discussion_id):
                 return jsonify({"error": "Comment content is required"}), 400
 
             new_comment = DiscussionComment(user_id=user_id, title=discussion.title, discussion_id=discussion.id, space_id=discussion.space_id, content=content)
-            db.session.add(new_comment)
-            db.session.commit()
+            if partitions.add(new_comment) is None:
+                return jsonify({"error": "Space is being moved, try again shortly"}), 503
 
             return jsonify({
                 "comment_id": new_comment.id,
@@ -992,32 +1284,43 @@ def handle_discussion_comments(discussion_id):
         print(e)
         return jsonify({"error": f"Internal Server Error: {str(e)}"}), 500
     
-@app.route('/notifications/<string:user_id>', methods=['GET'])
-def get_notifications(user_id):
-    notification_type = request.args.get('type')
-    user = User.query.get(user_id)
-
-    if not user:
-        return jsonify({'error': 'User not found'}), 404
-    
+@api.route("/users/<user_id>/activity", methods=["GET"])
+def get_user_activity(user_id):
+    limit = max(1, min(request.args.get("limit", 20, type=int), 100))
+    activity = partitions.user_activity(user_id, limit)
+    visible = visible_space_ids(item.space_id for _, _, item in activity)
+
+    return jsonify([{
+        "type": kind,
+        "id": item.id,
+        "space_id": item.space_id,
+        "discussion_id": item.id if kind == "discussion" else item.discussion_id,
+        "title": item.title,
+        "content": item.content,
+        "created_at": created_at,
+    } for created_at, kind, item in activity if item.space_id in visible])
+
+def notification_items(session, user, wanted):
+    """Build the notifications of the kinds in `wanted`, querying through `session`."""
     notifications = []
 
-    if notification_type == "friends" or notification_type is None:
-        # Assuming "friends" involves retrieving users connected via an association table
-        friend_ids = [f.id for f in user.friends]
-        friends = User.query.filter(User.id.in_(friend_ids)).all()
-        for friend in friends:
+    if "friends" in wanted:
+        friend_ids = session.scalars(
+            db.select(User.id)
+            .join(friends_association, friends_association.c.friend_pk == User.pk)
+            .where(friends_association.c.user_pk == user.pk)
+        ).all()
+        for friend_id, friend in user_cards(friend_ids).items():
             notifications.append({
                 'type': 'friend',
-                'id': friend.id,
-                'first_name': friend.first_name,
-                'last_name': friend.last_name,
+                'id': friend_id,
+                'first_name': friend['firstName'],
+                'last_name': friend['lastName'],
             })
 
-    if notification_type == "comments" or notification_type is None:
-        posts = Post.query.filter_by(user_id=user_id).all()
-        post_ids = [post.id for post in posts]
-        comments = Comment.query.filter(Comment.post_id.in_(post_ids)).all()
+    if "comments" in wanted:
+        post_ids = session.scalars(db.select(Post.id).where(Post.user_id == user.id)).all()
+        comments = session.scalars(db.select(Comment).where(Comment.post_id.in_(post_ids))).all()
         for comment in comments:
             notifications.append({
                 'type': 'comment',
@@ -1027,33 +1330,37 @@ def get_notifications(user_id):
                 
             })
 
-    if notification_type == "likes" or notification_type is None:
-        posts = Post.query.filter_by(user_id=user_id).all()
-        for post in posts:
-            for like_user in post.likes:
-                notifications.append({
-                    'type': 'like',
-                    'post_id': post.id,
-                    'user_id': like_user.id,
-                    'first_name': like_user.first_name,
-                    'last_name': like_user.last_name,
-                })
-
-    if notification_type == "spaces" or notification_type is None:
-        spaces = Space.query.filter_by(creator_id=user_id).all()
+    if "likes" in wanted:
+        likes = session.execute(
+            db.select(Post.id, User.id)
+            .join(likes_association, likes_association.c.post_pk == Post.pk)
+            .join(User, User.pk == likes_association.c.user_pk)
+            .where(Post.user_id == user.id)
+        ).all()
+        likers = user_cards(liker_id for _, liker_id in likes)
+        for post_id, liker_id in likes:
+            notifications.append({
+                'type': 'like',
+                'post_id': post_id,
+                'user_id': liker_id,
+                'first_name': likers.get(liker_id, {}).get('firstName'),
+                'last_name': likers.get(liker_id, {}).get('lastName'),
+            })
+
+    if "spaces" in wanted:
+        spaces = session.scalars(db.select(Space).where(Space.creator_id == user.id)).all()
         for space in spaces:
             notifications.append({
                 'type': 'space',
                 'id': space.id,
                 'title': space.title,
                 'is_public': space.is_public,
-                'created_at': space.created_at,  
             })
 
-    if notification_type == "occupation" or notification_type is None:
+    if "occupation" in wanted:
         # the original route's intent to notify users of others with the same occupation
-        matches = User.query.filter(User.occupation == user.occupation, User.id != user_id).all()
-        for match in matches:
+        matches, _ = similar_users(user, per_page=20, session=session)
+        for match, score in matches:
             notifications.append({
                 'type': 'occupation',
                 'user_id': match.id,
@@ -1062,9 +1369,56 @@ def get_notifications(user_id):
                 'occupation': match.occupation,
             })
 
-    return jsonify(notifications)
+    return notifications
+
+def wanted_notifications(user_id, notification_type):
+    # Types the user has switched off are left out of the combined listing
+    if notification_type is None:
+        preferences = notification_preferences([user_id])[user_id]
+        return {kind for kind, enabled in preferences.items() if enabled}
+    return {notification_type}
 
-@app.route("/search", methods=["POST"])
+@api.route('/notifications/<string:user_id>', methods=['GET'])
+def get_notifications(user_id):
+    notification_type = request.args.get('type')
+    user = User.query.filter_by(id=user_id).first()
+
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+
+    wanted = wanted_notifications(user.id, notification_type)
+    return jsonify(notification_items(db.session, user, wanted))
+
+def search_results_for(session, query, user_fields, space_fields, post_fields, space_filter):
+    # Search for users
+    users = session.scalars(search_user_projection.statement(user_fields).where(
+        or_(
+            User.first_name.ilike(f"%{query}%"),
+            User.last_name.ilike(f"%{query}%"),
+            User.email.ilike(f"%{query}%"),
+            User.occupation.ilike(f"%{query}%")
+        )
+    )).all()
+
+    # Search for spaces
+    spaces = session.scalars(search_space_projection.statement(space_fields).where(
+        Space.title.ilike(f"%{query}%"),
+        space_filter
+    )).all()
+
+    # Search for posts
+    posts = session.scalars(search_post_projection.statement(post_fields).where(
+        Post.content.ilike(f"%{query}%")
+    )).all()
+
+    return {
+        "users": [search_user_projection.serialize(user, user_fields) for user in users],
+        "spaces": [search_space_projection.serialize(space, space_fields) for space in spaces],
+        "posts": search_post_projection.serialize_many(posts, post_fields)
+    }
+
+@api.route("/search", methods=["POST"])
+@read_only
 def search():
     try:
         data = request.get_json()
@@ -1073,56 +1427,15 @@ def search():
         if not query:
             return jsonify({"error": "Missing search query"}), 400
 
-        # Search for users
-        users = User.query.filter(
-            or_(
-                User.first_name.ilike(f"%{query}%"),
-                User.last_name.ilike(f"%{query}%"),
-                User.email.ilike(f"%{query}%"),
-                User.occupation.ilike(f"%{query}%")
-            )
-        ).all()
-
-        # Search for spaces
-        spaces = Space.query.filter(
-            Space.title.ilike(f"%{query}%")
-        ).all()
+        try:
+            user_fields = requested_fields(search_user_projection, "users")
+            space_fields = requested_fields(search_space_projection, "spaces")
+            post_fields = requested_fields(search_post_projection, "posts")
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-        # Search for posts
-        posts = Post.query.filter(
-            Post.content.ilike(f"%{query}%")
-        ).all()
+        search_results = search_results_for(db.session, query, user_fields, space_fields, post_fields, visible_spaces())
 
-        # Prepare the response data
-        search_results = {
-            "users": [
-                {
-                    "id": user.id,
-                    "firstName": user.first_name,
-                    "lastName": user.last_name,
-                    "email": user.email,
-                    "occupation": user.occupation,
-                    "picturePath": user.picture_path
-                } for user in users
-            ],
-            "spaces": [
-                {
-                    "id": space.id,
-                    "title": space.title,
-                    "isPublic": space.is_public
-                } for space in spaces
-            ],
-            "posts": [
-                {
-                    "id": post.id,
-                    "content": post.content,
-                    "firstName": post.first_name,
-                    "lastName": post.last_name,
-                    "userPicturePath": post.user.picture_path
-                } for post in posts
-            ]
-        }
-        
         print("Sending search results:", search_results)
         return jsonify(search_results)
     except Exception as e:
@@ -1132,4 +1445,4 @@ def search():
 
 
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
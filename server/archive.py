@@ -0,0 +1,289 @@
+import json
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import Column, DateTime, LargeBinary, MetaData, String, Table, delete, insert, select
+from sqlalchemy.exc import IntegrityError
+from models import db, ArchivedPost, Comment, Post, TimelineEntry, User, likes_association, dislikes_association
+from replicas import _make_engine
+from jobs import job_handler
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# ---------------- Cold archive ----------------
+#
+# Posts older than ARCHIVE_AFTER_DAYS are moved, with their comments and like
+# and dislike rows, out of the hot tables into a separate database
+# (ARCHIVE_URI) as one compressed JSON blob per post. The primary keeps only
+# the archived_posts index, so a direct lookup knows where to look. load()
+# turns a blob back into an unsaved Post that the post projection serializes
+# like any other; restore() moves it back into the hot tables when someone
+# interacts with it again.
+
+metadata = MetaData()
+
+archive_blobs = Table(
+    "archive_blobs", metadata,
+    Column("id", String(32), primary_key=True),
+    Column("codec", String(10), nullable=False),
+    Column("data", LargeBinary, nullable=False),
+    Column("archived_at", DateTime, nullable=False),
+)
+
+
+def _compress(data, codec):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=9).compress(data)
+    return zlib.compress(data, 9)
+
+
+def _decompress(data, codec):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed archives")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def _timestamp(value):
+    return value.isoformat() if value else None
+
+
+def _datetime(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+class Archive:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions["archive"] = _make_engine(app, app.config["ARCHIVE_URI"])
+
+    @property
+    def engine(self):
+        return current_app.extensions["archive"]
+
+    def codec(self):
+        codec = current_app.config["ARCHIVE_CODEC"]
+        # Fall back rather than fail when the optional zstandard package is missing
+        return codec if codec != "zstd" or zstandard is not None else "zlib"
+
+    def create_all(self):
+        metadata.create_all(self.engine)
+
+    def _records(self, posts):
+        pks = [post.pk for post in posts]
+        comments = defaultdict(list)
+        for comment in Comment.query.filter(Comment.post_id.in_([post.id for post in posts])).order_by(Comment.created_at):
+            comments[comment.post_id].append({
+                "id": comment.id,
+                "user_id": comment.user_id,
+                "content": comment.content,
+                "created_at": _timestamp(comment.created_at),
+            })
+
+        reactions = {}
+        for name, association in (("likes", likes_association), ("dislikes", dislikes_association)):
+            reactions[name] = defaultdict(list)
+            rows = db.session.execute(
+                select(association.c.post_pk, User.id)
+                .join(User, User.pk == association.c.user_pk)
+                .where(association.c.post_pk.in_(pks))
+            )
+            for post_pk, user_id in rows:
+                reactions[name][post_pk].append(user_id)
+
+        return {
+            post.id: {
+                "id": post.id,
+                "user_id": post.user_id,
+                "first_name": post.first_name,
+                "last_name": post.last_name,
+                "content": post.content,
+                "post_image": post.post_image,
+                "created_at": _timestamp(post.created_at),
+                "comments": comments[post.id],
+                "likes": reactions["likes"][post.pk],
+                "dislikes": reactions["dislikes"][post.pk],
+            }
+            for post in posts
+        }
+
+    def archive_batch(self, cutoff, batch_size=500):
+        """Move up to batch_size posts created before cutoff to the archive.
+
+        The archive is written and committed first, so a crash before the hot
+        rows are deleted only means the same posts are archived again.
+        """
+        posts = Post.query.filter(Post.created_at < cutoff).order_by(Post.pk).limit(batch_size).all()
+        if not posts:
+            return 0
+
+        records = self._records(posts)
+        codec = self.codec()
+        now = datetime.utcnow()
+        with self.engine.begin() as connection:
+            connection.execute(delete(archive_blobs).where(archive_blobs.c.id.in_(list(records))))
+            connection.execute(insert(archive_blobs), [{
+                "id": post_id,
+                "codec": codec,
+                "data": _compress(json.dumps(record).encode(), codec),
+                "archived_at": now,
+            } for post_id, record in records.items()])
+
+        post_ids = [post.id for post in posts]
+        pks = [post.pk for post in posts]
+        db.session.add_all([
+            ArchivedPost(id=post.id, user_id=post.user_id, created_at=post.created_at, archived_at=now)
+            for post in posts
+        ])
+        db.session.execute(delete(TimelineEntry).where(TimelineEntry.post_id.in_(post_ids)))
+        db.session.execute(delete(Comment).where(Comment.post_id.in_(post_ids)))
+        db.session.execute(delete(likes_association).where(likes_association.c.post_pk.in_(pks)))
+        db.session.execute(delete(dislikes_association).where(dislikes_association.c.post_pk.in_(pks)))
+        db.session.execute(delete(Post).where(Post.pk.in_(pks)))
+        db.session.commit()
+        return len(posts)
+
+    def _record(self, post_id):
+        if db.session.get(ArchivedPost, post_id) is None:
+            return None
+        with self.engine.connect() as connection:
+            row = connection.execute(
+                select(archive_blobs.c.codec, archive_blobs.c.data).where(archive_blobs.c.id == post_id)
+            ).first()
+        return json.loads(_decompress(row.data, row.codec)) if row else None
+
+    def load(self, post_id):
+        """Return an archived post as an unsaved Post, or None."""
+        record = self._record(post_id)
+        if record is None:
+            return None
+
+        post = Post(
+            id=record["id"], user_id=record["user_id"], first_name=record["first_name"],
+            last_name=record["last_name"], content=record["content"], post_image=record["post_image"],
+            created_at=_datetime(record["created_at"]),
+        )
+        post.comments = [
+            Comment(id=comment["id"], post_id=post.id, user_id=comment["user_id"], content=comment["content"],
+                    created_at=_datetime(comment["created_at"]))
+            for comment in record["comments"]
+        ]
+        # Only the counts are serialized, so the users are stand-ins
+        post.likes = [User(id=user_id) for user_id in record["likes"]]
+        post.dislikes = [User(id=user_id) for user_id in record["dislikes"]]
+        return post
+
+    def delete(self, post_id):
+        """Delete an archived post for good; False when it isn't archived."""
+        # The index row goes first, as in restore; a crash before the blob is deleted only leaves it unreferenced
+        if not db.session.execute(delete(ArchivedPost).where(ArchivedPost.id == post_id)).rowcount:
+            db.session.rollback()
+            return False
+        db.session.commit()
+
+        with self.engine.begin() as connection:
+            connection.execute(delete(archive_blobs).where(archive_blobs.c.id == post_id))
+        return True
+
+    def restore(self, post_id):
+        """Move an archived post back into the hot tables and return it.
+
+        Concurrent restores of one post are safe: the request that deletes its
+        archived_posts row moves it, and the others return the post it moved.
+        """
+        record = self._record(post_id)
+        if record is None:
+            # Never archived, or a concurrent restore has already finished
+            return Post.query.filter_by(id=post_id).first()
+
+        # Claimed first, so a concurrent restore waits on the row lock and then finds nothing to delete
+        claimed = db.session.execute(delete(ArchivedPost).where(ArchivedPost.id == post_id)).rowcount
+        if not claimed:
+            db.session.rollback()
+            return Post.query.filter_by(id=post_id).first()
+
+        try:
+            post = Post(
+                id=record["id"], user_id=record["user_id"], first_name=record["first_name"],
+                last_name=record["last_name"], content=record["content"], post_image=record["post_image"],
+                created_at=_datetime(record["created_at"]),
+            )
+            db.session.add(post)
+            db.session.add_all([
+                Comment(id=comment["id"], post_id=post.id, user_id=comment["user_id"], content=comment["content"],
+                        created_at=_datetime(comment["created_at"]))
+                for comment in record["comments"]
+            ])
+            db.session.flush()
+
+            for name, association in (("likes", likes_association), ("dislikes", dislikes_association)):
+                user_pks = db.session.scalars(select(User.pk).where(User.id.in_(record[name]))).all()
+                if user_pks:
+                    db.session.execute(insert(association), [{"user_pk": pk, "post_pk": post.pk} for pk in user_pks])
+
+            db.session.commit()
+        except IntegrityError:
+            # The post is already hot some other way; keep it rather than answering 500
+            db.session.rollback()
+            return Post.query.filter_by(id=post_id).first()
+
+        with self.engine.begin() as connection:
+            connection.execute(delete(archive_blobs).where(archive_blobs.c.id == post_id))
+        return post
+
+
+archive = Archive()
+
+
+def archive_cutoff(days=None):
+    return datetime.utcnow() - timedelta(days=days or current_app.config["ARCHIVE_AFTER_DAYS"])
+
+
+@job_handler("archive_posts")
+def archive_posts(days=None, batch_size=500):
+    archive.create_all()
+    cutoff = archive_cutoff(days)
+    while archive.archive_batch(cutoff, batch_size):
+        pass
+
+
+# ---------------- CLI ----------------
+
+archive_cli = AppGroup("archive", help="Move old posts to and from the cold archive.")
+
+
+@archive_cli.command("run")
+@click.option("--days", default=None, type=int, help="Archive posts older than this; defaults to ARCHIVE_AFTER_DAYS.")
+@click.option("--batch-size", default=500, show_default=True)
+def run_command(days, batch_size):
+    archive.create_all()
+    cutoff = archive_cutoff(days)
+    total = 0
+    while moved := archive.archive_batch(cutoff, batch_size):
+        total += moved
+        click.echo(f"Archived {total} posts.", err=True)
+    click.echo(f"Archived {total} posts older than {cutoff:%Y-%m-%d}.")
+
+
+@archive_cli.command("restore")
+@click.argument("post_id")
+def restore_command(post_id):
+    # restore() also answers with the hot post, so ask the index whether there is anything to restore
+    if db.session.get(ArchivedPost, post_id) is None:
+        if Post.query.filter_by(id=post_id).first() is not None:
+            raise click.ClickException(f"Post {post_id} is not archived.")
+        raise click.ClickException(f"Post {post_id} does not exist.")
+    archive.restore(post_id)
+    click.echo(f"Restored post {post_id}.")
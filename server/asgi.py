@@ -0,0 +1,339 @@
+"""Serve the API from an ASGI server.
+
+    uvicorn --factory asgi:create_asgi_app --workers 4
+
+GET /posts, POST /search and GET /notifications/<id> mostly wait on the
+database, so here they run as coroutines on an AsyncEngine (aiosqlite or
+asyncpg) and rate limit through redis.asyncio: a worker keeps serving other
+requests while their queries are in flight. Their ORM code is shared with the
+Flask routes through AsyncSession.run_sync.
+
+Every other request, including CORS preflights, profiled requests and retries
+carrying an Idempotency-Key, goes to the Flask app on a pool of ASGI_THREADS
+threads, so CPU-bound work like bcrypt in /login and /register never blocks
+the event loop.
+"""
+import asyncio
+import math
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from werkzeug.exceptions import HTTPException
+from werkzeug.middleware.proxy_fix import ProxyFix
+from app import create_app, list_posts, notification_items, search_results_for, wanted_notifications
+from access import visible_spaces
+from cards import cards
+from config import ApplicationConfig
+from models import db, User
+from projection import post_projection, search_user_projection, search_space_projection, search_post_projection
+from ratelimit import AsyncRedisBackend, rate_limiter
+from redis_store import async_redis_for
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def async_url(app):
+    if app.config["ASYNC_DATABASE_URI"]:
+        return make_url(app.config["ASYNC_DATABASE_URI"])
+    with app.app_context():
+        # Flask-SQLAlchemy has already resolved relative SQLite paths against the instance folder
+        url = db.engine.url
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f"No async driver for {backend}; set ASYNC_DATABASE_URI")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def wsgi_environ(scope, body, length):
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope["query_string"].decode("latin1"),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        # The body has been read in full, whatever the client's transfer encoding
+        "CONTENT_LENGTH": str(length),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    host, port = scope.get("server") or ("localhost", 80)
+    environ["SERVER_NAME"], environ["SERVER_PORT"] = host, str(port or 80)
+    if scope.get("client"):
+        environ["REMOTE_ADDR"], environ["REMOTE_PORT"] = scope["client"][0], str(scope["client"][1])
+
+    for name, value in scope["headers"]:
+        name = name.decode("latin1").upper().replace("-", "_")
+        if name == "CONTENT_LENGTH":
+            continue
+        key = name if name == "CONTENT_TYPE" else f"HTTP_{name}"
+        value = value.decode("latin1")
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def send_response(send, response):
+    await send({
+        "type": "http.response.start",
+        "status": response.status_code,
+        "headers": [(name.lower().encode("latin1"), value.encode("latin1")) for name, value in response.headers.items()],
+    })
+    await send({"type": "http.response.body", "body": response.get_data()})
+
+
+class AsyncApp:
+    def __init__(self, app):
+        self.app = app
+        self.engine = None
+        self.redis = None
+        self.limiter = None
+        self.starting = asyncio.Lock()
+        self.executor = ThreadPoolExecutor(app.config["ASGI_THREADS"], thread_name_prefix="wsgi")
+        # app.wsgi_app already trusts the proxies; native routes apply the same fix to their environ
+        self.proxy_fix = None
+        if app.config["RATELIMIT_TRUSTED_PROXIES"]:
+            self.proxy_fix = ProxyFix(lambda environ, start_response: environ, x_for=app.config["RATELIMIT_TRUSTED_PROXIES"])
+        self.routes = {
+            "api.get_all_posts": self.posts,
+            "api.search": self.search,
+            "api.get_notifications": self.notifications,
+        }
+
+    async def startup(self):
+        self.engine = create_async_engine(async_url(self.app))
+        if self.app.config["RATELIMIT_BACKEND"] == "redis":
+            self.redis = async_redis_for(self.app)
+            self.limiter = AsyncRedisBackend(self.redis)
+
+    async def shutdown(self):
+        if self.engine is not None:
+            await self.engine.dispose()
+            self.engine = None
+        if self.redis is not None:
+            await self.redis.aclose()
+            self.redis = self.limiter = None
+        self.executor.shutdown(wait=False)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        if scope["type"] != "http":
+            return
+
+        with SpooledTemporaryFile(max_size=64 * 1024) as body:
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                body.write(message.get("body", b""))
+                if not message.get("more_body"):
+                    break
+            length = body.tell()
+            body.seek(0)
+
+            environ = wsgi_environ(scope, body, length)
+            endpoint, args = self.match(environ)
+            if endpoint is None:
+                await self.call_wsgi(environ, send)
+            else:
+                await self.call_native(endpoint, args, environ, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.startup()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def match(self, environ):
+        # These need the Flask request hooks, which only run on the WSGI side
+        if environ["REQUEST_METHOD"] == "OPTIONS" or "HTTP_X_PROFILE" in environ or "HTTP_IDEMPOTENCY_KEY" in environ:
+            return None, None
+        try:
+            endpoint, args = self.app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            return None, None
+        return (endpoint, args) if endpoint in self.routes else (None, None)
+
+    # ---------------- WSGI routes ----------------
+
+    async def call_wsgi(self, environ, send):
+        loop = asyncio.get_running_loop()
+
+        def send_from_thread(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def run():
+            status = []
+            started = False
+
+            def start_response(status_line, headers, exc_info=None):
+                if exc_info and started:
+                    raise exc_info[1].with_traceback(exc_info[2])
+                status[:] = [
+                    int(status_line.split(" ", 1)[0]),
+                    [(name.lower().encode("latin1"), value.encode("latin1")) for name, value in headers],
+                ]
+
+            def start():
+                send_from_thread({"type": "http.response.start", "status": status[0], "headers": status[1]})
+
+            chunks = self.app(environ, start_response)
+            try:
+                # Streamed responses like /export are sent chunk by chunk; waiting
+                # on each send keeps a slow client from filling up memory
+                for chunk in chunks:
+                    if not chunk:
+                        continue
+                    if not started:
+                        start()
+                        started = True
+                    send_from_thread({"type": "http.response.body", "body": chunk, "more_body": True})
+            finally:
+                if hasattr(chunks, "close"):
+                    chunks.close()
+            if not started:
+                start()
+            send_from_thread({"type": "http.response.body", "body": b""})
+
+        await loop.run_in_executor(self.executor, run)
+
+    # ---------------- Async routes ----------------
+
+    async def call_native(self, endpoint, args, environ, send):
+        if self.engine is None:
+            # Servers without lifespan support start us on the first request
+            async with self.starting:
+                if self.engine is None:
+                    await self.startup()
+
+        if self.proxy_fix is not None:
+            environ = self.proxy_fix(environ, None)
+        request = self.app.request_class(environ)
+        with self.app.app_context():
+            retry_after = await self.rate_limit(endpoint, request)
+            if retry_after > 0:
+                response = self.json({"error": "Too many requests"}, 429)
+                response.headers["Retry-After"] = str(math.ceil(retry_after))
+            else:
+                response = await self.routes[endpoint](request, **args)
+
+        origin = request.headers.get("Origin")
+        if origin:
+            # What flask-cors answers for the app's credentialed "*" policy
+            response.headers["Access-Control-Allow-Origin"] = origin
+            response.headers["Access-Control-Allow-Credentials"] = "true"
+            response.vary.add("Origin")
+        await send_response(send, response)
+
+    async def rate_limit(self, endpoint, request):
+        # Only the client IP bucket: it is checked before anything opens the session
+        config = self.app.config
+        cost = config["RATELIMIT_COSTS"].get(endpoint, 1)
+        if not config["RATELIMIT_ENABLED"] or not cost:
+            return 0
+
+        args = ([f"ip:{request.remote_addr}"], config["RATELIMIT_CAPACITY"], config["RATELIMIT_REFILL_PER_SECOND"], cost)
+        try:
+            if self.limiter is not None:
+                return await self.limiter.consume(*args)
+            return rate_limiter.backend.consume(*args)
+        except Exception as e:
+            print(f"Rate limiter unavailable: {e}")
+            return 0
+
+    def json(self, payload, status=200):
+        response = self.app.json.response(payload)
+        response.status_code = status
+        return response
+
+    async def run(self, session, function, *args):
+        return await session.run_sync(self._in_cards_scope, function, *args)
+
+    @staticmethod
+    def _in_cards_scope(session, function, *args):
+        with cards.scope(session):
+            return function(session, *args)
+
+    async def posts(self, request):
+        try:
+            fields = post_projection.parse(request.args.get("fields"))
+        except ValueError as e:
+            return self.json({"error": str(e)}, 400)
+
+        try:
+            async with AsyncSession(self.engine) as session:
+                return self.json(await self.run(session, list_posts, fields))
+        except Exception as e:
+            return self.json({"error": f"Internal Server Error: {str(e)}"}, 500)
+
+    async def search(self, request):
+        try:
+            data = request.get_json()
+            query = data.get("query")
+
+            if not query:
+                return self.json({"error": "Missing search query"}, 400)
+
+            try:
+                user_fields = search_user_projection.parse(request.args.get("fields[users]"))
+                space_fields = search_space_projection.parse(request.args.get("fields[spaces]"))
+                post_fields = search_post_projection.parse(request.args.get("fields[posts]"))
+            except ValueError as e:
+                return self.json({"error": str(e)}, 400)
+
+            # Members find their private spaces, as on the Flask route
+            space_filter = await asyncio.to_thread(self.viewer_spaces, request)
+            async with AsyncSession(self.engine) as session:
+                results = await self.run(session, search_results_for, query, user_fields, space_fields, post_fields, space_filter)
+            return self.json(results)
+        except Exception as e:
+            print(f"Error in search: {e}")
+            return self.json({"error": "Internal Server Error"}, 500)
+
+    def viewer_spaces(self, request):
+        # Opening the session and loading memberships may wait on Redis or the
+        # synchronous engine, so this runs off the loop
+        session = self.app.session_interface.open_session(self.app, request)
+        return visible_spaces(session.get("user_id") if session is not None else None)
+
+    async def notifications(self, request, user_id):
+        async with AsyncSession(self.engine) as session:
+            user = await session.scalar(select(User).filter_by(id=user_id))
+            if user is None:
+                return self.json({"error": "User not found"}, 404)
+
+            # Settings are cached per worker; a miss reads them on the synchronous engine off the loop
+            wanted = await asyncio.to_thread(wanted_notifications, user.id, request.args.get("type"))
+            return self.json(await self.run(session, notification_items, user, wanted))
+
+
+def create_asgi_app(config_class=ApplicationConfig):
+    return AsyncApp(create_app(config_class))
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    config = ApplicationConfig
+    host, _, port = config.SERVER_BIND.rpartition(":")
+    uvicorn.run("asgi:create_asgi_app", factory=True, host=host, port=int(port), workers=config.SERVER_WORKERS or None)
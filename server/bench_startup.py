@@ -0,0 +1,53 @@
+"""Report cold-start cost: module import, create_app() and the first request.
+
+Each sample runs in a fresh interpreter so import caches do not hide the cost:
+
+    python bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SAMPLE = r"""
+import json, time
+t0 = time.perf_counter()
+import app as app_module
+from config import TestingConfig
+from models import db
+t1 = time.perf_counter()
+app = app_module.create_app(TestingConfig)
+t2 = time.perf_counter()
+with app.app_context():
+    db.create_all()
+client = app.test_client()
+t3 = time.perf_counter()
+client.get("/posts")
+t4 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "create_app": t2 - t1, "first_request": t4 - t3}))
+"""
+
+
+def run_sample():
+    output = subprocess.check_output(
+        [sys.executable, "-c", SAMPLE],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    samples = [run_sample() for _ in range(args.runs)]
+    for phase in ("import", "create_app", "first_request"):
+        timings = [sample[phase] * 1000 for sample in samples]
+        print(f"{phase:>14}: median {statistics.median(timings):8.1f} ms   max {max(timings):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
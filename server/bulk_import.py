@@ -0,0 +1,244 @@
+import csv
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from flask_bcrypt import Bcrypt
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from models import db, get_uuid, User, Post, Comment, Space, SpaceMembership, friends_association
+from occupations import occupation_key
+
+
+# ---------------- Bulk import ----------------
+#
+# Streams CSV or NDJSON records into the database in executemany batches, one
+# commit per batch. Non-unique indexes on the target table are dropped for the
+# duration and rebuilt once at the end, and user passwords are hashed across a
+# process pool. After each commit the number of records consumed is written to
+# PATH.progress, so --resume skips what an interrupted run already loaded;
+# inserts skip rows whose keys already exist (ON CONFLICT DO NOTHING), making
+# overlap harmless, while any other constraint failure stops the import.
+# Records that reference users, posts or spaces not in the database are
+# skipped and counted separately from duplicates.
+
+def _hash_password(password, rounds):
+    return Bcrypt().generate_password_hash(password, rounds).decode()
+
+
+def _timestamp(value):
+    return datetime.fromisoformat(value) if value else datetime.utcnow()
+
+
+def _user_pks(user_ids):
+    return dict(db.session.execute(select(User.id, User.pk).where(User.id.in_(set(user_ids)))).all())
+
+
+def _existing(column, ids):
+    return set(db.session.scalars(select(column).where(column.in_(set(ids)))))
+
+
+def _known(records, **references):
+    """Split records into those whose every reference exists and a count of the rest.
+
+    references maps a record field to the id column it must name, e.g. user_id=User.id.
+    """
+    known_ids = {field: _existing(column, [record[field] for record in records]) for field, column in references.items()}
+    known = [record for record in records if all(record[field] in known_ids[field] for field in references)]
+    return known, len(records) - len(known)
+
+
+def _prepare_users(records, pool):
+    rounds = current_app.config.get("BCRYPT_LOG_ROUNDS", 12)
+    plain = [record["password"] for record in records if not record.get("password_hash")]
+    hashes = iter(pool.map(_hash_password, plain, [rounds] * len(plain), chunksize=16))
+
+    return [{
+        "id": record.get("id") or get_uuid(),
+        "email": record["email"],
+        "password": record.get("password_hash") or next(hashes),
+        "first_name": record.get("first_name"),
+        "last_name": record.get("last_name"),
+        "occupation": record.get("occupation"),
+        "occupation_key": occupation_key(record.get("occupation")),
+        "location": record.get("location"),
+        "picture_path": record.get("picture_path"),
+    } for record in records], 0
+
+
+def _prepare_posts(records, pool):
+    # Posts carry a denormalized copy of the author's name
+    authors = {row.id: row for row in db.session.execute(
+        select(User.id, User.first_name, User.last_name)
+        .where(User.id.in_({record["user_id"] for record in records}))
+    )}
+    known = [record for record in records if record["user_id"] in authors]
+
+    return [{
+        "id": record.get("id") or get_uuid(),
+        "user_id": record["user_id"],
+        "content": record["content"],
+        "post_image": record.get("post_image"),
+        "created_at": _timestamp(record.get("created_at")),
+        "first_name": authors[record["user_id"]].first_name,
+        "last_name": authors[record["user_id"]].last_name,
+    } for record in known], len(records) - len(known)
+
+
+def _prepare_comments(records, pool):
+    records, unknown = _known(records, user_id=User.id, post_id=Post.id)
+    return [{
+        "id": record.get("id") or get_uuid(),
+        "post_id": record["post_id"],
+        "user_id": record["user_id"],
+        "content": record["content"],
+        "created_at": _timestamp(record.get("created_at")),
+    } for record in records], unknown
+
+
+def _prepare_friends(records, pool):
+    pks = _user_pks([record["user_id"] for record in records] + [record["friend_id"] for record in records])
+    known = [record for record in records if record["user_id"] in pks and record["friend_id"] in pks]
+    return [{
+        "user_pk": pks[record["user_id"]],
+        "friend_pk": pks[record["friend_id"]],
+    } for record in known], len(records) - len(known)
+
+
+def _prepare_memberships(records, pool):
+    records, unknown = _known(records, user_id=User.id, space_id=Space.id)
+    return [{
+        "user_id": record["user_id"],
+        "space_id": record["space_id"],
+    } for record in records], unknown
+
+
+# Each prepare function returns (rows, number of records skipped for unknown ids)
+IMPORTS = {
+    "users": (User.__table__, _prepare_users),
+    "posts": (Post.__table__, _prepare_posts),
+    "comments": (Comment.__table__, _prepare_comments),
+    "friends": (friends_association, _prepare_friends),
+    "memberships": (SpaceMembership.__table__, _prepare_memberships),
+}
+
+
+def read_records(path, format):
+    with open(path, newline="", encoding="utf-8") as file:
+        if format == "csv":
+            yield from csv.DictReader(file)
+        else:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _insert_ignoring_duplicates(table):
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+        return postgresql_insert(table).on_conflict_do_nothing()
+    if dialect == "sqlite":
+        # Unlike INSERT OR IGNORE, this still fails on NOT NULL and other non-key constraints
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert(table).on_conflict_do_nothing()
+    return insert(table)
+
+
+def _read_checkpoint(path):
+    try:
+        with open(path) as file:
+            return int(file.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def _write_checkpoint(path, consumed):
+    with open(path + ".tmp", "w") as file:
+        file.write(str(consumed))
+    os.replace(path + ".tmp", path)
+
+
+# ---------------- CLI ----------------
+
+@click.command("import")
+@click.argument("kind", type=click.Choice(list(IMPORTS)))
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "format", type=click.Choice(["csv", "ndjson"]), default=None,
+              help="Input format; inferred from the file extension by default.")
+@click.option("--batch-size", default=1000, show_default=True, help="Records inserted per transaction.")
+@click.option("--processes", default=os.cpu_count() or 1, show_default="CPU count", help="Password hashing processes.")
+@click.option("--defer-indexes/--keep-indexes", default=True, show_default=True,
+              help="Drop non-unique indexes during the load and rebuild them afterwards.")
+@click.option("--resume", is_flag=True, help="Skip the records an earlier run already committed.")
+@with_appcontext
+def import_command(kind, path, format, batch_size, processes, defer_indexes, resume):
+    """Load KIND records from a CSV or NDJSON file at PATH."""
+    table, prepare = IMPORTS[kind]
+    format = format or ("csv" if path.endswith(".csv") else "ndjson")
+    checkpoint = path + ".progress"
+
+    consumed = _read_checkpoint(checkpoint) if resume else 0
+    records = read_records(path, format)
+    for _ in islice(records, consumed):
+        pass
+
+    deferred = [index for index in table.indexes if not index.unique] if defer_indexes else []
+    for index in deferred:
+        index.drop(db.engine, checkfirst=True)
+
+    statement = _insert_ignoring_duplicates(table)
+    started = time.monotonic()
+    imported = duplicates = unknown = 0
+
+    pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn")) \
+        if kind == "users" else None
+    try:
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+
+            records_range = f"records {consumed + 1}-{consumed + len(batch)}"
+            try:
+                rows, unknown_in_batch = prepare(batch, pool)
+            except (KeyError, ValueError) as e:
+                raise click.ClickException(f"Invalid record among {records_range}: {e!r}")
+
+            try:
+                inserted = db.session.execute(statement, rows).rowcount if rows else 0
+                db.session.commit()
+            except IntegrityError as e:
+                db.session.rollback()
+                raise click.ClickException(f"Invalid record among {records_range}: {e.orig}")
+
+            consumed += len(batch)
+            inserted = len(rows) if inserted < 0 else inserted
+            imported += inserted
+            unknown += unknown_in_batch
+            duplicates += len(rows) - inserted
+            _write_checkpoint(checkpoint, consumed)
+
+            rate = imported / max(time.monotonic() - started, 1e-6)
+            click.echo(f"{kind}: {consumed} records read, {imported} imported, {duplicates + unknown} skipped ({rate:.0f}/s)", err=True)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        for index in deferred:
+            click.echo(f"Rebuilding {index.name}...", err=True)
+            index.create(db.engine, checkfirst=True)
+
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    click.echo(f"Imported {imported} {kind}; skipped {duplicates} duplicates and {unknown} records referencing unknown ids.")
+    if kind == "users":
+        click.echo("Run `flask occupations rebuild` to index the new users' occupations.")
+    elif kind in ("posts", "friends", "memberships"):
+        click.echo("Run `flask feed backfill` to add the new content to home timelines.")
@@ -0,0 +1,131 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import g, has_app_context, has_request_context
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from models import db, User
+from redis_store import redis_for
+from versions import MemoryVersions, RedisVersions, VersionedCache
+
+
+# ---------------- User cards ----------------
+#
+# A user card is the author information embedded in list payloads: name,
+# picture and occupation. user_cards(ids) resolves any number of users with one
+# IN query, memoizes the cards on g for the rest of the request, and keeps them
+# across requests in a VersionedCache keyed by user id and profile_version.
+# Changing a card field bumps profile_version, and the new version is
+# published when the transaction commits, which invalidates every worker's copy.
+# Code running outside a request, like the async routes, wraps its work in
+# `cards.scope(session)` to load through its own session with its own memo.
+
+CARD_FIELDS = ("first_name", "last_name", "picture_path", "occupation")
+
+
+def _card(row):
+    return {
+        "id": row.id,
+        "firstName": row.first_name,
+        "lastName": row.last_name,
+        "picturePath": row.picture_path,
+        "occupation": row.occupation,
+    }
+
+
+_scope = ContextVar("user_cards_scope", default=None)
+
+
+class UserCards:
+    def __init__(self, app=None):
+        self.cache = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if app.config["USER_CARDS_BACKEND"] == "redis":
+            client = app.config.get("SESSION_REDIS") or redis_for(app)
+            versions = RedisVersions(client, app.config["USER_CARDS_VERSION_TTL"], prefix="user:profile:")
+        else:
+            versions = MemoryVersions()
+        self.cache = VersionedCache(versions, app.config["USER_CARDS_CACHE_SIZE"])
+        app.teardown_request(self.teardown_request)
+
+    def teardown_request(self, exception):
+        # g outlives the request when an app context was already pushed, as in the CLI and tests
+        g.pop("user_cards", None)
+
+    @contextmanager
+    def scope(self, session):
+        token = _scope.set((session, {}))
+        try:
+            yield
+        finally:
+            _scope.reset(token)
+
+    def _load(self, user_ids):
+        scope = _scope.get()
+        session = scope[0] if scope else db.session
+        rows = session.execute(
+            select(User.id, User.first_name, User.last_name, User.picture_path, User.occupation, User.profile_version)
+            .where(User.id.in_(user_ids))
+        )
+        return {row.id: (row.profile_version, _card(row)) for row in rows}
+
+    def resolve(self, user_ids):
+        scope = _scope.get()
+        if scope:
+            memo = scope[1]
+        else:
+            memo = g.setdefault("user_cards", {}) if has_request_context() else {}
+        missing = [user_id for user_id in dict.fromkeys(user_ids) if user_id and user_id not in memo]
+        if missing:
+            for user_id, (_, card) in self.cache.get_many(missing, self._load).items():
+                memo[user_id] = card
+        return {user_id: memo[user_id] for user_id in user_ids if user_id in memo}
+
+
+cards = UserCards()
+
+
+def user_cards(user_ids):
+    """Return {user_id: card} for the given ids; unknown ids are left out."""
+    return cards.resolve(list(user_ids))
+
+
+def user_card(user_id):
+    card = cards.resolve([user_id]).get(user_id)
+    return card or {"id": user_id, "firstName": None, "lastName": None, "picturePath": None, "occupation": None}
+
+
+# ---------------- Profile versions ----------------
+
+@event.listens_for(User, "before_update")
+def _bump_profile_version(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in CARD_FIELDS):
+        # Incremented in SQL so concurrent editors can't both write the same version
+        target.profile_version = User.profile_version + 1
+        state.session.info.setdefault("changed_profiles", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _read_profile_versions(session, flush_context):
+    changed = session.info.pop("changed_profiles", None)
+    if changed:
+        rows = session.execute(select(User.id, User.profile_version).where(User.id.in_(changed)))
+        session.info.setdefault("profile_versions", {}).update(rows.all())
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_profile_versions(session):
+    versions = session.info.pop("profile_versions", None)
+    if versions and has_app_context() and cards.cache is not None:
+        for user_id, version in versions.items():
+            cards.cache.publish(user_id, version)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_profile_versions(session, previous_transaction):
+    session.info.pop("changed_profiles", None)
+    session.info.pop("profile_versions", None)
@@ -1,6 +1,5 @@
 from dotenv import load_dotenv
 import os
-import redis
 
 load_dotenv()
 
@@ -10,10 +9,161 @@ class ApplicationConfig:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = True
     SQLALCHEMY_DATABASE_URI = r"sqlite:///./db.sqlite"
+    # Comma-separated read replica URIs, e.g. "sqlite:///./replica.sqlite"
+    SQLALCHEMY_REPLICA_URIS = [uri for uri in os.environ.get("REPLICA_URIS", "").split(",") if uri]
+    REPLICA_STICKY_SECONDS = 10
+    REPLICA_HEALTH_INTERVAL = 5
+    REPLICA_MAX_LAG_SECONDS = 5
 
-    SESSION_TYPE = "redis"
+    # Per-space discussion partitions, e.g. "shard_0=sqlite:///./discussions_0.sqlite,...";
+    # new spaces are hashed across DISCUSSION_HASH_PARTITIONS (all of them when empty)
+    DISCUSSION_PARTITIONS = dict(
+        entry.split("=", 1) for entry in os.environ.get("DISCUSSION_PARTITIONS", "").split(",") if entry
+    )
+    DISCUSSION_HASH_PARTITIONS = [name for name in os.environ.get("DISCUSSION_HASH_PARTITIONS", "").split(",") if name]
+
+    # serve.py; SERVER_WORKERS defaults to 2 * cores + 1
+    SERVER_BIND = os.environ.get("BIND", "0.0.0.0:5000")
+    SERVER_WORKERS = int(os.environ.get("WEB_CONCURRENCY", 0))
+    SERVER_THREADS = int(os.environ.get("SERVER_THREADS", 1))
+    SERVER_MAX_REQUESTS = 5000
+    SERVER_MAX_REQUESTS_JITTER = 500
+    SERVER_TIMEOUT = 30
+    SERVER_GRACEFUL_TIMEOUT = 30
+    SERVER_KEEPALIVE = 5
+
+    # asgi.py; the async engine defaults to SQLALCHEMY_DATABASE_URI on its async driver
+    ASYNC_DATABASE_URI = os.environ.get("ASYNC_DATABASE_URI")
+    ASGI_THREADS = int(os.environ.get("ASGI_THREADS", 32))
+
+    REDIS_URL = os.environ.get("REDIS_URL", "redis://127.0.0.1:6379")
+    REDIS_MAX_CONNECTIONS = 50
+    REDIS_POOL_TIMEOUT = 1.0
+    REDIS_SOCKET_TIMEOUT = 1.0
+    REDIS_CONNECT_TIMEOUT = 1.0
+
+    # "redis", "memory" (per-process LRU) or "cookie" (signed cookie)
+    SESSION_TYPE = os.environ.get("SESSION_TYPE", "redis")
+    SESSION_MEMORY_MAX = 10000
     SESSION_PERMANENT = False
     SESSION_USE_SIGNER = True
     SESSION_COOKIE_NAME = "user_session"
     SESSION_COOKIE_SECURE = True
-    SESSION_REDIS = redis.from_url("redis://127.0.0.1:6379")
\ No newline at end of file
+    SESSION_REDIS = None
+
+    ADMIN_ENABLED = os.environ.get("ADMIN_ENABLED", "1") == "1"
+
+    JOBS_EAGER = False
+    JOBS_LOCK_TIMEOUT = 300
+    JOBS_BACKOFF_BASE = 2
+    JOBS_BACKOFF_MAX = 600
+
+    OCCUPATION_MATCH_LIMIT = 200
+
+    FEED_FANOUT_LIMIT = 5000
+    FEED_FANOUT_BATCH_SIZE = 500
+    FEED_FRIEND_BOOST = 6 * 60 * 60
+
+    # "redis" shares the window between workers; "memory" is per process and checkpoints to a file
+    TRENDING_BACKEND = os.environ.get("TRENDING_BACKEND", "redis")
+    TRENDING_BUCKET_SECONDS = 15 * 60
+    TRENDING_BUCKET_COUNT = 96
+    TRENDING_HALF_LIFE = 6 * 60 * 60
+    TRENDING_REFRESH_SECONDS = 30
+    TRENDING_CHECKPOINT_SECONDS = 5 * 60
+    TRENDING_TOP_N = 100
+    TRENDING_CHECKPOINT_PATH = os.environ.get("TRENDING_CHECKPOINT_PATH", "trending.json")
+
+    RATELIMIT_ENABLED = True
+    RATELIMIT_BACKEND = os.environ.get("RATELIMIT_BACKEND", "redis")
+    RATELIMIT_CAPACITY = 60
+    RATELIMIT_REFILL_PER_SECOND = 1.0
+    # Number of reverse proxies in front of the app that append to X-Forwarded-For
+    RATELIMIT_TRUSTED_PROXIES = int(os.environ.get("RATELIMIT_TRUSTED_PROXIES", 0))
+    # Token cost per endpoint; anything not listed costs 1
+    RATELIMIT_COSTS = {
+        "api.login_user": 10,
+        "api.register_user": 10,
+        "api.search": 5,
+        "api.like_post": 2,
+        "api.dislike_post": 2,
+        "api.post_comment": 3,
+        "api.serve_static": 0,
+    }
+
+    IDEMPOTENCY_BACKEND = os.environ.get("IDEMPOTENCY_BACKEND", "redis")
+    IDEMPOTENCY_TTL = 24 * 60 * 60
+    IDEMPOTENCY_PENDING_TTL = 60
+
+    SETTINGS_BACKEND = os.environ.get("SETTINGS_BACKEND", "redis")
+    SETTINGS_CACHE_SIZE = 10000
+    SETTINGS_VERSION_TTL = 24 * 60 * 60
+
+    USER_CARDS_BACKEND = os.environ.get("USER_CARDS_BACKEND", "redis")
+    USER_CARDS_CACHE_SIZE = 50000
+    USER_CARDS_VERSION_TTL = 24 * 60 * 60
+
+    SPACE_ACCESS_BACKEND = os.environ.get("SPACE_ACCESS_BACKEND", "redis")
+    SPACE_ACCESS_CACHE_SIZE = 50000
+    SPACE_ACCESS_VERSION_TTL = 24 * 60 * 60
+
+    # Chunked uploads land here; defaults to the assets directory
+    UPLOAD_ROOT = os.environ.get("UPLOAD_ROOT")
+    # In-progress .part files; defaults to instance/uploads. Keep it out of the
+    # served assets and on the same filesystem as UPLOAD_ROOT so finished files move in one rename
+    UPLOAD_PARTS_DIR = os.environ.get("UPLOAD_PARTS_DIR")
+    UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+    UPLOAD_MAX_CHUNK = 5 * 1024 * 1024
+    UPLOAD_BUFFER_SIZE = 64 * 1024
+
+    # Cold store for posts older than ARCHIVE_AFTER_DAYS; "zstd" needs the zstandard package, else zlib is used
+    ARCHIVE_URI = os.environ.get("ARCHIVE_URI", "sqlite:///./archive.sqlite")
+    ARCHIVE_CODEC = os.environ.get("ARCHIVE_CODEC", "zstd")
+    ARCHIVE_AFTER_DAYS = 365
+
+    # Requests with "X-Profile: <PROFILE_TOKEN>" are profiled; off when unset
+    PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN")
+    PROFILE_BACKEND = os.environ.get("PROFILE_BACKEND", "redis")
+    # How often each worker re-reads the armed endpoints from Redis
+    PROFILE_ARMED_POLL_SECONDS = 5
+    PROFILE_DIR = os.environ.get("PROFILE_DIR")
+    PROFILE_INTERVAL = 0.005
+    PROFILE_TRACEMALLOC_FRAMES = 10
+    PROFILE_TOP_ALLOCATIONS = 20
+
+    # Bearer token for the /export endpoints; exports are off when unset
+    EXPORT_TOKEN = os.environ.get("EXPORT_TOKEN")
+
+class TestingConfig(ApplicationConfig):
+    TESTING = True
+
+    SQLALCHEMY_ECHO = False
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    SQLALCHEMY_REPLICA_URIS = []
+    DISCUSSION_PARTITIONS = {}
+    ARCHIVE_URI = "sqlite://"
+
+    SESSION_TYPE = "memory"
+    SESSION_COOKIE_SECURE = False
+
+    ADMIN_ENABLED = False
+
+    JOBS_EAGER = True
+
+    TRENDING_BACKEND = "memory"
+    TRENDING_REFRESH_SECONDS = 0
+    TRENDING_CHECKPOINT_PATH = None
+
+    RATELIMIT_ENABLED = False
+    RATELIMIT_BACKEND = "memory"
+
+    IDEMPOTENCY_BACKEND = "memory"
+
+    SETTINGS_BACKEND = "memory"
+    USER_CARDS_BACKEND = "memory"
+    SPACE_ACCESS_BACKEND = "memory"
+
+    EXPORT_TOKEN = "test-export-token"
+
+    PROFILE_TOKEN = "test-profile-token"
+    PROFILE_BACKEND = "memory"
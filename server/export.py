@@ -0,0 +1,111 @@
+import heapq
+import itertools
+import json
+import os
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, select
+from models import db, User, Post, Discussion, likes_association, dislikes_association
+from partitions import PARTITIONED, partitions
+
+
+# ---------------- NDJSON export ----------------
+#
+# Exports walk a table in id order through a server-side cursor (yield_per) and
+# emit one JSON object per line, so memory stays flat however many rows there
+# are. Every line carries its id; passing the last id seen as `after` resumes
+# an interrupted export exactly where it stopped.
+
+def _likes(association):
+    return select(func.count()) \
+        .where(association.c.post_pk == Post.pk) \
+        .correlate(Post) \
+        .scalar_subquery()
+
+
+EXPORTS = {
+    "users": (User, lambda: [
+        User.id, User.email, User.first_name, User.last_name,
+        User.occupation, User.location, User.picture_path,
+    ]),
+    "posts": (Post, lambda: [
+        Post.id, Post.user_id, Post.content, Post.post_image, Post.created_at,
+        _likes(likes_association).label("likes"),
+        _likes(dislikes_association).label("dislikes"),
+    ]),
+    "discussions": (Discussion, lambda: [
+        Discussion.id, Discussion.user_id, Discussion.space_id,
+        Discussion.title, Discussion.content, Discussion.created_at,
+    ]),
+}
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _rows(session, statement, batch_size):
+    for rows in session.execute(statement.execution_options(yield_per=batch_size)).partitions():
+        yield from rows
+
+
+def export_lines(resource, after=None, batch_size=1000):
+    """Yield NDJSON chunks of up to `batch_size` rows, ordered by id."""
+    model, columns = EXPORTS[resource]
+    statement = select(*columns()).order_by(model.id)
+    if after:
+        statement = statement.where(model.id > after)
+
+    # Partitioned tables are read from every partition and merged back into id order
+    sessions = partitions.sessions() if model in PARTITIONED else [db.session]
+    rows = heapq.merge(*(_rows(session, statement, batch_size) for session in sessions), key=lambda row: row.id)
+    while chunk := list(itertools.islice(rows, batch_size)):
+        yield "".join(json.dumps(row._asdict(), default=_default) + "\n" for row in chunk)
+
+
+def _last_exported_id(path):
+    # Drop a partially written trailing line, then read the id of the last full one
+    with open(path, "rb+") as file:
+        size = file.seek(0, os.SEEK_END)
+        tail = b""
+        while len(tail) < size and tail.count(b"\n") < 2:
+            step = min(64 * 1024, size - len(tail))
+            file.seek(size - len(tail) - step)
+            tail = file.read(step) + tail
+
+        end = tail.rfind(b"\n") + 1
+        file.truncate(size - len(tail) + end)
+
+    lines = tail[:end].splitlines()
+    return json.loads(lines[-1])["id"] if lines else None
+
+
+# ---------------- CLI ----------------
+
+@click.command("export")
+@click.argument("resource", type=click.Choice(list(EXPORTS)))
+@click.argument("output", type=click.Path(dir_okay=False))
+@click.option("--after", default=None, help="Start after this id.")
+@click.option("--resume", is_flag=True, help="Append to OUTPUT, continuing after its last line.")
+@click.option("--batch-size", default=1000, show_default=True, help="Rows fetched per round trip.")
+@with_appcontext
+def export_command(resource, output, after, resume, batch_size):
+    """Write RESOURCE to OUTPUT as newline-delimited JSON."""
+    mode = "w"
+    if resume and os.path.exists(output):
+        after = _last_exported_id(output) or after
+        mode = "a"
+
+    exported = 0
+    with open(output, mode) as file:
+        for chunk in export_lines(resource, after, batch_size):
+            file.write(chunk)
+            file.flush()
+            exported += chunk.count("\n")
+            click.echo(f"{resource}: {exported} rows", err=True)
+
+    click.echo(f"Exported {exported} {resource} to {output}.")
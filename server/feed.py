@@ -0,0 +1,185 @@
+import math
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import and_, func, insert, or_, select, tuple_
+from models import db, User, Post, TimelineEntry, SpaceMembership, friends_association
+from jobs import job_handler, enqueue
+
+
+# ---------------- Home feed ----------------
+#
+# Each user has a materialized timeline in timeline_entries: one row per post
+# from the user, their friends and members of their spaces, ranked by post time
+# plus a boost for friends. Writing a post fans it out to that audience in a
+# background job; reading a feed is a single range read on (user_id, rank).
+# Authors whose audience exceeds FEED_FANOUT_LIMIT are flagged fanout_on_read
+# and their posts are merged in when the feed is read instead.
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def post_rank(created_at, boost=0):
+    return ((created_at or datetime.utcnow()) - EPOCH).total_seconds() + boost
+
+
+def _followers(author_id):
+    # Users who have the author in their friends list
+    author_pk = select(User.pk).where(User.id == author_id).scalar_subquery()
+    return select(User.id) \
+        .join(friends_association, friends_association.c.user_pk == User.pk) \
+        .where(friends_association.c.friend_pk == author_pk)
+
+
+def _friends(user):
+    return select(User.id) \
+        .join(friends_association, friends_association.c.friend_pk == User.pk) \
+        .where(friends_association.c.user_pk == user.pk)
+
+
+def _space_peers(user_id):
+    spaces = select(SpaceMembership.space_id).where(SpaceMembership.user_id == user_id)
+    return select(SpaceMembership.user_id).where(SpaceMembership.space_id.in_(spaces))
+
+
+@job_handler("fan_out_post", concurrency=4)
+def fan_out_post(post_id):
+    post = Post.query.filter_by(id=post_id).first()
+    if not post:
+        return
+
+    limit = current_app.config["FEED_FANOUT_LIMIT"]
+    boost = current_app.config["FEED_FRIEND_BOOST"]
+
+    followers = {row[0] for row in db.session.execute(_followers(post.user_id).limit(limit + 1))}
+    peers = {row[0] for row in db.session.execute(_space_peers(post.user_id).distinct().limit(limit + 1))}
+    audience = followers | peers
+
+    author = User.query.filter_by(id=post.user_id).first()
+    if len(audience) > limit and not author.fanout_on_read:
+        # Readers merge this author's posts in from now on, so the copies
+        # already fanned out would show up twice
+        TimelineEntry.query.filter(
+            TimelineEntry.post_id.in_(select(Post.id).where(Post.user_id == author.id)),
+            TimelineEntry.user_id != author.id,
+        ).delete(synchronize_session=False)
+    author.fanout_on_read = len(audience) > limit
+    if author.fanout_on_read:
+        audience = set()
+    audience.add(post.user_id)
+
+    # Retried jobs start over rather than tripping on the rows they already wrote
+    TimelineEntry.query.filter_by(post_id=post.id).delete()
+
+    rank = post_rank(post.created_at)
+    rows = [{
+        "user_id": user_id,
+        "post_id": post.id,
+        "rank": rank + boost if user_id in followers else rank,
+    } for user_id in audience]
+
+    batch_size = current_app.config["FEED_FANOUT_BATCH_SIZE"]
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(insert(TimelineEntry), rows[start:start + batch_size])
+
+
+def fan_out_later(post):
+    enqueue("fan_out_post", {"post_id": post.id})
+
+
+def _read_side_authors(user):
+    # Heavily followed authors the reader would have received posts from
+    friends = _friends(user)
+    rows = db.session.query(User.id, User.id.in_(friends)) \
+        .filter(User.fanout_on_read.is_(True), User.id != user.id) \
+        .filter(or_(User.id.in_(friends), User.id.in_(_space_peers(user.id)))) \
+        .all()
+    return {author_id: bool(is_friend) for author_id, is_friend in rows}
+
+
+def read_feed(user, limit=20, before=None):
+    """Return up to `limit` (post_id, rank) pairs, newest and most relevant
+    first. `before` is the (rank, post_id) of the last entry already seen."""
+    query = db.session.query(TimelineEntry.post_id, TimelineEntry.rank).filter(TimelineEntry.user_id == user.id)
+    if before is not None:
+        query = query.filter(tuple_(TimelineEntry.rank, TimelineEntry.post_id) < tuple_(*before))
+    entries = query.order_by(TimelineEntry.rank.desc(), TimelineEntry.post_id.desc()).limit(limit).all()
+
+    authors = _read_side_authors(user)
+    if authors:
+        boost = current_app.config["FEED_FRIEND_BOOST"]
+        posts = db.session.query(Post.id, Post.user_id, Post.created_at).filter(Post.user_id.in_(list(authors)))
+        if before is not None:
+            # A friend's post ranks `boost` above its creation time
+            friends = [author_id for author_id, is_friend in authors.items() if is_friend]
+            others = [author_id for author_id, is_friend in authors.items() if not is_friend]
+            posts = posts.filter(or_(
+                and_(Post.user_id.in_(friends), Post.created_at <= EPOCH + timedelta(seconds=before[0] - boost)),
+                and_(Post.user_id.in_(others), Post.created_at <= EPOCH + timedelta(seconds=before[0])),
+            ))
+        posts = posts.order_by(Post.created_at.desc()).limit(limit).all()
+
+        seen = {post_id for post_id, _ in entries}
+        for post_id, author_id, created_at in posts:
+            rank = post_rank(created_at, boost if authors[author_id] else 0)
+            if post_id not in seen and (before is None or (rank, post_id) < tuple(before)):
+                entries.append((post_id, rank))
+
+    entries.sort(key=lambda entry: (entry[1], entry[0]), reverse=True)
+    return entries[:limit]
+
+
+def feed_cursor(entry):
+    post_id, rank = entry
+    return f"{rank!r}:{post_id}"
+
+
+def parse_feed_cursor(raw):
+    """Parse a cursor from feed_cursor; raises ValueError for anything else."""
+    if raw is None:
+        return None
+    rank, _, post_id = raw.partition(":")
+    rank = float(rank)
+    if not post_id or not math.isfinite(rank):
+        raise ValueError(f"Invalid feed cursor {raw!r}")
+    return rank, post_id
+
+
+def remove_post(post_id):
+    TimelineEntry.query.filter_by(post_id=post_id).delete()
+
+
+# ---------------- CLI ----------------
+
+feed_cli = AppGroup("feed", help="Maintain materialized home timelines.")
+
+
+@feed_cli.command("backfill")
+@click.option("--days", default=14, show_default=True, help="Fan out posts newer than this.")
+def backfill_command(days):
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    post_ids = [row.id for row in db.session.query(Post.id).filter(Post.created_at >= cutoff)]
+    for post_id in post_ids:
+        fan_out_post(post_id)
+        db.session.commit()
+    click.echo(f"Fanned out {len(post_ids)} posts.")
+
+
+@feed_cli.command("trim")
+@click.option("--keep", default=800, show_default=True, help="Entries kept per timeline.")
+def trim_command(keep):
+    user_ids = [row.user_id for row in db.session.query(TimelineEntry.user_id)
+                .group_by(TimelineEntry.user_id)
+                .having(func.count() > keep)]
+    for user_id in user_ids:
+        cutoff = db.session.query(TimelineEntry.rank) \
+            .filter_by(user_id=user_id) \
+            .order_by(TimelineEntry.rank.desc()) \
+            .offset(keep - 1) \
+            .limit(1) \
+            .scalar()
+        TimelineEntry.query.filter(TimelineEntry.user_id == user_id, TimelineEntry.rank < cutoff).delete()
+        db.session.commit()
+    click.echo(f"Trimmed {len(user_ids)} timelines.")
@@ -0,0 +1,64 @@
+from sqlalchemy import DDL, event, text
+from models import User, Post, Comment
+
+
+# ---------------- Full-text search ----------------
+#
+# SQLite FTS5 external-content tables mirror the searchable text columns of the
+# large tables. Triggers keep them in sync, so a MATCH against `<table>_fts`
+# replaces an ILIKE scan of the whole base table.
+
+FTS_COLUMNS = {
+    User.__table__: ("first_name", "last_name", "email", "occupation"),
+    Post.__table__: ("content", "first_name", "last_name"),
+    Comment.__table__: ("content",),
+}
+
+
+def _fts_statements(table, columns):
+    name = table.name
+    cols = ", ".join(columns)
+    new_cols = ", ".join(f"new.{column}" for column in columns)
+    old_cols = ", ".join(f"old.{column}" for column in columns)
+
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {name}_fts USING fts5({cols}, content='{name}', content_rowid='rowid')",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_fts_ai AFTER INSERT ON {name} BEGIN "
+        f"INSERT INTO {name}_fts(rowid, {cols}) VALUES (new.rowid, {new_cols}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_fts_ad AFTER DELETE ON {name} BEGIN "
+        f"INSERT INTO {name}_fts({name}_fts, rowid, {cols}) VALUES ('delete', old.rowid, {old_cols}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_fts_au AFTER UPDATE ON {name} BEGIN "
+        f"INSERT INTO {name}_fts({name}_fts, rowid, {cols}) VALUES ('delete', old.rowid, {old_cols}); "
+        f"INSERT INTO {name}_fts(rowid, {cols}) VALUES (new.rowid, {new_cols}); END",
+    ]
+
+
+for _table, _columns in FTS_COLUMNS.items():
+    for _statement in _fts_statements(_table, _columns):
+        event.listen(_table, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+
+
+def rebuild_fts(connection):
+    # For databases created before the FTS tables existed, or after a VACUUM
+    # renumbered the rowids of a table without an INTEGER PRIMARY KEY
+    for table, columns in FTS_COLUMNS.items():
+        for statement in _fts_statements(table, columns):
+            connection.execute(text(statement))
+        connection.execute(text(f"INSERT INTO {table.name}_fts({table.name}_fts) VALUES ('rebuild')"))
+
+
+def has_fts(model):
+    return model.__table__ in FTS_COLUMNS
+
+
+def fts_query(search):
+    # Quote every term so user input can't inject FTS5 syntax; the trailing *
+    # keeps the admin's "starts with" feel
+    terms = [term.replace('"', '""') for term in search.split() if term]
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def fts_filter(model, search):
+    name = model.__table__.name
+    return text(f"{name}.rowid IN (SELECT rowid FROM {name}_fts WHERE {name}_fts MATCH :fts_query)") \
+        .bindparams(fts_query=fts_query(search))
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, g, jsonify, request, request_finished, session
+from redis_store import redis_for
+
+
+# ---------------- Idempotency keys ----------------
+#
+# POST, PUT and PATCH requests from a logged-in user carrying an
+# Idempotency-Key header are recorded per user. The first request reserves the
+# key; its response is stored when it finishes, with its headers except
+# Set-Cookie, and replayed for retries with the same key, so a retry storm
+# never repeats the write. A retry that arrives while the original is still
+# running gets 409, and reusing a key with a different body gets 422.
+#
+# Anonymous requests and the routes that hand out sessions are never recorded:
+# an IP address doesn't tell clients behind one NAT apart, and a replayed
+# session cookie would log one client in as another.
+
+IDEMPOTENT_METHODS = ("POST", "PUT", "PATCH")
+FORM_MIMETYPES = ("multipart/form-data", "application/x-www-form-urlencoded")
+STREAM_MIMETYPES = ("application/octet-stream", "application/offset+octet-stream")
+# Recomputed for the replayed response, or never shared with another request
+UNSTORED_HEADERS = ("content-length", "idempotent-replayed", "set-cookie")
+SESSION_ENDPOINTS = ("api.login_user", "api.register_user", "api.logout_user")
+
+
+def request_fingerprint():
+    digest = hashlib.sha256()
+    if request.mimetype in FORM_MIMETYPES:
+        # Reading the raw body here would leave nothing for the form parser
+        for name, value in sorted(request.form.items(multi=True)):
+            digest.update(f"{name}={value}\n".encode())
+        for name, file in sorted(request.files.items(multi=True), key=lambda item: item[0]):
+            digest.update(f"{name}:{file.filename}\n".encode())
+            # Parsed files are spooled, so they can be hashed here and rewound for the route
+            while chunk := file.stream.read(64 * 1024):
+                digest.update(chunk)
+            file.stream.seek(0)
+    elif request.mimetype in STREAM_MIMETYPES:
+        # Upload chunks are streamed to disk, so they are identified by their headers
+        for name in ("Content-Length", "Upload-Offset", "Upload-Checksum"):
+            digest.update(f"{name}={request.headers.get(name, '')}\n".encode())
+    else:
+        digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+class MemoryStore:
+    def __init__(self, max_keys=50000):
+        self.max_keys = max_keys
+        self.records = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _get(self, key):
+        entry = self.records.get(key)
+        if entry is None:
+            return None
+        expires_at, record = entry
+        if expires_at < time.monotonic():
+            del self.records[key]
+            return None
+        return record
+
+    def reserve(self, key, record, ttl):
+        with self.lock:
+            existing = self._get(key)
+            if existing is not None:
+                return existing
+
+            self.records[key] = (time.monotonic() + ttl, record)
+            if len(self.records) > self.max_keys:
+                self.records.popitem(last=False)
+            return None
+
+    def save(self, key, record, ttl):
+        with self.lock:
+            self.records[key] = (time.monotonic() + ttl, record)
+
+    def release(self, key):
+        with self.lock:
+            self.records.pop(key, None)
+
+
+class RedisStore:
+    def __init__(self, client, prefix="idempotency:"):
+        self.client = client
+        self.prefix = prefix
+
+    def reserve(self, key, record, ttl):
+        if self.client.set(self.prefix + key, json.dumps(record), nx=True, ex=ttl):
+            return None
+        existing = self.client.get(self.prefix + key)
+        return json.loads(existing) if existing else None
+
+    def save(self, key, record, ttl):
+        self.client.set(self.prefix + key, json.dumps(record), ex=ttl)
+
+    def release(self, key):
+        self.client.delete(self.prefix + key)
+
+
+class Idempotency:
+    def __init__(self, app=None):
+        self.store = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if app.config["IDEMPOTENCY_BACKEND"] == "redis":
+            client = app.config.get("SESSION_REDIS") or redis_for(app)
+            self.store = RedisStore(client)
+        else:
+            self.store = MemoryStore()
+
+        app.before_request(self.before_request)
+        # Sent after the session has been saved, so Set-Cookie is on the response
+        request_finished.connect(self.request_finished, app)
+        app.teardown_request(self.teardown_request)
+
+    def before_request(self):
+        header = request.headers.get("Idempotency-Key")
+        if not header or request.method not in IDEMPOTENT_METHODS or request.blueprint != "api":
+            return None
+        if request.endpoint in SESSION_ENDPOINTS:
+            return None
+
+        user_id = session.get("user_id")
+        if not user_id:
+            return None
+        key = f"{user_id}:{request.method}:{request.path}:{header}"
+        fingerprint = request_fingerprint()
+
+        existing = self.store.reserve(
+            key, {"state": "pending", "fingerprint": fingerprint}, current_app.config["IDEMPOTENCY_PENDING_TTL"]
+        )
+        if existing is None:
+            g.idempotency_key = key
+            g.idempotency_fingerprint = fingerprint
+            return None
+
+        if existing["fingerprint"] != fingerprint:
+            return jsonify({"error": "Idempotency-Key was already used with a different request"}), 422
+        if existing["state"] == "pending":
+            return jsonify({"error": "A request with this Idempotency-Key is still being processed"}), 409
+
+        response = current_app.response_class(existing["body"], status=existing["status"], headers=existing["headers"])
+        response.headers["Idempotent-Replayed"] = "true"
+        return response
+
+    def request_finished(self, sender, response, **extra):
+        key = g.pop("idempotency_key", None)
+        if key is None:
+            return
+
+        if response.status_code >= 500 or response.is_streamed:
+            # Let the client retry a failed write instead of replaying the failure
+            self.store.release(key)
+            return
+
+        self.store.save(key, {
+            "state": "done",
+            "fingerprint": g.idempotency_fingerprint,
+            "status": response.status_code,
+            "headers": [
+                (name, value) for name, value in response.headers.items()
+                # CORS headers belong to the retrying request's origin, not the original's
+                if name.lower() not in UNSTORED_HEADERS and not name.lower().startswith("access-control-")
+            ],
+            "body": response.get_data(as_text=True),
+        }, current_app.config["IDEMPOTENCY_TTL"])
+
+    def teardown_request(self, exc):
+        key = g.pop("idempotency_key", None)
+        if key is not None:
+            self.store.release(key)
+
+
+idempotency = Idempotency()
@@ -0,0 +1,223 @@
+import json
+import multiprocessing
+import random
+import signal
+import time
+import traceback
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import and_, case, func, or_, select, update
+from models import db, Job
+
+
+# ---------------- Background jobs ----------------
+#
+# Jobs are rows in the `jobs` table. Request handlers call `enqueue()`, which
+# only adds the row to the current session, so the job is committed atomically
+# with the write that caused it. `flask jobs work` runs one or more worker
+# processes that claim due jobs, run the registered handler and retry failures
+# with exponential backoff.
+
+class JobHandler:
+    def __init__(self, func, concurrency=None, max_attempts=5):
+        self.func = func
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+
+
+handlers = {}
+
+
+def job_handler(job_type, concurrency=None, max_attempts=5):
+    def decorator(func):
+        handlers[job_type] = JobHandler(func, concurrency, max_attempts)
+        return func
+    return decorator
+
+
+def enqueue(job_type, payload=None, idempotency_key=None, delay=0):
+    handler = handlers[job_type]
+    payload = payload or {}
+
+    if current_app.config["JOBS_EAGER"]:
+        handler.func(**payload)
+        return None
+
+    if idempotency_key:
+        existing = Job.query.filter_by(idempotency_key=idempotency_key).first()
+        if existing:
+            return existing
+
+    job = Job(
+        job_type=job_type,
+        payload=json.dumps(payload),
+        idempotency_key=idempotency_key,
+        max_attempts=handler.max_attempts,
+        run_at=datetime.utcnow() + timedelta(seconds=delay),
+    )
+    db.session.add(job)
+    return job
+
+
+def backoff_delay(attempts):
+    base = current_app.config["JOBS_BACKOFF_BASE"]
+    cap = current_app.config["JOBS_BACKOFF_MAX"]
+    # Full jitter keeps retries from a burst of failures from lining up again
+    return random.uniform(0, min(cap, base * 2 ** (attempts - 1)))
+
+
+def claim_next():
+    now = datetime.utcnow()
+    stale_before = now - timedelta(seconds=current_app.config["JOBS_LOCK_TIMEOUT"])
+
+    # Due jobs, plus running jobs whose worker died without releasing them;
+    # each reclaim counts as an attempt, so a job that keeps killing its worker
+    # fails like one that keeps raising
+    claimable = or_(
+        and_(Job.status == "queued", Job.run_at <= now),
+        and_(Job.status == "running", Job.locked_at < stale_before),
+    )
+    candidates = db.session.query(Job.id, Job.job_type, Job.status, Job.locked_at) \
+        .filter(claimable, Job.job_type.in_(list(handlers))) \
+        .order_by(Job.run_at) \
+        .limit(20) \
+        .all()
+    db.session.rollback()
+
+    for job_id, job_type, status, locked_at in candidates:
+        conditions = [Job.id == job_id, Job.status == status]
+        if locked_at is not None:
+            conditions.append(Job.locked_at == locked_at)
+
+        concurrency = handlers[job_type].concurrency
+        if concurrency:
+            # Checked inside the UPDATE so two workers can't both take the last slot
+            running = select(func.count()).select_from(Job.__table__) \
+                .where(Job.job_type == job_type, Job.status == "running", Job.locked_at >= stale_before) \
+                .scalar_subquery()
+            conditions.append(running < concurrency)
+
+        values = {"status": "running", "locked_at": now}
+        if status == "running":
+            values.update(
+                attempts=Job.attempts + 1,
+                status=case((Job.attempts + 1 >= Job.max_attempts, "failed"), else_="running"),
+                last_error="The worker running this job stopped without releasing it",
+            )
+        result = db.session.execute(update(Job).where(*conditions).values(**values))
+        db.session.commit()
+
+        if result.rowcount == 1:
+            job = db.session.get(Job, job_id)
+            db.session.refresh(job)
+            if job.status == "running":
+                return job
+
+    return None
+
+
+def run_job(job):
+    handler = handlers[job.job_type]
+    job_id = job.id
+
+    try:
+        handler.func(**json.loads(job.payload))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        job.attempts += 1
+        job.last_error = traceback.format_exc()
+        job.locked_at = None
+
+        if job.attempts >= job.max_attempts:
+            job.status = "failed"
+        else:
+            job.status = "queued"
+            job.run_at = datetime.utcnow() + timedelta(seconds=backoff_delay(job.attempts))
+
+        db.session.commit()
+        return False
+
+    job = db.session.get(Job, job_id)
+    job.status = "done"
+    job.locked_at = None
+    db.session.commit()
+    return True
+
+
+def work(poll_interval=1.0, burst=False):
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+
+    while not stopping:
+        job = claim_next()
+
+        if job is None:
+            if burst:
+                return
+            time.sleep(poll_interval)
+            continue
+
+        run_job(job)
+
+
+def _worker_process(config_class, poll_interval, burst):
+    from app import create_app
+
+    app = create_app(config_class)
+    with app.app_context():
+        work(poll_interval, burst)
+
+
+# ---------------- CLI ----------------
+
+jobs_cli = AppGroup("jobs", help="Run and inspect background jobs.")
+
+
+@jobs_cli.command("work")
+@click.option("--processes", default=1, show_default=True, help="Number of worker processes.")
+@click.option("--poll-interval", default=1.0, show_default=True, help="Seconds to wait when the queue is empty.")
+@click.option("--burst", is_flag=True, help="Exit once no job is due.")
+def work_command(processes, poll_interval, burst):
+    if processes == 1:
+        work(poll_interval, burst)
+        return
+
+    # Each process builds its own app and engine; nothing is shared across fork
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=_worker_process, args=(current_app.config["CONFIG_CLASS"], poll_interval, burst))
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+
+
+@jobs_cli.command("status")
+def status_command():
+    counts = db.session.query(Job.job_type, Job.status, func.count()) \
+        .group_by(Job.job_type, Job.status) \
+        .order_by(Job.job_type, Job.status) \
+        .all()
+    for job_type, status, count in counts:
+        click.echo(f"{job_type:<30} {status:<10} {count}")
+
+
+@jobs_cli.command("purge")
+@click.option("--older-than-days", default=7, show_default=True)
+def purge_command(older_than_days):
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    deleted = Job.query.filter(Job.status == "done", Job.created_at < cutoff).delete()
+    db.session.commit()
+    click.echo(f"Deleted {deleted} finished jobs.")
@@ -1,31 +1,61 @@
+import secrets
+import threading
+import time
 from flask_sqlalchemy import SQLAlchemy
-from uuid import uuid4
 from datetime import datetime
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+_uuid_lock = threading.Lock()
+_uuid_last_ms = 0
+_uuid_sequence = 0
 
 def get_uuid():
-    return uuid4().hex
+    # UUIDv7 layout: a 48-bit millisecond timestamp leads, so ids sort by
+    # creation time and new rows append to the right edge of id indexes.
+    # Ids minted in the same millisecond count up through the 12-bit sequence.
+    global _uuid_last_ms, _uuid_sequence
+    with _uuid_lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _uuid_last_ms:
+            _uuid_last_ms = now_ms
+            _uuid_sequence = secrets.randbits(11)
+        else:
+            _uuid_sequence += 1
+            if _uuid_sequence > 0xFFF:
+                _uuid_last_ms += 1
+                _uuid_sequence = 0
+        timestamp, sequence = _uuid_last_ms, _uuid_sequence
+
+    value = (timestamp << 80) | (0x7 << 76) | (sequence << 64) | (0b10 << 62) | secrets.randbits(62)
+    return f"{value:032x}"
 
 
 # ---------------- Association Tables ----------------
+#
+# The hot many-to-many tables reference users and posts by their integer
+# surrogate keys (pk), not the 32-character public ids.
 
 friends_association = db.Table(
     'friends_association',
-    db.Column('user_id', db.String(32), db.ForeignKey('users.id')),
-    db.Column('friend_id', db.String(32), db.ForeignKey('users.id'))
+    db.Column('user_pk', db.Integer, db.ForeignKey('users.pk'), primary_key=True),
+    db.Column('friend_pk', db.Integer, db.ForeignKey('users.pk'), primary_key=True),
+    db.Index('ix_friends_association_friend_pk', 'friend_pk')
 )
 
 likes_association = db.Table(
     'likes_association',
-    db.Column('user_id', db.String(32), db.ForeignKey('users.id')),
-    db.Column('post_id', db.String(32), db.ForeignKey('posts.id'))
+    db.Column('user_pk', db.Integer, db.ForeignKey('users.pk'), primary_key=True),
+    db.Column('post_pk', db.Integer, db.ForeignKey('posts.pk'), primary_key=True),
+    db.Index('ix_likes_association_post_pk', 'post_pk')
 )
 
 dislikes_association = db.Table(
     'dislikes_association',
-    db.Column('user_id', db.String(32), db.ForeignKey('users.id')),
-    db.Column('post_id', db.String(32), db.ForeignKey('posts.id'))
+    db.Column('user_pk', db.Integer, db.ForeignKey('users.pk'), primary_key=True),
+    db.Column('post_pk', db.Integer, db.ForeignKey('posts.pk'), primary_key=True),
+    db.Index('ix_dislikes_association_post_pk', 'post_pk')
 )
 
 
@@ -34,14 +64,22 @@ dislikes_association = db.Table(
 class User(db.Model):
     __tablename__ = 'users'
 
-    id = db.Column(db.String(32), primary_key=True, unique=True, default=get_uuid)
+    pk = db.Column(db.Integer, primary_key=True)
+    id = db.Column(db.String(32), unique=True, nullable=False, default=get_uuid)
     first_name = db.Column(db.String(300))
     last_name = db.Column(db.String(300))
     email = db.Column(db.String(345), unique=True)
     password = db.Column(db.Text, nullable=False)
     picture_path = db.Column(db.String(255))
     occupation = db.Column(db.String(100))
+    occupation_key = db.Column(db.String(100), index=True)
     location = db.Column(db.String(100))
+    # Bumped whenever the name, picture or occupation shown on user cards changes
+    profile_version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+    # Bumped whenever the user joins or leaves a space
+    membership_version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+    # Set once the user's audience is too large to fan posts out on write
+    fanout_on_read = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
 
     posts = db.relationship('Post', backref='user', lazy=True)
     comments = db.relationship('Comment', backref='user', lazy=True)
@@ -51,8 +89,8 @@ class User(db.Model):
     friends = db.relationship(
         'User',
         secondary=friends_association,
-        primaryjoin=(friends_association.c.user_id == id),
-        secondaryjoin=(friends_association.c.friend_id == id),
+        primaryjoin=(friends_association.c.user_pk == pk),
+        secondaryjoin=(friends_association.c.friend_pk == pk),
         backref=db.backref('friends_association', lazy='dynamic')
     )
 
@@ -72,12 +110,36 @@ class User(db.Model):
     )
 
 
+# ---------------- Occupation matching ----------------
+
+class OccupationToken(db.Model):
+    __tablename__ = 'occupation_tokens'
+
+    token = db.Column(db.String(100), primary_key=True)
+    occupation_key = db.Column(db.String(100), primary_key=True)
+
+
+class OccupationMatch(db.Model):
+    __tablename__ = 'occupation_matches'
+    __table_args__ = (
+        db.Index('ix_occupation_matches_rank', 'occupation_key', 'score', 'user_id'),
+    )
+
+    occupation_key = db.Column(db.String(100), primary_key=True)
+    user_id = db.Column(db.String(32), db.ForeignKey('users.id'), primary_key=True, index=True)
+    score = db.Column(db.Float, nullable=False)
+
+
 # ---------------- Post ----------------
 
 class Post(db.Model):
     __tablename__ = 'posts'
+    __table_args__ = (
+        db.Index('ix_posts_user_id_created_at', 'user_id', 'created_at'),
+    )
 
-    id = db.Column(db.String(32), primary_key=True, unique=True, default=get_uuid)
+    pk = db.Column(db.Integer, primary_key=True)
+    id = db.Column(db.String(32), unique=True, nullable=False, default=get_uuid)
     user_id = db.Column(db.String(32), db.ForeignKey('users.id'), nullable=False)
     first_name = db.Column(db.String(300))
     last_name = db.Column(db.String(300))
@@ -106,10 +168,42 @@ class Post(db.Model):
         return len(self.dislikes)
 
 
+# ---------------- ArchivedPost ----------------
+#
+# Thin index of posts moved to the cold archive; the content lives there.
+
+class ArchivedPost(db.Model):
+    __tablename__ = 'archived_posts'
+    __table_args__ = (
+        db.Index('ix_archived_posts_user_id_created_at', 'user_id', 'created_at'),
+    )
+
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.String(32), nullable=False)
+    created_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# ---------------- TimelineEntry ----------------
+
+class TimelineEntry(db.Model):
+    __tablename__ = 'timeline_entries'
+    __table_args__ = (
+        db.Index('ix_timeline_entries_user_rank', 'user_id', 'rank', 'post_id'),
+    )
+
+    user_id = db.Column(db.String(32), db.ForeignKey('users.id'), primary_key=True)
+    post_id = db.Column(db.String(32), db.ForeignKey('posts.id'), primary_key=True, index=True)
+    rank = db.Column(db.Float, nullable=False)
+
+
 # ---------------- Comment ----------------
 
 class Comment(db.Model):
     __tablename__ = 'comments'
+    __table_args__ = (
+        db.Index('ix_comments_post_id_created_at', 'post_id', 'created_at'),
+    )
 
     id = db.Column(db.String(32), primary_key=True, unique=True, default=get_uuid)
     post_id = db.Column(db.String(32), db.ForeignKey('posts.id'), nullable=False)
@@ -142,10 +236,13 @@ class Space(db.Model):
         return user_id in [member.id for member in self.members]
 
     def add_member(self, user_id):
-        user = User.query.get(user_id)
+        user = User.query.filter_by(id=user_id).first()
         if user and user not in self.members:
             self.members.append(user)
 
+    def remove_member(self, user_id):
+        self.members = [member for member in self.members if member.id != user_id]
+
 
 # ---------------- SpaceMembership ----------------
 
@@ -153,13 +250,17 @@ class SpaceMembership(db.Model):
     __tablename__ = 'space_memberships'
 
     user_id = db.Column(db.String(32), db.ForeignKey('users.id'), primary_key=True)
-    space_id = db.Column(db.String(32), db.ForeignKey('spaces.id'), primary_key=True)
+    space_id = db.Column(db.String(32), db.ForeignKey('spaces.id'), primary_key=True, index=True)
 
 
 # ---------------- Discussion ----------------
 
 class Discussion(db.Model):
     __tablename__ = 'discussions'
+    __table_args__ = (
+        db.Index('ix_discussions_space_id_created_at', 'space_id', 'created_at'),
+        db.Index('ix_discussions_user_id_created_at', 'user_id', 'created_at'),
+    )
 
     id = db.Column(db.String(32), primary_key=True, unique=True, default=get_uuid)
     user_id = db.Column(db.String(32), db.ForeignKey('users.id'), nullable=False)
@@ -176,6 +277,11 @@ class Discussion(db.Model):
 
 class DiscussionComment(db.Model):
     __tablename__ = 'discussion_comments'
+    __table_args__ = (
+        db.Index('ix_discussion_comments_discussion_id_created_at', 'discussion_id', 'created_at'),
+        db.Index('ix_discussion_comments_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_discussion_comments_space_id', 'space_id'),
+    )
 
     id = db.Column(db.String(32), primary_key=True, unique=True, default=get_uuid)
     user_id = db.Column(db.String(32), db.ForeignKey('users.id'), nullable=False)
@@ -183,4 +289,83 @@ class DiscussionComment(db.Model):
     title = db.Column(db.String(255), nullable=False)
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    discussion_id = db.Column(db.String(32), db.ForeignKey('discussions.id'), nullable=False)
\ No newline at end of file
+    discussion_id = db.Column(db.String(32), db.ForeignKey('discussions.id'), nullable=False)
+
+
+# ---------------- Discussion partitions ----------------
+#
+# Where each space's discussions live when DISCUSSION_PARTITIONS is set, and
+# which space each partitioned discussion belongs to, so it can be found by id.
+
+class SpacePartition(db.Model):
+    __tablename__ = 'space_partitions'
+
+    space_id = db.Column(db.String(32), db.ForeignKey('spaces.id'), primary_key=True)
+    # None keeps the space's discussions in the primary database
+    partition = db.Column(db.String(100))
+    # Set while the space is copied to another partition; writes are refused
+    moving = db.Column(db.Boolean, nullable=False, default=False)
+
+
+class DiscussionLocation(db.Model):
+    __tablename__ = 'discussion_locations'
+
+    discussion_id = db.Column(db.String(32), primary_key=True)
+    space_id = db.Column(db.String(32), nullable=False, index=True)
+
+# ---------------- UserSettings ----------------
+
+class UserSettings(db.Model):
+    __tablename__ = 'user_settings'
+
+    user_id = db.Column(db.String(32), db.ForeignKey('users.id'), primary_key=True)
+    data = db.Column(db.JSON, nullable=False, default=dict)
+    # Bumped on every write; concurrent writers fail with StaleDataError
+    version = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __mapper_args__ = {"version_id_col": version}
+
+
+# ---------------- Upload ----------------
+
+class Upload(db.Model):
+    __tablename__ = 'uploads'
+    __table_args__ = (
+        db.Index('ix_uploads_status_updated_at', 'status', 'updated_at'),
+    )
+
+    id = db.Column(db.String(32), primary_key=True, unique=True, default=get_uuid)
+    user_id = db.Column(db.String(32), db.ForeignKey('users.id'), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    # Hex SHA-256 of the whole file, checked before it is finalized
+    sha256 = db.Column(db.String(64))
+    # Bytes received and fsynced so far; the next chunk must start here
+    offset = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    # Name of the finished file in the assets directory
+    path = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+# ---------------- Job ----------------
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_at', 'status', 'run_at'),
+    )
+
+    id = db.Column(db.String(32), primary_key=True, unique=True, default=get_uuid)
+    job_type = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    idempotency_key = db.Column(db.String(255), unique=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,169 @@
+import re
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import func
+from models import db, User, OccupationToken, OccupationMatch
+from jobs import job_handler
+
+
+# ---------------- Occupation matching ----------------
+#
+# Occupations are normalized into a key (case-folded, de-duplicated, sorted
+# tokens) so "Software Engineer" and "engineer, software" are the same
+# occupation. occupation_tokens maps each token to the keys containing it, and
+# occupation_matches holds a ranked, capped list of users per key, scored by
+# token overlap with that key. Reads are a range scan of one list.
+
+def occupation_tokens(occupation):
+    return sorted(set(re.findall(r"\w+", (occupation or "").casefold())))
+
+
+def occupation_key(occupation):
+    return " ".join(occupation_tokens(occupation))[:100] or None
+
+
+def similarity(key, other_key):
+    tokens, other_tokens = set(key.split()), set(other_key.split())
+    return len(tokens & other_tokens) / len(tokens | other_tokens)
+
+
+def _related_keys(key):
+    # Every key sharing at least one token with `key`, including `key` itself
+    rows = db.session.query(OccupationToken.occupation_key) \
+        .filter(OccupationToken.token.in_(key.split())) \
+        .distinct() \
+        .all()
+    return {row.occupation_key for row in rows}
+
+
+def _list_size(key):
+    return OccupationMatch.query.filter_by(occupation_key=key).count()
+
+
+def _trim(key, limit):
+    keep = db.session.query(OccupationMatch.user_id) \
+        .filter_by(occupation_key=key) \
+        .order_by(OccupationMatch.score.desc(), OccupationMatch.user_id.desc()) \
+        .limit(limit)
+    OccupationMatch.query \
+        .filter(OccupationMatch.occupation_key == key, OccupationMatch.user_id.not_in(keep)) \
+        .delete(synchronize_session=False)
+
+
+def rebuild_matches(key):
+    limit = current_app.config["OCCUPATION_MATCH_LIMIT"]
+    OccupationMatch.query.filter_by(occupation_key=key).delete()
+
+    ranked = sorted(_related_keys(key), key=lambda other: similarity(key, other), reverse=True)
+    remaining = limit
+    for other_key in ranked:
+        if remaining <= 0:
+            break
+
+        user_ids = db.session.query(User.id) \
+            .filter_by(occupation_key=other_key) \
+            .order_by(User.id.desc()) \
+            .limit(remaining) \
+            .all()
+        score = similarity(key, other_key)
+        db.session.add_all(
+            OccupationMatch(occupation_key=key, user_id=user_id, score=score) for (user_id,) in user_ids
+        )
+        remaining -= len(user_ids)
+
+
+def refresh_user(user):
+    """Move `user` into the lists matching its current occupation."""
+    limit = current_app.config["OCCUPATION_MATCH_LIMIT"]
+    key = occupation_key(user.occupation)
+    user.occupation_key = key
+
+    OccupationMatch.query.filter_by(user_id=user.id).delete()
+    if key is None:
+        return
+
+    is_new_key = OccupationToken.query.filter_by(occupation_key=key).first() is None
+    if is_new_key:
+        db.session.add_all(OccupationToken(token=token, occupation_key=key) for token in key.split())
+        db.session.flush()
+
+    for other_key in _related_keys(key):
+        if other_key == key and is_new_key:
+            continue
+
+        db.session.add(OccupationMatch(occupation_key=other_key, user_id=user.id, score=similarity(other_key, key)))
+        db.session.flush()
+        if _list_size(other_key) > limit:
+            _trim(other_key, limit)
+
+    if is_new_key:
+        rebuild_matches(key)
+
+
+@job_handler("refresh_occupation_matches")
+def refresh_occupation_matches(user_id):
+    user = User.query.filter_by(id=user_id).first()
+    if user:
+        refresh_user(user)
+
+
+def similar_users(user, page=1, per_page=20, session=None):
+    if not user.occupation_key:
+        return [], False
+
+    # One extra row tells the caller whether another page exists
+    rows = (session or db.session).query(User, OccupationMatch.score) \
+        .join(OccupationMatch, OccupationMatch.user_id == User.id) \
+        .filter(OccupationMatch.occupation_key == user.occupation_key, User.id != user.id) \
+        .order_by(OccupationMatch.score.desc(), OccupationMatch.user_id.desc()) \
+        .offset((page - 1) * per_page) \
+        .limit(per_page + 1) \
+        .all()
+    return rows[:per_page], len(rows) > per_page
+
+
+# ---------------- CLI ----------------
+
+occupations_cli = AppGroup("occupations", help="Maintain the occupation match index.")
+
+
+@occupations_cli.command("rebuild")
+@click.option("--batch-size", default=1000, show_default=True)
+def rebuild_command(batch_size):
+    OccupationMatch.query.delete()
+    OccupationToken.query.delete()
+
+    last_id = ""
+    while True:
+        users = User.query.filter(User.id > last_id).order_by(User.id).limit(batch_size).all()
+        if not users:
+            break
+        for user in users:
+            user.occupation_key = occupation_key(user.occupation)
+        last_id = users[-1].id
+        db.session.commit()
+
+    keys = [row.occupation_key for row in db.session.query(User.occupation_key)
+            .filter(User.occupation_key.isnot(None)).distinct()]
+    for key in keys:
+        db.session.add_all(OccupationToken(token=token, occupation_key=key) for token in key.split())
+    db.session.commit()
+
+    for key in keys:
+        rebuild_matches(key)
+        db.session.commit()
+
+    click.echo(f"Indexed {len(keys)} occupations.")
+
+
+@occupations_cli.command("stats")
+def stats_command():
+    rows = db.session.query(OccupationMatch.occupation_key, func.count()) \
+        .group_by(OccupationMatch.occupation_key) \
+        .order_by(func.count().desc()) \
+        .limit(20) \
+        .all()
+    for key, count in rows:
+        click.echo(f"{key:<60} {count}")
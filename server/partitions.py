@@ -0,0 +1,277 @@
+import heapq
+import zlib
+
+import click
+from flask import current_app, g
+from flask.cli import AppGroup
+from sqlalchemy import Column, Index, MetaData, Table, delete, func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import db, get_uuid, Discussion, DiscussionComment, DiscussionLocation, SpacePartition
+from replicas import _make_engine
+
+
+# ---------------- Discussion partitions ----------------
+#
+# DISCUSSION_PARTITIONS names databases that hold discussions and discussion
+# comments. A space is placed on one of DISCUSSION_HASH_PARTITIONS by a hash of
+# its id the first time someone writes to it, or pinned to a dedicated
+# partition of its own with `flask discussions move`; the placement is stored
+# in space_partitions so it survives adding partitions. Each partition is
+# reached through a Session whose binds send the two discussion models to that
+# partition's engine and everything else to the primary. Spaces with no
+# placement, and every space when no partitions are configured, use the
+# primary tables as before.
+
+PARTITIONED = (Discussion, DiscussionComment)
+
+
+def _partition_metadata():
+    # Partitions hold no users or spaces, so the copies carry no foreign keys
+    metadata = MetaData()
+    for model in PARTITIONED:
+        source = model.__table__
+        table = Table(source.name, metadata, *[
+            Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+            for column in source.columns
+        ])
+        for index in source.indexes:
+            Index(index.name, *[table.c[column.name] for column in index.columns])
+    return metadata
+
+
+class Partitions:
+    def __init__(self, app=None):
+        self.metadata = _partition_metadata()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions["partitions"] = {
+            name: _make_engine(app, uri) for name, uri in app.config["DISCUSSION_PARTITIONS"].items()
+        }
+        app.teardown_appcontext(self.teardown)
+
+    @property
+    def engines(self):
+        return current_app.extensions["partitions"]
+
+    def hash_partitions(self):
+        return current_app.config["DISCUSSION_HASH_PARTITIONS"] or sorted(self.engines)
+
+    def hash_partition(self, space_id):
+        names = self.hash_partitions()
+        return names[zlib.crc32(space_id.encode()) % len(names)]
+
+    def create_all(self, names=None):
+        for name in names or self.engines:
+            self.metadata.create_all(self.engines[name])
+
+    def session(self, name):
+        """The request's session for partition `name`; None is the primary."""
+        if name is None:
+            return db.session
+        sessions = g.setdefault("partition_sessions", {})
+        if name not in sessions:
+            engine = self.engines[name]
+            sessions[name] = Session(bind=db.engine, binds={model: engine for model in PARTITIONED})
+        return sessions[name]
+
+    def sessions(self):
+        """The primary plus every partition, for reads that span them all."""
+        return [db.session] + [self.session(name) for name in sorted(self.engines)]
+
+    def teardown(self, exception):
+        for session in g.pop("partition_sessions", {}).values():
+            session.close()
+
+    def _place(self, space_id):
+        # Spaces that already have discussions on the primary stay there until rebalanced
+        legacy = db.session.scalar(select(Discussion.id).where(Discussion.space_id == space_id).limit(1))
+        placement = SpacePartition(space_id=space_id, partition=None if legacy else self.hash_partition(space_id))
+        db.session.add(placement)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            placement = db.session.get(SpacePartition, space_id)
+        return placement
+
+    def session_for_space(self, space_id, write=False):
+        """Return the session holding space_id's discussions.
+
+        With write=True the space is placed if it has no partition yet, and
+        None is returned while the space is being moved.
+        """
+        if not self.engines:
+            return db.session
+
+        placement = db.session.get(SpacePartition, space_id)
+        if placement is None:
+            if not write:
+                return db.session
+            placement = self._place(space_id)
+        if write and placement.moving:
+            return None
+        return self.session(placement.partition)
+
+    def locate(self, discussion_id):
+        """Return (session, discussion), or (None, None) if it does not exist."""
+        session = db.session
+        if self.engines:
+            location = db.session.get(DiscussionLocation, discussion_id)
+            if location is not None:
+                session = self.session_for_space(location.space_id)
+
+        discussion = session.get(Discussion, discussion_id)
+        return (session, discussion) if discussion else (None, None)
+
+    def add(self, obj):
+        """Save a new Discussion or DiscussionComment in its space's partition.
+
+        Returns the session it was saved with, or None while the space is
+        being moved.
+        """
+        session = self.session_for_space(obj.space_id, write=True)
+        if session is None:
+            return None
+
+        if session is not db.session and isinstance(obj, Discussion):
+            obj.id = obj.id or get_uuid()
+            db.session.add(DiscussionLocation(discussion_id=obj.id, space_id=obj.space_id))
+            db.session.commit()
+
+        session.add(obj)
+        session.commit()
+        return session
+
+    def drop_space(self, space_id):
+        """Delete a space's discussions from wherever they live."""
+        session = self.session_for_space(space_id)
+        for model in reversed(PARTITIONED):
+            session.execute(delete(model).where(model.space_id == space_id))
+        session.commit()
+
+        if self.engines:
+            db.session.execute(delete(DiscussionLocation).where(DiscussionLocation.space_id == space_id))
+            db.session.execute(delete(SpacePartition).where(SpacePartition.space_id == space_id))
+
+    def move_space(self, space_id, target, batch_size=1000):
+        """Copy a space's discussions to partition `target` (None for the
+        primary), switch its placement and delete the old copy. Writes to the
+        space are refused while it moves. Returns the number of rows moved."""
+        placement = db.session.get(SpacePartition, space_id) or SpacePartition(space_id=space_id)
+        source = self.session(placement.partition)
+        if source is self.session(target):
+            return 0
+
+        placement.moving = True
+        db.session.add(placement)
+        db.session.commit()
+
+        destination = self.session(target)
+        moved = 0
+        try:
+            if target is not None:
+                self.create_all([target])
+            for model in PARTITIONED:
+                # A move that failed part way left rows behind; start over
+                destination.execute(delete(model).where(model.space_id == space_id))
+                rows = source.execute(
+                    select(model.__table__).where(model.space_id == space_id).execution_options(yield_per=batch_size)
+                )
+                for batch in rows.mappings().partitions():
+                    destination.execute(insert(model), [dict(row) for row in batch])
+                    moved += len(batch)
+            destination.commit()
+
+            if target is not None:
+                discussion_ids = destination.scalars(select(Discussion.id).where(Discussion.space_id == space_id)).all()
+                known = set(db.session.scalars(
+                    select(DiscussionLocation.discussion_id).where(DiscussionLocation.space_id == space_id)
+                ))
+                db.session.add_all([
+                    DiscussionLocation(discussion_id=discussion_id, space_id=space_id)
+                    for discussion_id in discussion_ids if discussion_id not in known
+                ])
+            placement.partition = target
+        except Exception:
+            destination.rollback()
+            raise
+        finally:
+            placement.moving = False
+            db.session.commit()
+
+        for model in reversed(PARTITIONED):
+            source.execute(delete(model).where(model.space_id == space_id))
+        source.commit()
+        return moved
+
+    def user_activity(self, user_id, limit=20):
+        """A user's newest discussions and discussion comments across every partition."""
+        items = []
+        for session in self.sessions():
+            for kind, model in (("discussion", Discussion), ("comment", DiscussionComment)):
+                rows = session.scalars(
+                    select(model).where(model.user_id == user_id).order_by(model.created_at.desc()).limit(limit)
+                )
+                items.extend((row.created_at, kind, row) for row in rows)
+        return heapq.nlargest(limit, items, key=lambda item: item[0])
+
+
+partitions = Partitions()
+
+
+# ---------------- CLI ----------------
+
+discussions_cli = AppGroup("discussions", help="Place and move per-space discussion partitions.")
+
+
+@discussions_cli.command("init")
+def init_command():
+    partitions.create_all()
+    click.echo(f"Created discussion tables in {len(partitions.engines)} partitions.")
+
+
+@discussions_cli.command("status")
+def status_command():
+    for session, name in zip(partitions.sessions(), [None] + sorted(partitions.engines)):
+        count = session.scalar(select(func.count()).select_from(Discussion))
+        click.echo(f"{name or 'primary'}: {count} discussions")
+
+
+@discussions_cli.command("move")
+@click.argument("space_id")
+@click.argument("partition")
+@click.option("--batch-size", default=1000, show_default=True)
+def move_command(space_id, partition, batch_size):
+    """Move SPACE_ID's discussions to PARTITION ("primary" for the main database)."""
+    target = None if partition == "primary" else partition
+    if target is not None and target not in partitions.engines:
+        raise click.BadParameter(f"Unknown partition {partition}")
+    moved = partitions.move_space(space_id, target, batch_size)
+    click.echo(f"Moved {moved} rows of space {space_id} to {partition}.")
+
+
+@discussions_cli.command("rebalance")
+@click.option("--dry-run", is_flag=True, help="Only list the moves.")
+@click.option("--batch-size", default=1000, show_default=True)
+def rebalance_command(dry_run, batch_size):
+    """Move every hash-placed or unplaced space to its hash partition.
+
+    Spaces pinned to a partition outside DISCUSSION_HASH_PARTITIONS stay put.
+    """
+    hashed = set(partitions.hash_partitions())
+    current = dict(db.session.execute(select(SpacePartition.space_id, SpacePartition.partition)).all())
+    for space_id in db.session.scalars(select(Discussion.space_id).distinct()):
+        current.setdefault(space_id, None)
+
+    for space_id, partition in sorted(current.items()):
+        if partition is not None and partition not in hashed:
+            continue
+        target = partitions.hash_partition(space_id)
+        if target == partition:
+            continue
+        click.echo(f"{space_id}: {partition or 'primary'} -> {target}")
+        if not dry_run:
+            partitions.move_space(space_id, target, batch_size)
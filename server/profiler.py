@@ -0,0 +1,267 @@
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+import click
+from flask import current_app, g, has_request_context, request
+from flask.cli import AppGroup
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from redis_store import redis_for
+
+
+# ---------------- Request profiler ----------------
+#
+# A request is profiled when it carries `X-Profile: <PROFILE_TOKEN>`, or when
+# an operator has armed its endpoint with `flask profile arm`, which every
+# worker picks up from the shared store within PROFILE_ARMED_POLL_SECONDS. A
+# profiled request is sampled from a background thread every PROFILE_INTERVAL
+# seconds, its allocations are traced with tracemalloc and its SQL statements
+# are timed. The results land in PROFILE_DIR as <id>.collapsed (one
+# "frame;frame;frame count" line per stack, the input of flamegraph.pl and
+# speedscope) and <id>.json (memory peak, top allocation sites and the SQL
+# timeline). Only one request per process is profiled at a time, so a burst of
+# profiled requests cannot slow a worker down; an armed request that arrives
+# meanwhile leaves its slot for a later one.
+
+class MemoryArming:
+    def __init__(self):
+        self.counts = Counter()
+        self.lock = threading.Lock()
+
+    def arm(self, endpoint, count):
+        with self.lock:
+            self.counts[endpoint] = count
+
+    def take(self, endpoint):
+        with self.lock:
+            if self.counts[endpoint] <= 0:
+                return False
+            self.counts[endpoint] -= 1
+            return True
+
+
+class RedisArming:
+    def __init__(self, client, poll_interval, prefix="profile:armed:"):
+        self.client = client
+        self.poll_interval = poll_interval
+        self.prefix = prefix
+        self.index = prefix.rstrip(":")
+        # Endpoints armed anywhere, as last seen by this process
+        self.armed = frozenset()
+        self.polled_at = 0.0
+        self.polling = threading.Lock()
+
+    def arm(self, endpoint, count):
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + endpoint, count, ex=60 * 60)
+        pipe.sadd(self.index, endpoint)
+        pipe.expire(self.index, 60 * 60)
+        pipe.execute()
+
+    def _poll(self):
+        now = time.monotonic()
+        if now - self.polled_at < self.poll_interval or not self.polling.acquire(blocking=False):
+            return
+        try:
+            # Moved on before asking, so an unreachable store is retried once per interval, not per request
+            self.polled_at = now
+            self.armed = frozenset(endpoint.decode() for endpoint in self.client.smembers(self.index))
+        finally:
+            self.polling.release()
+
+    def take(self, endpoint):
+        # Unarmed endpoints, nearly every request, are answered without a round trip
+        self._poll()
+        if endpoint not in self.armed:
+            return False
+
+        key = self.prefix + endpoint
+        # Every worker decrements the same counter, so exactly `count` requests are profiled
+        if self.client.decr(key) < 0:
+            pipe = self.client.pipeline()
+            pipe.delete(key)
+            pipe.srem(self.index, endpoint)
+            pipe.execute()
+            self.armed = self.armed - {endpoint}
+            return False
+        return True
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class Sampler(threading.Thread):
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class Profiler:
+    def __init__(self, app=None):
+        self.arming = None
+        self.busy = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if app.config["PROFILE_BACKEND"] == "redis":
+            client = app.config.get("SESSION_REDIS") or redis_for(app)
+            self.arming = RedisArming(client, app.config["PROFILE_ARMED_POLL_SECONDS"])
+        else:
+            self.arming = MemoryArming()
+
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.teardown_request(self.teardown_request)
+
+    def requested(self):
+        token = current_app.config["PROFILE_TOKEN"]
+        supplied = request.headers.get("X-Profile")
+        if token and supplied:
+            return hmac.compare_digest(supplied.encode(), token.encode())
+        if request.endpoint is None:
+            return False
+        try:
+            return self.arming.take(request.endpoint)
+        except Exception as e:
+            # Profiling is optional; without the store the request just isn't profiled
+            print(f"Profiler store unavailable: {e}")
+            return False
+
+    def before_request(self):
+        # Taken before asking, so a busy worker never spends an armed slot it can't use
+        if not self.busy.acquire(blocking=False):
+            return None
+        if not self.requested():
+            self.busy.release()
+            return None
+
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(current_app.config["PROFILE_TRACEMALLOC_FRAMES"])
+        tracemalloc.reset_peak()
+
+        sampler = Sampler(threading.get_ident(), current_app.config["PROFILE_INTERVAL"])
+        g.profile = {
+            "id": f"{datetime.utcnow():%Y%m%dT%H%M%S}-{request.endpoint}-{os.getpid()}-{threading.get_ident()}",
+            "started": time.perf_counter(),
+            "started_tracing": started_tracing,
+            "sampler": sampler,
+            "sql": [],
+        }
+        sampler.start()
+        return None
+
+    def after_request(self, response):
+        profile = g.get("profile")
+        if profile is not None:
+            response.headers["X-Profile-Id"] = profile["id"]
+        return response
+
+    def teardown_request(self, exception):
+        profile = g.pop("profile", None)
+        if profile is None:
+            return
+
+        try:
+            profile["sampler"].stop()
+            elapsed = time.perf_counter() - profile["started"]
+            _, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics("lineno")[:current_app.config["PROFILE_TOP_ALLOCATIONS"]]
+            if profile["started_tracing"]:
+                tracemalloc.stop()
+
+            self.write(profile, {
+                "id": profile["id"],
+                "endpoint": request.endpoint,
+                "method": request.method,
+                "path": request.full_path,
+                "elapsed_ms": round(elapsed * 1000, 3),
+                "samples": sum(profile["sampler"].stacks.values()),
+                "memory_peak_bytes": peak,
+                "top_allocations": [{"site": str(stat.traceback), "bytes": stat.size, "count": stat.count} for stat in top],
+                "sql": profile["sql"],
+            })
+        except Exception as e:
+            print(f"Could not write profile {profile['id']}: {e}")
+        finally:
+            self.busy.release()
+
+    def write(self, profile, summary):
+        directory = current_app.config["PROFILE_DIR"] or os.path.join(current_app.instance_path, "profiles")
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, profile["id"])
+
+        with open(base + ".collapsed", "w") as file:
+            for stack, count in profile["sampler"].stacks.most_common():
+                file.write(f"{stack} {count}\n")
+        with open(base + ".json", "w") as file:
+            json.dump(summary, file, indent=2)
+
+
+profiler = Profiler()
+
+
+def _active_profile():
+    return g.get("profile") if has_request_context() else None
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _sql_started(conn, cursor, statement, parameters, context, executemany):
+    if _active_profile() is not None:
+        conn.info["profile_started"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _sql_finished(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("profile_started", None)
+    profile = _active_profile()
+    if profile is None or started is None:
+        return
+    profile["sql"].append({
+        "start_ms": round((started - profile["started"]) * 1000, 3),
+        "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+        "statement": " ".join(statement.split())[:500],
+    })
+
+
+# ---------------- CLI ----------------
+
+profile_cli = AppGroup("profile", help="Profile individual requests.")
+
+
+@profile_cli.command("arm")
+@click.argument("endpoint")
+@click.option("--count", default=1, show_default=True, help="Number of requests to profile.")
+def arm_command(endpoint, count):
+    """Profile the next COUNT requests to ENDPOINT (e.g. api.search) on any worker."""
+    if endpoint not in current_app.view_functions:
+        raise click.BadParameter(f"Unknown endpoint {endpoint}")
+    profiler.arming.arm(endpoint, count)
+    click.echo(f"Armed {endpoint} for {count} requests.")
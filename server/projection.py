@@ -0,0 +1,164 @@
+from flask import request
+from sqlalchemy import inspect, select
+from sqlalchemy.orm import load_only, selectinload
+from models import User, Post, Comment, Space
+from cards import user_card, user_cards
+
+
+# ---------------- Sparse fieldsets ----------------
+#
+# A Projection maps the public field names of a resource to the columns and
+# relationship loaders needed to produce them. Routes parse the client's
+# `fields` parameter into a list of names, query with `options(names)` (or
+# `statement(names)` for an explicit session) so only those columns are
+# SELECTed, and serialize with `serialize(obj, names)`.
+# Fields that embed user cards name the user ids they need, so
+# `serialize_many` can resolve a whole page of authors in one lookup.
+
+class Field:
+    def __init__(self, getter, columns=(), loader=None, users=None):
+        self.getter = getter
+        self.columns = columns
+        self.loader = loader
+        self.users = users
+
+
+class Projection:
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = fields
+
+    def parse(self, raw):
+        if not raw:
+            return list(self.fields)
+
+        names = [name.strip() for name in raw.split(",") if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        return names
+
+    def options(self, names):
+        # The primary key is always loaded so identity mapping keeps working
+        columns = [getattr(self.model, column.key) for column in inspect(self.model).primary_key]
+        loaders = []
+        for name in names:
+            field = self.fields[name]
+            columns.extend(field.columns)
+            if field.loader is not None:
+                loaders.append(field.loader())
+        return [load_only(*columns), *loaders]
+
+    def query(self, names):
+        return self.model.query.options(*self.options(names))
+
+    def statement(self, names):
+        return select(self.model).options(*self.options(names))
+
+    def serialize(self, obj, names):
+        return {name: self.fields[name].getter(obj) for name in names}
+
+    def serialize_many(self, objs, names):
+        user_cards(
+            user_id
+            for name in names if self.fields[name].users
+            for obj in objs
+            for user_id in self.fields[name].users(obj)
+        )
+        return [self.serialize(obj, names) for obj in objs]
+
+
+def requested_fields(projection, resource=None):
+    # `?fields=a,b` for single-resource endpoints, `?fields[users]=a,b` when a
+    # response carries several resource types
+    key = f"fields[{resource}]" if resource else "fields"
+    return projection.parse(request.args.get(key))
+
+
+# ---------------- Resource projections ----------------
+
+def _post_author(post):
+    return [post.user_id]
+
+
+def _post_comments(post):
+    comments = []
+    for comment in post.comments:
+        author = user_card(comment.user_id)
+        comments.append({
+            "content": comment.content,
+            "user_id": comment.user_id,
+            "post_id": comment.post_id,
+            "firstName": author["firstName"],
+            "lastName": author["lastName"],
+            "userPicturePath": author["picturePath"],
+        })
+    return comments
+
+
+post_projection = Projection(Post, {
+    "id": Field(lambda post: post.id, columns=(Post.id,)),
+    "user_id": Field(lambda post: post.user_id, columns=(Post.user_id,)),
+    "content": Field(lambda post: post.content, columns=(Post.content,)),
+    "created_at": Field(lambda post: post.created_at, columns=(Post.created_at,)),
+    "picture": Field(lambda post: post.post_image, columns=(Post.post_image,)),
+    "lastName": Field(lambda post: user_card(post.user_id)["lastName"], columns=(Post.user_id,), users=_post_author),
+    "firstName": Field(lambda post: user_card(post.user_id)["firstName"], columns=(Post.user_id,), users=_post_author),
+    "userPicturePath": Field(
+        lambda post: user_card(post.user_id)["picturePath"],
+        columns=(Post.user_id,),
+        users=_post_author,
+    ),
+    "likes": Field(
+        lambda post: post.like_count,
+        loader=lambda: selectinload(Post.likes).load_only(User.pk),
+    ),
+    "dislikes": Field(
+        lambda post: post.dislike_count,
+        loader=lambda: selectinload(Post.dislikes).load_only(User.pk),
+    ),
+    "comments": Field(
+        _post_comments,
+        loader=lambda: selectinload(Post.comments).load_only(Comment.content, Comment.user_id, Comment.post_id),
+        users=lambda post: [comment.user_id for comment in post.comments],
+    ),
+})
+
+# Post fields exposed by /search, which never included comments or counts
+search_post_projection = Projection(Post, {
+    name: post_projection.fields[name]
+    for name in ("id", "content", "firstName", "lastName", "userPicturePath")
+})
+
+
+def _user_spaces(user):
+    return [{
+        "id": space.id,
+        "title": space.title,
+    } for space in user.spaces.options(load_only(Space.id, Space.title))]
+
+
+user_projection = Projection(User, {
+    "id": Field(lambda user: user.id, columns=(User.id,)),
+    "email": Field(lambda user: user.email, columns=(User.email,)),
+    "firstName": Field(lambda user: user.first_name, columns=(User.first_name,)),
+    "lastName": Field(lambda user: user.last_name, columns=(User.last_name,)),
+    "occupation": Field(lambda user: user.occupation, columns=(User.occupation,)),
+    "user_picture": Field(lambda user: user.picture_path, columns=(User.picture_path,)),
+    "user_space": Field(_user_spaces),
+})
+
+search_user_projection = Projection(User, {
+    "id": Field(lambda user: user.id, columns=(User.id,)),
+    "firstName": Field(lambda user: user.first_name, columns=(User.first_name,)),
+    "lastName": Field(lambda user: user.last_name, columns=(User.last_name,)),
+    "email": Field(lambda user: user.email, columns=(User.email,)),
+    "occupation": Field(lambda user: user.occupation, columns=(User.occupation,)),
+    "picturePath": Field(lambda user: user.picture_path, columns=(User.picture_path,)),
+})
+
+search_space_projection = Projection(Space, {
+    "id": Field(lambda space: space.id),
+    "title": Field(lambda space: space.title, columns=(Space.title,)),
+    "isPublic": Field(lambda space: space.is_public, columns=(Space.is_public,)),
+})
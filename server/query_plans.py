@@ -0,0 +1,90 @@
+import json
+import re
+from contextlib import contextmanager
+
+import click
+from sqlalchemy import event
+
+
+# ---------------- Query plans ----------------
+#
+# record_queries() captures every statement an engine runs while a block
+# executes. plan_report() runs SQLite's EXPLAIN QUERY PLAN on each one and
+# flags full scans of LARGE_TABLES, so the query-plan tests can hold every
+# route to an index-backed plan and a query budget. The reports are plain
+# JSON keyed by route; `flask compare-query-plans` diffs two of them.
+
+LARGE_TABLES = {
+    "users", "posts", "comments", "likes_association", "dislikes_association",
+    "friends_association", "timeline_entries", "space_memberships",
+    "discussions", "discussion_comments", "jobs", "archived_posts",
+}
+
+# "SCAN posts", "SCAN posts USING COVERING INDEX ix" and the pre-3.36 "SCAN TABLE posts"
+SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)")
+
+
+@contextmanager
+def record_queries(engine):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not statement.startswith("EXPLAIN"):
+            statements.append((statement, parameters[0] if executemany and parameters else parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def explain(connection, statement, parameters):
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    return [row[-1] for row in rows]
+
+
+def full_scans(plan):
+    return sorted({match.group(1) for detail in plan if (match := SCAN.match(detail)) and match.group(1) in LARGE_TABLES})
+
+
+def plan_report(engine, statements):
+    """Return [{"sql", "plan", "scans"}] for the recorded statements."""
+    report = []
+    with engine.connect() as connection:
+        for statement, parameters in statements:
+            if not statement.lstrip().upper().startswith(("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")):
+                continue
+            plan = explain(connection, statement, parameters)
+            report.append({"sql": " ".join(statement.split()), "plan": plan, "scans": full_scans(plan)})
+    return report
+
+
+def compare_reports(old, new):
+    """Describe the routes whose query count grew or that gained full scans."""
+    changes = []
+    for route, entry in sorted(new.items()):
+        before = old.get(route)
+        if before is None:
+            changes.append(f"{route}: new route, {entry['queries']} queries")
+            continue
+        if entry["queries"] > before["queries"]:
+            changes.append(f"{route}: {before['queries']} -> {entry['queries']} queries")
+        gained = set(entry["scans"]) - set(before["scans"])
+        if gained:
+            changes.append(f"{route}: new full scans of {', '.join(sorted(gained))}")
+    return changes
+
+
+# ---------------- CLI ----------------
+
+@click.command("compare-query-plans")
+@click.argument("old", type=click.File())
+@click.argument("new", type=click.File())
+def compare_command(old, new):
+    """Compare two query-plan reports written by the query-plan tests."""
+    changes = compare_reports(json.load(old), json.load(new))
+    for change in changes:
+        click.echo(change)
+    if changes:
+        raise SystemExit(1)
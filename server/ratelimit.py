@@ -0,0 +1,147 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, jsonify, request, session
+from werkzeug.middleware.proxy_fix import ProxyFix
+from redis_store import redis_for
+
+
+# ---------------- Rate limiting ----------------
+#
+# Every API request spends tokens from two buckets, one keyed by client IP and
+# one by the session user id. Buckets refill continuously at
+# RATELIMIT_REFILL_PER_SECOND up to RATELIMIT_CAPACITY; expensive routes cost
+# more tokens (RATELIMIT_COSTS). Both buckets are checked before either is
+# charged, so a request one of them turns away costs nothing; an empty bucket
+# answers 429 with Retry-After.
+# Behind RATELIMIT_TRUSTED_PROXIES reverse proxies the client IP is taken from
+# X-Forwarded-For, so clients aren't all limited as the proxy's address.
+
+class MemoryBackend:
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def consume(self, keys, capacity, rate, cost):
+        now = time.monotonic()
+        with self.lock:
+            buckets = {}
+            for key in keys:
+                tokens, updated = self.buckets.pop(key, (capacity, now))
+                buckets[key] = min(capacity, tokens + (now - updated) * rate)
+
+            retry_after = max(0, *((cost - tokens) / rate for tokens in buckets.values()))
+            for key, tokens in buckets.items():
+                self.buckets[key] = (tokens - cost if retry_after == 0 else tokens, now)
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+
+        return retry_after
+
+
+# Refill and spend in one round trip; Redis runs scripts atomically, so
+# concurrent workers can't both spend the same tokens
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local balances = {}
+local retry_after = 0
+for i, key in ipairs(KEYS) do
+    local bucket = redis.call('HMGET', key, 'tokens', 'updated')
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + (now - updated) * rate)
+    balances[i] = tokens
+    if tokens < cost then
+        retry_after = math.max(retry_after, (cost - tokens) / rate)
+    end
+end
+
+for i, key in ipairs(KEYS) do
+    local tokens = balances[i]
+    if retry_after == 0 then
+        tokens = tokens - cost
+    end
+    redis.call('HSET', key, 'tokens', tokens, 'updated', now)
+    redis.call('PEXPIRE', key, math.ceil(capacity / rate * 1000))
+end
+return tostring(retry_after)
+"""
+
+
+class RedisBackend:
+    def __init__(self, client, prefix="ratelimit:"):
+        self.prefix = prefix
+        self.script = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def consume(self, keys, capacity, rate, cost):
+        return float(self.script(keys=[self.prefix + key for key in keys], args=[capacity, rate, cost]))
+
+
+class AsyncRedisBackend:
+    # The same script through redis.asyncio, for the async routes in asgi.py
+    def __init__(self, client, prefix="ratelimit:"):
+        self.prefix = prefix
+        self.script = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def consume(self, keys, capacity, rate, cost):
+        return float(await self.script(keys=[self.prefix + key for key in keys], args=[capacity, rate, cost]))
+
+
+class RateLimiter:
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if app.config["RATELIMIT_BACKEND"] == "redis":
+            client = app.config.get("SESSION_REDIS") or redis_for(app)
+            self.backend = RedisBackend(client)
+        else:
+            self.backend = MemoryBackend()
+
+        if app.config["RATELIMIT_TRUSTED_PROXIES"]:
+            app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["RATELIMIT_TRUSTED_PROXIES"])
+        app.before_request(self.check)
+
+    def check(self):
+        config = current_app.config
+        if not config["RATELIMIT_ENABLED"] or request.blueprint != "api" or request.method == "OPTIONS":
+            return None
+
+        cost = config["RATELIMIT_COSTS"].get(request.endpoint, 1)
+        if not cost:
+            return None
+
+        keys = [f"ip:{request.remote_addr}"]
+        user_id = session.get("user_id")
+        if user_id:
+            keys.append(f"user:{user_id}")
+
+        try:
+            retry_after = self.backend.consume(
+                keys, config["RATELIMIT_CAPACITY"], config["RATELIMIT_REFILL_PER_SECOND"], cost
+            )
+        except Exception as e:
+            # An unreachable limiter store must not take the API down with it
+            print(f"Rate limiter unavailable: {e}")
+            return None
+
+        if retry_after > 0:
+            response = jsonify({"error": "Too many requests"})
+            response.status_code = 429
+            response.headers["Retry-After"] = str(math.ceil(retry_after))
+            return response
+
+        return None
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,36 @@
+_clients = {}
+
+def get_redis(url, **options):
+    # redis is imported and the client built on first use; the client itself
+    # only opens a connection when the first command is sent
+    key = (url, tuple(sorted(options.items())))
+    client = _clients.get(key)
+    if client is None:
+        import redis
+        pool = redis.BlockingConnectionPool.from_url(url, **options)
+        client = _clients[key] = redis.Redis(connection_pool=pool)
+    return client
+
+
+def _pool_options(config):
+    return dict(
+        max_connections=config["REDIS_MAX_CONNECTIONS"],
+        timeout=config["REDIS_POOL_TIMEOUT"],
+        socket_timeout=config["REDIS_SOCKET_TIMEOUT"],
+        socket_connect_timeout=config["REDIS_CONNECT_TIMEOUT"],
+        health_check_interval=30,
+    )
+
+
+def redis_for(app):
+    # One bounded pool per process, shared by sessions, rate limits and
+    # idempotency keys; callers wait up to REDIS_POOL_TIMEOUT for a connection
+    return get_redis(app.config["REDIS_URL"], **_pool_options(app.config))
+
+
+def async_redis_for(app):
+    # redis.asyncio connections belong to the event loop that opened them, so
+    # the ASGI server builds its client at startup instead of caching one here
+    import redis.asyncio
+    pool = redis.asyncio.BlockingConnectionPool.from_url(app.config["REDIS_URL"], **_pool_options(app.config))
+    return redis.asyncio.Redis(connection_pool=pool)
@@ -0,0 +1,182 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+import click
+from flask import current_app, g, has_app_context, request
+from flask.cli import AppGroup
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, literal_column, make_url, select, table
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+
+# ---------------- Read replicas ----------------
+#
+# Each URI in SQLALCHEMY_REPLICA_URIS gets an engine named `replica_<n>`. GET and
+# HEAD requests to the API, and POST routes marked @read_only like /search, are
+# pinned to one healthy replica for their duration, and RoutingSession sends
+# their reads there; everything else, and any statement that writes, uses the
+# primary. A client that has just written
+# gets a short-lived cookie that keeps its reads on the primary, so it always
+# sees its own changes despite replication lag. Replicas are health-checked
+# at most once per REPLICA_HEALTH_INTERVAL and skipped while failing.
+
+READ_METHODS = ("GET", "HEAD")
+STICKY_COOKIE = "read_primary"
+
+
+def read_only(view):
+    """Mark a view that doesn't write despite its method, so it reads from a replica."""
+    view.read_only = True
+    return view
+
+
+def _reads_only():
+    if request.method in READ_METHODS:
+        return True
+    view = current_app.view_functions.get(request.endpoint)
+    return getattr(view, "read_only", False)
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        replica = g.get("db_replica") if has_app_context() else None
+        if replica is None or bind is not None or engine is not self._db.engines.get(None):
+            return engine
+
+        if self._flushing or getattr(clause, "is_dml", False):
+            # A request that writes reads its own transaction from here on
+            g.db_replica = None
+            return engine
+        return current_app.extensions["replicas"][replica]
+
+
+def _make_engine(app, uri):
+    # Relative SQLite paths resolve against the instance folder, as Flask-SQLAlchemy does for the primary
+    url = make_url(uri)
+    if url.get_backend_name() == "sqlite" and url.database and url.database != ":memory:":
+        url = url.set(database=os.path.join(app.instance_path, url.database))
+    return create_engine(url, **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+
+
+class Replicas:
+    def __init__(self, app=None):
+        self.names = []
+        self.health = {}
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        engines = {
+            f"replica_{number}": _make_engine(app, uri)
+            for number, uri in enumerate(app.config["SQLALCHEMY_REPLICA_URIS"])
+        }
+        app.extensions["replicas"] = engines
+        self.names = list(engines)
+        self.health = {name: (True, 0.0) for name in self.names}
+
+        if self.names:
+            app.before_request(self.before_request)
+            app.after_request(self.after_request)
+
+    def _check(self, name):
+        engine = current_app.extensions["replicas"][name]
+        try:
+            with engine.connect() as connection:
+                # An empty or missing SQLite copy would happily answer SELECT 1
+                connection.execute(select(literal_column("1")).select_from(table("users")).limit(1))
+                if engine.dialect.name == "postgresql":
+                    lag = connection.exec_driver_sql(
+                        "SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+                    ).scalar()
+                    return lag <= current_app.config["REPLICA_MAX_LAG_SECONDS"]
+            return True
+        except Exception as e:
+            print(f"Replica {name} failed its health check: {e}")
+            return False
+
+    def healthy(self):
+        now = time.monotonic()
+        interval = current_app.config["REPLICA_HEALTH_INTERVAL"]
+        due = []
+        with self.lock:
+            for name, (is_healthy, checked_at) in self.health.items():
+                if now - checked_at >= interval:
+                    # Claim the check so concurrent requests keep the last verdict
+                    self.health[name] = (is_healthy, now)
+                    due.append(name)
+
+        for name in due:
+            self.health[name] = (self._check(name), now)
+
+        return [name for name, (is_healthy, _) in self.health.items() if is_healthy]
+
+    def mark_unhealthy(self, name):
+        self.health[name] = (False, time.monotonic())
+
+    def before_request(self):
+        if request.blueprint != "api" or not _reads_only():
+            return None
+        if float(request.cookies.get(STICKY_COOKIE, 0) or 0) > time.time():
+            return None
+
+        candidates = self.healthy()
+        if candidates:
+            g.db_replica = random.choice(candidates)
+        return None
+
+    def after_request(self, response):
+        if request.blueprint == "api" and not _reads_only() and response.status_code < 400:
+            sticky = current_app.config["REPLICA_STICKY_SECONDS"]
+            response.set_cookie(STICKY_COOKIE, str(int(time.time() + sticky)), max_age=sticky, httponly=True)
+        return response
+
+
+replicas = Replicas()
+
+
+@event.listens_for(Engine, "handle_error")
+def _replica_failed(context):
+    # Take a replica out of rotation as soon as one of its connections fails
+    if not has_app_context() or not isinstance(context.sqlalchemy_exception, OperationalError):
+        return
+    for name, engine in current_app.extensions.get("replicas", {}).items():
+        if engine is context.engine:
+            replicas.mark_unhealthy(name)
+
+
+# ---------------- CLI ----------------
+
+replicas_cli = AppGroup("replicas", help="Inspect and refresh read replicas.")
+
+
+@replicas_cli.command("status")
+def status_command():
+    for name in replicas.names:
+        click.echo(f"{name}: {'healthy' if replicas._check(name) else 'unhealthy'}")
+
+
+@replicas_cli.command("sync")
+@click.option("--interval", default=0.0, help="Keep copying every INTERVAL seconds.")
+def sync_command(interval):
+    """Copy a SQLite primary into SQLite replicas with the online backup API."""
+    primary = current_app.extensions["sqlalchemy"].engine.url.database
+
+    while True:
+        for engine in current_app.extensions["replicas"].values():
+            url = engine.url
+            if url.get_backend_name() != "sqlite":
+                continue
+            with closing(sqlite3.connect(primary)) as source, closing(sqlite3.connect(url.database)) as target:
+                source.backup(target)
+            click.echo(f"Copied {primary} to {url.database}.", err=True)
+
+        if not interval:
+            break
+        time.sleep(interval)
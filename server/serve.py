@@ -0,0 +1,95 @@
+"""Serve the API with gunicorn's preforking server.
+
+    python serve.py
+
+Settings come from the SERVER_* keys of ApplicationConfig. The app is built
+once in the master and forked into the workers, which recreate their database
+connections after the fork and are recycled after SERVER_MAX_REQUESTS requests.
+
+Reloading without dropping connections:
+
+    kill -HUP <master>     re-read settings and replace the workers gracefully
+    kill -USR2 <master>    start a new master with new code next to the old one,
+    kill -QUIT <old>       then stop the old master once the new one is up
+
+HUP alone does not pick up code changes, because the code is preloaded in
+the master.
+"""
+import os
+
+from gunicorn.app.base import BaseApplication
+from app import create_app
+from config import ApplicationConfig
+from models import db
+
+
+def worker_count(config):
+    if config["SERVER_WORKERS"]:
+        return config["SERVER_WORKERS"]
+    # Cores this process may run on, which a container can restrict below os.cpu_count()
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    return 2 * cores + 1
+
+
+def engines(app):
+    with app.app_context():
+        found = list(db.engines.values())
+    found += app.extensions.get("replicas", {}).values()
+    found += app.extensions.get("partitions", {}).values()
+    if "archive" in app.extensions:
+        found.append(app.extensions["archive"])
+    return found
+
+
+def dispose_engines(app, close=True):
+    # close=False in a worker drops the pooled connections it inherited
+    # without closing them, since the master's sockets are shared
+    for engine in engines(app):
+        engine.dispose(close=close)
+
+
+def options(app):
+    config = app.config
+
+    def post_fork(server, worker):
+        dispose_engines(app, close=False)
+
+    return {
+        "bind": config["SERVER_BIND"],
+        "workers": worker_count(config),
+        "threads": config["SERVER_THREADS"],
+        "preload_app": True,
+        "max_requests": config["SERVER_MAX_REQUESTS"],
+        # Jitter keeps the workers from all restarting at the same moment
+        "max_requests_jitter": config["SERVER_MAX_REQUESTS_JITTER"],
+        "timeout": config["SERVER_TIMEOUT"],
+        "graceful_timeout": config["SERVER_GRACEFUL_TIMEOUT"],
+        "keepalive": config["SERVER_KEEPALIVE"],
+        "post_fork": post_fork,
+    }
+
+
+class Server(BaseApplication):
+    def __init__(self, app, options):
+        self.app = app
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        return self.app
+
+
+def main(config_class=ApplicationConfig):
+    app = create_app(config_class)
+    # Nothing the master opened while building the app may leak into the workers
+    dispose_engines(app)
+    Server(app, options(app)).run()
+
+
+if __name__ == "__main__":
+    main()
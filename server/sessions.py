@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask_session import Session
+from flask_session.base import ServerSideSession, ServerSideSessionInterface
+from flask_session.defaults import Defaults
+from flask_session.redis import RedisSessionInterface
+
+
+# ---------------- Sessions ----------------
+#
+# SESSION_TYPE picks the backend:
+#   "redis"   server-side sessions in Redis over the shared connection pool
+#   "memory"  server-side sessions in a per-process LRU, for single-node
+#             deployments and tests
+#   "cookie"  Flask's signed cookie sessions; nothing is stored server-side
+# Any other value is handed to Flask-Session unchanged.
+#
+# Flask-Session rewrites a session on every request that touches it, because
+# SESSION_REFRESH_EACH_REQUEST is on by default. The server-side backends here
+# only rewrite a session when it changed or when it has used up half of its
+# lifetime, so a logged-in user's reads cost one round trip instead of two.
+# They override ServerSideSessionInterface's storage hooks (_retrieve_session_data,
+# _upsert_session, _delete_session), which Flask-Session may change between
+# minor releases, so requirements.txt pins it to 0.8.x.
+
+class LazyRefreshMixin:
+    def __init__(self, *args, **kwargs):
+        # Remaining lifetime of the session being opened, set by _retrieve_session_data
+        self._opened = threading.local()
+        super().__init__(*args, **kwargs)
+
+    def open_session(self, app, request):
+        self._opened.ttl = None
+        session = super().open_session(app, request)
+        session.ttl = self._opened.ttl
+        return session
+
+    def should_set_storage(self, app, session):
+        if session.modified:
+            return True
+        if not app.config["SESSION_REFRESH_EACH_REQUEST"] or session.ttl is None:
+            return False
+        return session.ttl < app.permanent_session_lifetime.total_seconds() / 2
+
+
+class PooledRedisSessionInterface(LazyRefreshMixin, RedisSessionInterface):
+    def _retrieve_session_data(self, store_id):
+        # Value and remaining lifetime in a single round trip
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.get(store_id)
+        pipeline.ttl(store_id)
+        serialized_session_data, ttl = pipeline.execute()
+
+        if serialized_session_data:
+            self._opened.ttl = ttl if ttl >= 0 else None
+            return self.serializer.decode(serialized_session_data)
+        return None
+
+
+class MemorySession(ServerSideSession):
+    pass
+
+
+class MemorySessionInterface(LazyRefreshMixin, ServerSideSessionInterface):
+    session_class = MemorySession
+
+    def __init__(self, app, max_sessions=10000, **kwargs):
+        super().__init__(app, **kwargs)
+        self.max_sessions = max_sessions
+        self.records = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _retrieve_session_data(self, store_id):
+        with self.lock:
+            entry = self.records.get(store_id)
+            if entry is None:
+                return None
+            expires_at, serialized_session_data = entry
+            if expires_at < time.monotonic():
+                del self.records[store_id]
+                return None
+            self.records.move_to_end(store_id)
+
+        self._opened.ttl = expires_at - time.monotonic()
+        return self.serializer.decode(serialized_session_data)
+
+    def _delete_session(self, store_id):
+        with self.lock:
+            self.records.pop(store_id, None)
+
+    def _upsert_session(self, session_lifetime, session, store_id):
+        serialized_session_data = self.serializer.encode(session)
+        with self.lock:
+            self.records[store_id] = (time.monotonic() + session_lifetime.total_seconds(), serialized_session_data)
+            self.records.move_to_end(store_id)
+            if len(self.records) > self.max_sessions:
+                self.records.popitem(last=False)
+
+
+def init_session(app):
+    session_type = app.config["SESSION_TYPE"]
+    if session_type == "cookie":
+        return
+
+    if session_type not in ("redis", "memory"):
+        Session(app)
+        return
+
+    params = {
+        "key_prefix": app.config.get("SESSION_KEY_PREFIX", Defaults.SESSION_KEY_PREFIX),
+        "use_signer": app.config.get("SESSION_USE_SIGNER", Defaults.SESSION_USE_SIGNER),
+        "permanent": app.config.get("SESSION_PERMANENT", Defaults.SESSION_PERMANENT),
+        "sid_length": app.config.get("SESSION_ID_LENGTH", Defaults.SESSION_ID_LENGTH),
+        "serialization_format": app.config.get("SESSION_SERIALIZATION_FORMAT", Defaults.SESSION_SERIALIZATION_FORMAT),
+    }
+    if session_type == "redis":
+        app.session_interface = PooledRedisSessionInterface(app, client=app.config["SESSION_REDIS"], **params)
+    else:
+        app.session_interface = MemorySessionInterface(app, max_sessions=app.config["SESSION_MEMORY_MAX"], **params)
@@ -0,0 +1,119 @@
+import copy
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+from models import db, UserSettings
+from redis_store import redis_for
+from versions import MemoryVersions, RedisVersions, VersionedCache
+
+
+# ---------------- User settings ----------------
+#
+# Settings live in user_settings as one JSON document per user, changed with
+# JSON merge patches (RFC 7396) and versioned on every write. Reads go through
+# a VersionedCache, so a write in one worker invalidates the others, and reads
+# for many users cost one round trip to the version store plus one IN query
+# for the misses.
+
+DEFAULT_SETTINGS = {
+    "notification_preferences": {
+        "friends": True,
+        "comments": True,
+        "likes": True,
+        "spaces": True,
+        "occupation": True,
+    },
+}
+
+
+def merge_patch(target, patch):
+    if not isinstance(patch, dict):
+        return patch
+
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+
+def _with_defaults(data, defaults=DEFAULT_SETTINGS):
+    result = copy.deepcopy(defaults)
+    for key, value in (data or {}).items():
+        if isinstance(value, dict) and isinstance(result.get(key), dict):
+            result[key] = _with_defaults(value, result[key])
+        else:
+            result[key] = copy.deepcopy(value)
+    return result
+
+
+class UserSettingsStore:
+    def __init__(self, app=None):
+        self.cache = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if app.config["SETTINGS_BACKEND"] == "redis":
+            client = app.config.get("SESSION_REDIS") or redis_for(app)
+            versions = RedisVersions(client, app.config["SETTINGS_VERSION_TTL"], prefix="settings:version:")
+        else:
+            versions = MemoryVersions()
+        self.cache = VersionedCache(versions, app.config["SETTINGS_CACHE_SIZE"])
+
+    def _load(self, user_ids):
+        rows = {row.user_id: row for row in UserSettings.query.filter(UserSettings.user_id.in_(user_ids))}
+        return {
+            user_id: (rows[user_id].version, rows[user_id].data) if user_id in rows else (0, {})
+            for user_id in user_ids
+        }
+
+    def get_many(self, user_ids):
+        """Return {user_id: (version, settings)} with defaults filled in."""
+        return {
+            user_id: (version, _with_defaults(data))
+            for user_id, (version, data) in self.cache.get_many(user_ids, self._load).items()
+        }
+
+    def get(self, user_id):
+        return self.get_many([user_id])[user_id]
+
+    def patch(self, user_id, patch, expected_version=None):
+        """Apply a merge patch and return (version, settings).
+
+        Raises StaleDataError when expected_version is given and no longer
+        current, or when another writer updates or first creates the row
+        concurrently.
+        """
+        row = UserSettings.query.filter_by(user_id=user_id).first()
+        if row is None:
+            row = UserSettings(user_id=user_id, data={})
+            db.session.add(row)
+
+        current = row.version or 0
+        if expected_version is not None and expected_version != current:
+            raise StaleDataError(f"Settings are at version {current}, not {expected_version}")
+
+        row.data = merge_patch(row.data, patch)
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            # Two first writes both inserted a row; the loser is just as stale as after an update
+            db.session.rollback()
+            raise StaleDataError(f"Settings for {user_id} were created by another request") from e
+
+        self.cache.update(user_id, row.version, row.data)
+        return row.version, _with_defaults(row.data)
+
+
+user_settings = UserSettingsStore()
+
+
+def notification_preferences(user_ids):
+    """Bulk lookup of {user_id: notification_preferences} for the notification paths."""
+    return {
+        user_id: settings["notification_preferences"]
+        for user_id, (_, settings) in user_settings.get_many(user_ids).items()
+    }
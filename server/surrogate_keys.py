@@ -0,0 +1,145 @@
+import click
+from flask.cli import AppGroup
+from sqlalchemy.exc import IntegrityError
+from models import db
+from occupations import occupation_key
+
+
+# ---------------- Surrogate key migration ----------------
+#
+# Converts a database created with string primary keys everywhere into the
+# current schema, where users and posts carry an integer pk and the hot
+# association tables reference those integers. The public hex ids are copied
+# unchanged into the indexed `id` columns. Rows are streamed table by table in
+# rowid ranges, and ON CONFLICT DO NOTHING makes an interrupted run safe to
+# repeat: rows already copied are skipped, while any other constraint failure
+# stops the migration instead of silently dropping the row.
+#
+# Spaces created before spaces had a creator are given the one named with
+# --default-creator; the migration refuses to start without it when the source
+# has any. users.occupation_key is filled from the copied occupations.
+
+ASSOCIATIONS = {
+    "friends_association": (("user_pk", "users", "user_id"), ("friend_pk", "users", "friend_id")),
+    "likes_association": (("user_pk", "users", "user_id"), ("post_pk", "posts", "post_id")),
+    "dislikes_association": (("user_pk", "users", "user_id"), ("post_pk", "posts", "post_id")),
+}
+
+
+def _old_columns(connection, table_name):
+    return [row[1] for row in connection.exec_driver_sql(f"PRAGMA old.table_info({table_name})")]
+
+
+def _conflict_target(table):
+    # Repeated runs collide on the public id, or on the whole key for tables without one
+    if "id" in table.columns:
+        return "id"
+    return ", ".join(column.name for column in table.primary_key.columns)
+
+
+def _copy_statement(table, old_columns):
+    if table.name in ASSOCIATIONS:
+        (left_pk, left_table, left_id), (right_pk, right_table, right_id) = ASSOCIATIONS[table.name]
+        return (
+            f"INSERT INTO main.{table.name} ({left_pk}, {right_pk}) "
+            f"SELECT l.pk, r.pk FROM old.{table.name} a "
+            f"JOIN main.{left_table} l ON l.id = a.{left_id} "
+            f"JOIN main.{right_table} r ON r.id = a.{right_id} "
+            f"WHERE a.rowid > :low AND a.rowid <= :high "
+            f"ON CONFLICT ({_conflict_target(table)}) DO NOTHING"
+        )
+
+    columns = [column.name for column in table.columns if column.name in old_columns]
+    values = list(columns)
+    if table.name == "spaces":
+        if "creator_id" in old_columns:
+            values[columns.index("creator_id")] = "COALESCE(creator_id, :default_creator)"
+        else:
+            columns.append("creator_id")
+            values.append(":default_creator")
+    return (
+        f"INSERT INTO main.{table.name} ({', '.join(columns)}) "
+        f"SELECT {', '.join(values)} FROM old.{table.name} WHERE rowid > :low AND rowid <= :high ORDER BY rowid "
+        f"ON CONFLICT ({_conflict_target(table)}) DO NOTHING"
+    )
+
+
+def _spaces_without_creator(connection):
+    old_columns = _old_columns(connection, "spaces")
+    if not old_columns:
+        return 0
+    where = "WHERE creator_id IS NULL" if "creator_id" in old_columns else ""
+    return connection.exec_driver_sql(f"SELECT COUNT(*) FROM old.spaces {where}").scalar()
+
+
+def _fill_occupation_keys(connection, batch_size):
+    last_pk = 0
+    while True:
+        rows = connection.exec_driver_sql(
+            "SELECT pk, occupation FROM main.users WHERE pk > ? AND occupation_key IS NULL ORDER BY pk LIMIT ?",
+            (last_pk, batch_size),
+        ).all()
+        if not rows:
+            return
+        connection.exec_driver_sql(
+            "UPDATE main.users SET occupation_key = ? WHERE pk = ?",
+            [(occupation_key(occupation), pk) for pk, occupation in rows],
+        )
+        connection.commit()
+        last_pk = rows[-1][0]
+
+
+keys_cli = AppGroup("keys", help="Migrate to integer surrogate keys.")
+
+
+@keys_cli.command("migrate")
+@click.argument("source", type=click.Path(exists=True, dir_okay=False))
+@click.option("--batch-size", default=5000, show_default=True, help="Source rows copied per transaction.")
+@click.option("--default-creator", default=None, help="User id that becomes the creator of spaces without one.")
+def migrate_command(source, batch_size, default_creator):
+    """Copy the string-keyed SOURCE database into the configured database."""
+    if db.engine.dialect.name != "sqlite":
+        raise click.ClickException("The key migration reads and writes SQLite databases.")
+
+    db.create_all()
+
+    with db.engine.connect() as connection:
+        connection.exec_driver_sql("ATTACH DATABASE ? AS old", (source,))
+
+        orphaned = _spaces_without_creator(connection)
+        if orphaned and not default_creator:
+            raise click.ClickException(
+                f"{orphaned} spaces have no creator; pass --default-creator USER_ID to assign them."
+            )
+        if default_creator and not connection.exec_driver_sql(
+            "SELECT 1 FROM old.users WHERE id = ?", (default_creator,)
+        ).first():
+            raise click.ClickException(f"--default-creator {default_creator} is not a user in {source}.")
+
+        # sorted_tables puts users and posts ahead of the tables that reference them
+        for table in db.metadata.sorted_tables:
+            old_columns = _old_columns(connection, table.name)
+            if not old_columns:
+                continue
+
+            statement = _copy_statement(table, old_columns)
+            last_rowid = connection.exec_driver_sql(f"SELECT MAX(rowid) FROM old.{table.name}").scalar() or 0
+
+            copied = 0
+            for low in range(0, last_rowid, batch_size):
+                params = {"low": low, "high": low + batch_size, "default_creator": default_creator}
+                try:
+                    copied += connection.exec_driver_sql(statement, params).rowcount
+                except IntegrityError as e:
+                    connection.rollback()
+                    raise click.ClickException(f"{table.name}: {e.orig}; rows {low + 1}-{low + batch_size} were not copied.")
+                connection.commit()
+                click.echo(f"{table.name}: {min(low + batch_size, last_rowid)}/{last_rowid} source rows read", err=True)
+
+            click.echo(f"{table.name}: {copied} rows copied")
+
+            if table.name == "users":
+                _fill_occupation_keys(connection, batch_size)
+
+        connection.exec_driver_sql("DETACH DATABASE old")
+    click.echo("Run `flask occupations rebuild` to index the copied occupations.", err=True)
@@ -0,0 +1,19 @@
+import os
+from uuid import uuid4
+
+from werkzeug.utils import secure_filename
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+ASSETS_DIR = os.path.join(basedir, "assets")
+
+
+# ---------------- Images ----------------
+
+def save_image(file_storage):
+    # Stored under a generated name, keeping only the extension, so a client
+    # can't pick the path or overwrite someone else's picture
+    extension = os.path.splitext(secure_filename(file_storage.filename or ""))[1].lower()
+    filename = uuid4().hex + extension
+    os.makedirs(ASSETS_DIR, exist_ok=True)
+    file_storage.save(os.path.join(ASSETS_DIR, filename))
+    return filename
@@ -0,0 +1,45 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from config import TestingConfig
+from models import db, User
+
+@pytest.fixture
+def app():
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    with app.test_client() as client:
+        yield client
+
+@pytest.fixture
+def add_user(app):
+    def add_user(email="me@example.com", **columns):
+        user = User(**{"first_name": "Test", "last_name": "User", "password": "x", **columns}, email=email)
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return add_user
+
+@pytest.fixture
+def log_in(client):
+    def log_in(user):
+        with client.session_transaction() as session:
+            session["user_id"] = user.id
+        return user
+    return log_in
+
+@pytest.fixture
+def user(add_user, log_in):
+    # A user with a live session on `client`
+    return log_in(add_user())
@@ -0,0 +1,84 @@
+from query_plans import record_queries
+from models import db, Space, Discussion, DiscussionComment
+
+def private_space(creator):
+    space = Space(title="Secret club", creator_id=creator.id, is_public=False)
+    db.session.add(space)
+    db.session.flush()
+    discussion = Discussion(user_id=creator.id, space_id=space.id, title="Topic", content="hello")
+    db.session.add(discussion)
+    db.session.flush()
+    db.session.add(DiscussionComment(user_id=creator.id, space_id=space.id, discussion_id=discussion.id, title="Topic", content="reply"))
+    db.session.commit()
+    return space, discussion
+
+def test_private_spaces_follow_membership_changes(client, add_user, log_in):
+    owner, guest = add_user("owner@example.com"), add_user("guest@example.com")
+    space, discussion = private_space(owner)
+    log_in(guest)
+
+    assert client.get(f"/spaces/{space.id}/discussions").status_code == 403
+    assert client.get(f"/discussions/{discussion.id}/comments").status_code == 403
+    assert client.post(f"/discussions/{discussion.id}/comments", json={"content": "hi"}).status_code == 403
+    assert client.get("/spaces").json["spaces"] == []
+
+    log_in(owner)
+    assert client.put(f"/spaces/{space.id}/members", json={"userIds": [guest.id]}).status_code == 200
+    log_in(guest)
+    assert client.get(f"/spaces/{space.id}/discussions").status_code == 200
+    assert client.get(f"/discussions/{discussion.id}/comments").status_code == 200
+    assert [s["id"] for s in client.get("/spaces").json["spaces"]] == [space.id]
+
+    assert client.post(f"/spaces/{space.id}/leave").status_code == 200
+    assert client.get(f"/discussions/{discussion.id}").status_code == 403
+
+    log_in(owner)
+    assert client.put(f"/spaces/{space.id}/members", json={"userIds": [guest.id]}).status_code == 200
+    log_in(guest)
+    assert client.get(f"/discussions/{discussion.id}").status_code == 200
+    assert client.get("/memberships", query_string={"spaceId": space.id, "userId": guest.id}).json == {"isMember": True}
+
+    log_in(owner)
+    assert client.delete(f"/spaces/{space.id}").status_code == 200
+    db.session.refresh(guest)
+    assert guest.membership_version == 5
+
+def test_non_members_cannot_join_private_spaces(client, add_user, log_in):
+    owner, guest = add_user("owner@example.com"), add_user("guest@example.com")
+    space, _ = private_space(owner)
+    log_in(guest)
+
+    assert client.post(f"/spaces/{space.id}/join", json={"user_id": guest.id}).status_code == 403
+    assert client.get(f"/spaces/{space.id}/discussions").status_code == 403
+    assert client.get("/memberships", query_string={"spaceId": space.id, "userId": guest.id}).json == {"isMember": False}
+
+    public = Space(title="Open club", creator_id=owner.id)
+    db.session.add(public)
+    db.session.commit()
+    # The body can't name someone else; members only ever join as themselves
+    assert client.post(f"/spaces/{public.id}/join", json={"user_id": owner.id}).status_code == 200
+    assert client.get("/memberships", query_string={"spaceId": public.id, "userId": owner.id}).json == {"isMember": False}
+    assert client.get("/memberships", query_string={"spaceId": public.id, "userId": guest.id}).json == {"isMember": True}
+
+def test_only_the_creator_sets_the_member_list(client, add_user, log_in):
+    owner, guest = add_user("owner@example.com"), add_user("guest@example.com")
+    space, _ = private_space(owner)
+
+    assert client.put(f"/spaces/{space.id}/members", json={"userIds": [guest.id]}).status_code == 401
+    log_in(guest)
+    assert client.put(f"/spaces/{space.id}/members", json={"userIds": [guest.id]}).status_code == 403
+    assert client.get(f"/spaces/{space.id}/discussions").status_code == 403
+    db.session.refresh(space)
+    assert space.members == []
+
+def test_checks_are_answered_from_the_cache(client, add_user, log_in):
+    owner = add_user("owner@example.com")
+    space, discussion = private_space(owner)
+    space.members.append(owner)
+    db.session.commit()
+    log_in(owner)
+
+    client.get(f"/discussions/{discussion.id}")
+    with record_queries(db.engine) as statements:
+        assert client.get(f"/discussions/{discussion.id}").status_code == 200
+    assert not [statement for statement, _ in statements if "space_memberships" in statement or "FROM spaces" in statement]
@@ -0,0 +1,45 @@
+from query_plans import record_queries
+from models import db, Post
+from admin import estimate_row_count, PostView
+
+def add_posts(author, *contents):
+    posts = [Post(user_id=author.id, content=content) for content in contents]
+    db.session.add_all(posts)
+    db.session.commit()
+    return posts
+
+def test_estimate_row_count_reads_the_last_rowid(add_user):
+    assert estimate_row_count(Post) == 0
+    posts = add_posts(add_user(), "one", "two", "three")
+    db.session.delete(posts[0])
+    db.session.commit()
+    # Deletes below the last rowid are not subtracted
+    assert estimate_row_count(Post) == 3
+
+def test_unfiltered_list_uses_the_estimate(add_user):
+    posts = add_posts(add_user(), "one", "two", "three")
+    db.session.delete(posts[0])
+    db.session.commit()
+
+    view = PostView(Post, db.session)
+    with record_queries(db.engine) as statements:
+        count, rows = view.get_list(0, None, False, None, [])
+    assert count == 3
+    assert len(rows) == 2
+    assert not [statement for statement, _ in statements if "count(" in statement.lower()]
+
+def test_search_goes_through_the_fts_index(add_user):
+    add_posts(add_user(), "hello world", "goodbye world", "helloworld")
+
+    view = PostView(Post, db.session)
+    with record_queries(db.engine) as statements:
+        count, rows = view.get_list(0, None, False, "hello", [])
+    assert count == 2
+    assert sorted(post.content for post in rows) == ["hello world", "helloworld"]
+    assert [statement for statement, _ in statements if "posts_fts MATCH" in statement]
+    assert not [statement for statement, _ in statements if " LIKE " in statement.upper()]
+
+def test_blank_search_matches_everything(add_user):
+    add_posts(add_user(), "one", "two")
+    count, rows = PostView(Post, db.session).get_list(0, None, False, '  ', [])
+    assert count == 2
@@ -1,18 +1,13 @@
-import pytest 
-from server import app
-
-@pytest.fixture
-def client():
-    with app.test_client() as client:
-        yield client
+from models import db, Post
+from query_plans import record_queries
 
 def test_register_user_success(client):
     data = {
         "firstName": "John",
         "lastName": "Doe",
         "email": "john.doe@example.com",
-        "password": "TestPassword123",
-        "confirmPassword": "TestPassword123",
+        "password": "TestPassword123!",
+        "confirmPassword": "TestPassword123!",
         "occupation": "Engineer"
     }
     response = client.post('/register', json=data)
@@ -30,4 +25,36 @@ def test_register_user_missing_name(client):
     response = client.post('/register', json=data)
     assert response.status_code == 400
     assert 'error' in response.json
-    assert 'First name and last name are required' in response.json['error']
\ No newline at end of file
+    assert 'First name and last name are required' in response.json['error']
+
+def test_get_posts_rejects_unknown_fields(client):
+    response = client.get('/posts?fields=id,password')
+    assert response.status_code == 400
+    assert 'Unknown fields: password' in response.json['error']
+
+def test_get_posts_selects_only_requested_fields(client, add_user):
+    user = add_user()
+    db.session.add(Post(user_id=user.id, content="hello", post_image="a.png"))
+    db.session.commit()
+    db.session.expunge_all()
+
+    with record_queries(db.engine) as statements:
+        response = client.get('/posts?fields=id,content')
+    assert response.status_code == 200
+    assert response.json == [{"id": response.json[0]["id"], "content": "hello"}]
+
+    selects = [statement for statement, _ in statements if "FROM posts" in statement]
+    assert len(selects) == 1
+    columns = selects[0].split("FROM posts")[0]
+    assert "posts.content" in columns
+    assert "posts.post_image" not in columns and "posts.created_at" not in columns
+    # likes, dislikes and comments were not requested, so their loaders never run
+    assert not [statement for statement, _ in statements if "likes" in statement or "FROM comments" in statement]
+
+
+def test_ids_sort_by_creation_time():
+    from models import get_uuid
+    ids = [get_uuid() for _ in range(5000)]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+    assert all(len(value) == 32 and value[12] == "7" for value in ids)
@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+from archive import archive, archive_blobs
+from models import db, User, Post, Comment, ArchivedPost
+
+def setup_posts():
+    author = User(first_name="Old", last_name="Author", email="author@example.com", password="x")
+    fan = User(first_name="Fan", last_name="User", email="fan@example.com", password="x")
+    db.session.add_all([author, fan])
+    db.session.flush()
+
+    old = Post(user_id=author.id, content="ancient", created_at=datetime.utcnow() - timedelta(days=400))
+    new = Post(user_id=author.id, content="fresh")
+    db.session.add_all([old, new])
+    db.session.flush()
+    db.session.add(Comment(user_id=fan.id, post_id=old.id, content="nice"))
+    old.likes.append(fan)
+    db.session.commit()
+    return author, fan, old.id
+
+def test_old_posts_move_to_the_archive_and_read_back(app, client):
+    author, fan, old_id = setup_posts()
+    assert app.test_cli_runner().invoke(args=["archive", "run", "--days", "30"]).exit_code == 0
+
+    assert [post.content for post in Post.query.all()] == ["fresh"]
+    assert Comment.query.count() == 0
+    assert db.session.get(ArchivedPost, old_id).user_id == author.id
+    with archive.engine.connect() as connection:
+        assert connection.execute(select(archive_blobs.c.codec)).scalar() in ("zstd", "zlib")
+
+    assert [post["content"] for post in client.get("/posts").json] == ["fresh"]
+    post = client.get(f"/posts/{old_id}").json
+    assert post["content"] == "ancient"
+    assert post["firstName"] == "Old"
+    assert post["likes"] == 1
+    assert [comment["firstName"] for comment in post["comments"]] == ["Fan"]
+
+def test_interacting_with_an_archived_post_restores_it(app, client, log_in):
+    author, fan, old_id = setup_posts()
+    app.test_cli_runner().invoke(args=["archive", "run", "--days", "30"])
+
+    log_in(author)
+    response = client.patch(f"/posts/{old_id}/like")
+    assert response.status_code == 200
+    assert response.json["post"]["likes"] == 2
+
+    assert db.session.get(ArchivedPost, old_id) is None
+    assert Comment.query.filter_by(post_id=old_id).count() == 1
+    with archive.engine.connect() as connection:
+        assert connection.execute(select(archive_blobs.c.id)).first() is None
+
+def test_concurrent_restores_return_the_same_post(app, monkeypatch):
+    author, fan, old_id = setup_posts()
+    app.test_cli_runner().invoke(args=["archive", "run", "--days", "30"])
+
+    # The second restore read the archive before the first one moved the post back
+    record = archive._record(old_id)
+    first = archive.restore(old_id)
+    monkeypatch.setattr(archive, "_record", lambda post_id: record)
+    second = archive.restore(old_id)
+
+    assert second is not None and second.pk == first.pk
+    assert Post.query.filter_by(id=old_id).count() == 1
+    assert Comment.query.filter_by(post_id=old_id).count() == 1
+
+def test_deleting_an_archived_post_removes_it_from_the_archive(app, client, log_in):
+    author, fan, old_id = setup_posts()
+    app.test_cli_runner().invoke(args=["archive", "run", "--days", "30"])
+
+    assert client.post(f"/delete/{old_id}").status_code == 404
+    assert db.session.get(ArchivedPost, old_id) is not None
+    assert Post.query.filter_by(id=old_id).first() is None
+
+    log_in(author)
+    assert client.post(f"/delete/{old_id}").status_code == 200
+    assert db.session.get(ArchivedPost, old_id) is None
+    assert Post.query.filter_by(id=old_id).first() is None
+    with archive.engine.connect() as connection:
+        assert connection.execute(select(archive_blobs.c.id)).first() is None
+    assert client.post(f"/delete/{old_id}").status_code == 404
+
+def test_restore_command_tells_hot_and_missing_posts_apart(app):
+    author, fan, old_id = setup_posts()
+    runner = app.test_cli_runner()
+    new_id = Post.query.filter_by(content="fresh").one().id
+    runner.invoke(args=["archive", "run", "--days", "30"])
+
+    assert "is not archived" in runner.invoke(args=["archive", "restore", new_id]).output
+    assert "does not exist" in runner.invoke(args=["archive", "restore", "missing"]).output
+    result = runner.invoke(args=["archive", "restore", old_id])
+    assert result.exit_code == 0 and f"Restored post {old_id}" in result.output
+    assert "is not archived" in runner.invoke(args=["archive", "restore", old_id]).output
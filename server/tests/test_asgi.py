@@ -0,0 +1,136 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("aiosqlite")
+pytest.importorskip("greenlet")
+
+from asgi import AsyncApp
+from config import TestingConfig
+from app import bcrypt, create_app
+from models import db, User, Post, Comment, Space
+
+
+@pytest.fixture
+def asgi_app(tmp_path):
+    # The async engine opens its own connections, so the database has to be a file
+    class Config(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'db.sqlite'}"
+
+    app = create_app(Config)
+    with app.app_context():
+        db.create_all()
+        password = bcrypt.generate_password_hash("Secret-123").decode("utf-8")
+        author = User(first_name="Ada", last_name="Author", email="ada@example.com", password=password)
+        fan = User(first_name="Fan", last_name="Reader", email="fan@example.com", password="x")
+        db.session.add_all([author, fan])
+        db.session.flush()
+        post = Post(user_id=author.id, content="hello async")
+        db.session.add(post)
+        db.session.flush()
+        post.likes.append(fan)
+        db.session.add(Comment(user_id=fan.id, post_id=post.id, content="nice"))
+        db.session.commit()
+        author_id = author.id
+    yield AsyncApp(app), author_id
+    with app.app_context():
+        db.drop_all()
+
+
+async def call(application, method, path, body=b"", query=b"", headers=()):
+    scope = {
+        "type": "http", "http_version": "1.1", "method": method, "path": path, "root_path": "",
+        "query_string": query, "headers": [(b"content-type", b"application/json"), *headers],
+        "client": ("127.0.0.1", 50000), "server": ("localhost", 80), "scheme": "http",
+    }
+    messages = [{"type": "http.request", "body": body}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    await application(scope, receive, send)
+    start = sent[0]
+    return start["status"], dict(start["headers"]), b"".join(m.get("body", b"") for m in sent[1:])
+
+
+def test_async_routes_answer_like_the_flask_routes(asgi_app):
+    application, author_id = asgi_app
+    flask_client = application.app.test_client()
+    bridged = []
+    wsgi_app = application.app.wsgi_app
+    application.app.wsgi_app = lambda environ, start_response: bridged.append(environ["PATH_INFO"]) or wsgi_app(environ, start_response)
+
+    async def scenario():
+        await application.startup()
+        try:
+            return [
+                await call(application, "GET", "/posts", headers=[(b"origin", b"http://example.com")]),
+                await call(application, "POST", "/search", body=json.dumps({"query": "a"}).encode()),
+                await call(application, "GET", f"/notifications/{author_id}"),
+                await call(application, "GET", "/notifications/missing"),
+            ]
+        finally:
+            await application.shutdown()
+
+    posts, search, notifications, missing = asyncio.run(scenario())
+    assert bridged == []
+
+    assert posts[0] == 200
+    assert posts[1][b"access-control-allow-origin"] == b"http://example.com"
+    assert json.loads(posts[2]) == flask_client.get("/posts").get_json()
+    assert json.loads(search[2]) == flask_client.post("/search", json={"query": "a"}).get_json()
+    assert json.loads(notifications[2]) == flask_client.get(f"/notifications/{author_id}").get_json()
+    assert {item["type"] for item in json.loads(notifications[2])} == {"comment", "like"}
+    assert missing[0] == 404
+
+
+def test_other_routes_run_on_the_flask_app(asgi_app):
+    application, author_id = asgi_app
+
+    async def scenario():
+        await application.startup()
+        try:
+            return [
+                await call(application, "POST", "/login", body=json.dumps({"email": "ada@example.com", "password": "wrong"}).encode()),
+                await call(application, "OPTIONS", "/posts", headers=[(b"origin", b"http://example.com")]),
+                await call(application, "GET", "/nowhere"),
+            ]
+        finally:
+            await application.shutdown()
+
+    login, preflight, unknown = asyncio.run(scenario())
+    assert login[0] == 401
+    assert preflight[0] == 200 and b"access-control-allow-origin" in preflight[1]
+    assert unknown[0] == 404
+
+
+def test_async_search_shows_members_their_private_spaces(asgi_app):
+    application, author_id = asgi_app
+    with application.app.app_context():
+        db.session.add(Space(title="Private garden", creator_id=author_id, is_public=False))
+        db.session.commit()
+
+    flask_client = application.app.test_client()
+    flask_client.post("/login", json={"email": "ada@example.com", "password": "Secret-123"})
+    cookie = flask_client.get_cookie(application.app.config["SESSION_COOKIE_NAME"])
+    body = json.dumps({"query": "garden"}).encode()
+
+    async def scenario():
+        await application.startup()
+        try:
+            return [
+                await call(application, "POST", "/search", body=body),
+                await call(application, "POST", "/search", body=body, headers=[(b"cookie", f"{cookie.key}={cookie.value}".encode())]),
+            ]
+        finally:
+            await application.shutdown()
+
+    anonymous, member = asyncio.run(scenario())
+    assert json.loads(anonymous[2])["spaces"] == []
+    assert [space["title"] for space in json.loads(member[2])["spaces"]] == ["Private garden"]
+    assert json.loads(member[2]) == flask_client.post("/search", json={"query": "garden"}).get_json()
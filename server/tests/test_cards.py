@@ -0,0 +1,48 @@
+from sqlalchemy import event
+from cards import UserCards, cards, user_cards
+from models import db, Post, Comment
+
+def count_queries():
+    statements = []
+    event.listen(db.engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    return statements
+
+def test_posts_list_resolves_authors_in_one_query(client, add_user):
+    users = [add_user(f"user{n}@example.com") for n in range(5)]
+    for user in users:
+        post = Post(user_id=user.id, content="hello")
+        db.session.add(post)
+        db.session.flush()
+        db.session.add(Comment(user_id=users[0].id, post_id=post.id, content="hi"))
+    db.session.commit()
+
+    statements = count_queries()
+    posts = client.get("/posts").json
+    assert len(posts) == 5
+    assert len([s for s in statements if "FROM users" in s]) == 1
+
+def test_name_changes_show_up_on_existing_posts(client, add_user):
+    user = add_user()
+    db.session.add(Post(user_id=user.id, content="hello", first_name="Stale", last_name="Name"))
+    db.session.commit()
+    assert client.get("/posts").json[0]["firstName"] == "Test"
+
+    user.first_name = "Renamed"
+    db.session.commit()
+    assert user.profile_version == 2
+    assert client.get("/posts").json[0]["firstName"] == "Renamed"
+
+def test_profile_changes_invalidate_other_workers(app, add_user):
+    user = add_user()
+    other_worker = UserCards(app)
+    other_worker.cache.versions = cards.cache.versions
+    assert other_worker.resolve([user.id])[user.id]["firstName"] == "Test"
+
+    user.picture_path = "new.png"
+    db.session.commit()
+    assert other_worker.resolve([user.id])[user.id]["picturePath"] == "new.png"
+
+    user.password = "y"
+    db.session.commit()
+    assert user.profile_version == 2
+    assert user_cards(["missing"]) == {}
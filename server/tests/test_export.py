@@ -0,0 +1,38 @@
+import json
+from models import db, User, Post
+
+def add_posts(count):
+    author = User(first_name="Test", last_name="User", email="author@example.com", password="x")
+    db.session.add(author)
+    db.session.flush()
+    posts = [Post(user_id=author.id, content=f"post {i}") for i in range(count)]
+    db.session.add_all(posts)
+    db.session.commit()
+    return sorted(post.id for post in posts)
+
+def test_export_streams_ndjson_and_resumes_after_id(client):
+    post_ids = add_posts(5)
+    headers = {"Authorization": "Bearer test-export-token"}
+
+    response = client.get("/export/posts?batch_size=2", headers=headers)
+    assert response.status_code == 200
+    assert response.is_streamed
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [row["id"] for row in rows] == post_ids
+    assert rows[0]["likes"] == 0
+
+    response = client.get(f"/export/posts?after={post_ids[2]}", headers=headers)
+    assert [json.loads(line)["id"] for line in response.get_data(as_text=True).splitlines()] == post_ids[3:]
+
+def test_export_requires_token(client):
+    assert client.get("/export/users").status_code == 401
+    assert client.get("/export/users", headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+def test_export_command_resumes_partial_file(app, tmp_path):
+    post_ids = add_posts(4)
+    output = tmp_path / "posts.ndjson"
+    output.write_text(json.dumps({"id": post_ids[0]}) + "\n" + json.dumps({"id": post_ids[1]}) + '\n{"id": "trunc')
+
+    result = app.test_cli_runner().invoke(args=["export", "posts", str(output), "--resume"])
+    assert result.exit_code == 0, result.output
+    assert [json.loads(line)["id"] for line in output.read_text().splitlines()] == post_ids
@@ -0,0 +1,87 @@
+from datetime import datetime
+
+from models import db, Post, SpaceMembership, Space
+from feed import fan_out_post, read_feed
+
+def add_post(author, content):
+    post = Post(user_id=author.id, content=content)
+    db.session.add(post)
+    db.session.flush()
+    fan_out_post(post.id)
+    db.session.commit()
+    return post
+
+def test_posts_fan_out_to_followers_and_space_peers(add_user):
+    author, follower, peer, stranger = (add_user(f"{name}@example.com") for name in ("author", "follower", "peer", "stranger"))
+    follower.friends.append(author)
+    space = Space(title="Space", creator_id=author.id)
+    db.session.add(space)
+    db.session.flush()
+    db.session.add_all([SpaceMembership(user_id=author.id, space_id=space.id), SpaceMembership(user_id=peer.id, space_id=space.id)])
+
+    post = add_post(author, "hello")
+
+    assert [post_id for post_id, _ in read_feed(follower)] == [post.id]
+    assert [post_id for post_id, _ in read_feed(peer)] == [post.id]
+    assert read_feed(stranger) == []
+
+def test_heavily_followed_authors_are_merged_on_read(app, add_user):
+    app.config["FEED_FANOUT_LIMIT"] = 1
+    author, first, second = (add_user(f"{name}@example.com") for name in ("author", "first", "second"))
+    first.friends.append(author)
+    second.friends.append(author)
+
+    post = add_post(author, "hello")
+
+    assert author.fanout_on_read
+    assert [post_id for post_id, _ in read_feed(first)] == [post.id]
+    assert [post_id for post_id, _ in read_feed(second)] == [post.id]
+
+def test_posts_fanned_out_before_the_flag_are_not_repeated(app, add_user):
+    author, first, second = (add_user(f"{name}@example.com") for name in ("author", "first", "second"))
+    first.friends.append(author)
+    old = add_post(author, "before")
+
+    second.friends.append(author)
+    app.config["FEED_FANOUT_LIMIT"] = 1
+    new = add_post(author, "after")
+
+    assert author.fanout_on_read
+    assert sorted(post_id for post_id, _ in read_feed(first)) == sorted([old.id, new.id])
+
+def test_pages_do_not_skip_posts_with_equal_ranks(add_user):
+    author, follower = add_user("author@example.com"), add_user("follower@example.com")
+    follower.friends.append(author)
+    created_at = datetime(2024, 1, 1)
+    posts = []
+    for n in range(5):
+        post = Post(user_id=author.id, content=f"post {n}", created_at=created_at)
+        db.session.add(post)
+        db.session.flush()
+        fan_out_post(post.id)
+        posts.append(post.id)
+    db.session.commit()
+
+    seen, before = [], None
+    while True:
+        page = read_feed(follower, limit=2, before=before)
+        if not page:
+            break
+        seen.extend(post_id for post_id, _ in page)
+        before = (page[-1][1], page[-1][0])
+    assert sorted(seen) == sorted(posts)
+
+def test_feed_rejects_bad_limits_and_cursors(client, add_user, log_in):
+    author, follower = add_user("author@example.com"), add_user("follower@example.com")
+    follower.friends.append(author)
+    post = add_post(author, "hello")
+    log_in(follower)
+
+    for limit in (0, -1):
+        response = client.get("/feed", query_string={"limit": limit})
+        assert response.status_code == 200
+        assert [item["id"] for item in response.json["posts"]] == [post.id]
+
+    for cursor in ("abc", "1.0", "nan:x", "inf:x"):
+        assert client.get("/feed", query_string={"before": cursor}).status_code == 400
+    assert client.get("/trending/posts", query_string={"limit": -1}).status_code == 200
@@ -0,0 +1,37 @@
+from sqlalchemy import text
+from models import db, Post
+from fts import fts_query
+
+def search_posts(term):
+    return db.session.execute(
+        text("SELECT rowid FROM posts_fts WHERE posts_fts MATCH :query"),
+        {"query": fts_query(term)},
+    ).scalars().all()
+
+def add_post(author, content):
+    post = Post(user_id=author.id, content=content)
+    db.session.add(post)
+    db.session.commit()
+    return post
+
+def test_insert_is_indexed(add_user):
+    post = add_post(add_user(), "hello world")
+    assert search_posts("hello") == [post.pk]
+
+def test_update_replaces_the_indexed_text(add_user):
+    post = add_post(add_user(), "hello world")
+    post.content = "goodbye world"
+    db.session.commit()
+    assert search_posts("hello") == []
+    assert search_posts("goodbye") == [post.pk]
+
+def test_delete_removes_the_row_from_the_index(add_user):
+    post = add_post(add_user(), "hello world")
+    db.session.delete(post)
+    db.session.commit()
+    assert search_posts("hello") == []
+
+def test_queries_cannot_inject_fts_syntax(add_user):
+    post = add_post(add_user(), 'say "hi" OR bye')
+    assert fts_query('hi" OR bye') == '"hi"""* "OR"* "bye"*'
+    assert search_posts('"hi" OR') == [post.pk]
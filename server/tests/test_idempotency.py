@@ -0,0 +1,77 @@
+import io
+
+from models import Post
+
+def register(client):
+    client.post('/register', json={
+        "firstName": "John",
+        "lastName": "Doe",
+        "email": "john.doe@example.com",
+        "password": "TestPassword123!",
+        "confirmPassword": "TestPassword123!",
+        "occupation": "Engineer"
+    })
+
+def test_retried_post_is_replayed_not_duplicated(client):
+    register(client)
+    headers = {"Idempotency-Key": "retry-1"}
+
+    first = client.post('/posts', data={"description": "Hello"}, headers=headers)
+    second = client.post('/posts', data={"description": "Hello"}, headers=headers)
+
+    assert first.status_code == second.status_code == 200
+    assert second.headers['Idempotent-Replayed'] == 'true'
+    assert second.json == first.json
+    assert Post.query.count() == 1
+
+def test_reused_key_with_different_body_is_rejected(client):
+    register(client)
+    headers = {"Idempotency-Key": "retry-2"}
+
+    client.post('/posts', data={"description": "Hello"}, headers=headers)
+    response = client.post('/posts', data={"description": "Goodbye"}, headers=headers)
+
+    assert response.status_code == 422
+    assert Post.query.count() == 1
+
+def test_anonymous_and_session_requests_are_not_replayed(app):
+    body = {
+        "firstName": "John",
+        "lastName": "Doe",
+        "email": "john.doe@example.com",
+        "password": "TestPassword123!",
+        "confirmPassword": "TestPassword123!",
+        "occupation": "Engineer"
+    }
+    headers = {"Idempotency-Key": "register-1"}
+
+    first = app.test_client().post('/register', json=body, headers=headers)
+    # Another client behind the same address must not get the first one's session
+    second = app.test_client().post('/register', json=body, headers=headers)
+
+    assert first.status_code == 201
+    assert 'Idempotent-Replayed' not in second.headers
+    assert not second.headers.getlist('Set-Cookie')
+
+    login = {"email": body["email"], "password": body["password"]}
+    assert 'Idempotent-Replayed' not in app.test_client().post('/login', json=login, headers=headers).headers
+
+def test_replays_carry_no_cookies(client):
+    register(client)
+    headers = {"Idempotency-Key": "retry-3"}
+
+    client.post('/posts', data={"description": "Hello"}, headers=headers)
+    replay = client.post('/posts', data={"description": "Hello"}, headers=headers)
+    assert replay.headers['Idempotent-Replayed'] == 'true'
+    assert not replay.headers.getlist('Set-Cookie')
+
+def test_uploaded_files_are_fingerprinted_by_content(client, monkeypatch, tmp_path):
+    monkeypatch.setattr("tasks.ASSETS_DIR", str(tmp_path))
+    register(client)
+    headers = {"Idempotency-Key": "retry-4"}
+
+    first = client.post('/posts', data={"description": "Hi", "picture": (io.BytesIO(b"one"), "a.png")}, headers=headers)
+    second = client.post('/posts', data={"description": "Hi", "picture": (io.BytesIO(b"two"), "a.png")}, headers=headers)
+
+    assert first.status_code == 200
+    assert second.status_code == 422
@@ -0,0 +1,73 @@
+import json
+from app import bcrypt
+from models import db, User, Post, Comment, Space, SpaceMembership
+
+def write_ndjson(path, records):
+    path.write_text("".join(json.dumps(record) + "\n" for record in records))
+    return str(path)
+
+def test_import_users_posts_and_friends(app, tmp_path):
+    users = tmp_path / "users.csv"
+    users.write_text("id,email,password,first_name,occupation\n"
+                     "a1,ada@example.com,Secret#123,Ada,Engineer\n"
+                     "b2,bob@example.com,Secret#456,Bob,\n")
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=["import", "users", str(users), "--processes", "1"])
+    assert result.exit_code == 0, result.output
+    ada = User.query.filter_by(id="a1").one()
+    assert bcrypt.check_password_hash(ada.password, "Secret#123")
+    assert ada.occupation_key == "engineer"
+
+    posts = write_ndjson(tmp_path / "posts.ndjson", [
+        {"user_id": "a1", "content": "hello", "created_at": "2024-01-02T03:04:05"},
+        {"user_id": "missing", "content": "orphan"},
+    ])
+    result = runner.invoke(args=["import", "posts", posts])
+    assert result.exit_code == 0, result.output
+    assert [(post.content, post.first_name) for post in Post.query.all()] == [("hello", "Ada")]
+
+    friends = write_ndjson(tmp_path / "friends.ndjson", [{"user_id": "a1", "friend_id": "b2"}])
+    runner.invoke(args=["import", "friends", friends])
+    assert [friend.id for friend in User.query.filter_by(id="a1").one().friends] == ["b2"]
+
+def test_import_resumes_from_checkpoint(app, tmp_path):
+    db.session.add(User(id="a1", email="ada@example.com", password="x", first_name="Ada"))
+    db.session.commit()
+    posts = write_ndjson(tmp_path / "posts.ndjson", [{"user_id": "a1", "content": f"post {i}"} for i in range(5)])
+    (tmp_path / "posts.ndjson.progress").write_text("3")
+
+    result = app.test_cli_runner().invoke(args=["import", "posts", posts, "--resume", "--batch-size", "1"])
+    assert result.exit_code == 0, result.output
+    assert sorted(post.content for post in Post.query.all()) == ["post 3", "post 4"]
+    assert not (tmp_path / "posts.ndjson.progress").exists()
+
+def test_import_skips_unknown_references_and_stops_on_invalid_rows(app, tmp_path):
+    db.session.add(User(id="a1", email="ada@example.com", password="x", first_name="Ada"))
+    db.session.flush()
+    db.session.add_all([Post(id="p1", user_id="a1", content="hello"), Space(id="s1", title="Space", creator_id="a1")])
+    db.session.commit()
+    runner = app.test_cli_runner()
+
+    comments = write_ndjson(tmp_path / "comments.ndjson", [
+        {"id": "c1", "user_id": "a1", "post_id": "p1", "content": "kept"},
+        {"id": "c2", "user_id": "a1", "post_id": "missing", "content": "orphan"},
+        {"id": "c3", "user_id": "missing", "post_id": "p1", "content": "orphan"},
+        {"id": "c1", "user_id": "a1", "post_id": "p1", "content": "duplicate"},
+    ])
+    result = runner.invoke(args=["import", "comments", comments])
+    assert result.exit_code == 0, result.output
+    assert "Imported 1 comments; skipped 1 duplicates and 2 records referencing unknown ids." in result.output
+    assert [comment.content for comment in Comment.query.all()] == ["kept"]
+
+    memberships = write_ndjson(tmp_path / "memberships.ndjson", [
+        {"user_id": "a1", "space_id": "s1"}, {"user_id": "a1", "space_id": "missing"},
+    ])
+    result = runner.invoke(args=["import", "memberships", memberships])
+    assert "Imported 1 memberships; skipped 0 duplicates and 1 records referencing unknown ids." in result.output
+    assert SpaceMembership.query.count() == 1
+
+    invalid = write_ndjson(tmp_path / "invalid.ndjson", [{"user_id": "a1", "post_id": "p1", "content": None}])
+    result = runner.invoke(args=["import", "comments", invalid])
+    assert result.exit_code != 0
+    assert "NOT NULL" in result.output
@@ -0,0 +1,57 @@
+from models import db, Job
+from config import TestingConfig
+from jobs import job_handler, enqueue, claim_next, run_job, _worker_process
+
+calls = []
+
+@job_handler("test_flaky", max_attempts=2)
+def flaky(fail):
+    calls.append(fail)
+    if fail:
+        raise RuntimeError("boom")
+
+def test_enqueue_is_idempotent(app):
+    app.config["JOBS_EAGER"] = False
+    first = enqueue("test_flaky", {"fail": False}, idempotency_key="once")
+    db.session.commit()
+    second = enqueue("test_flaky", {"fail": False}, idempotency_key="once")
+    assert first.id == second.id
+    assert Job.query.count() == 1
+
+def test_failed_job_is_retried_then_marked_failed(app):
+    app.config["JOBS_EAGER"] = False
+    app.config["JOBS_BACKOFF_BASE"] = 0
+    job = enqueue("test_flaky", {"fail": True})
+    db.session.commit()
+
+    assert run_job(claim_next()) is False
+    assert db.session.get(Job, job.id).status == "queued"
+
+    assert run_job(claim_next()) is False
+    job = db.session.get(Job, job.id)
+    assert job.status == "failed"
+    assert job.attempts == 2
+    assert claim_next() is None
+
+def test_jobs_that_keep_killing_their_worker_fail(app):
+    app.config["JOBS_EAGER"] = False
+    app.config["JOBS_LOCK_TIMEOUT"] = 0
+    job = enqueue("test_flaky", {"fail": False})
+    db.session.commit()
+
+    # Claimed twice by workers that died before releasing it
+    assert claim_next().id == job.id
+    assert claim_next().id == job.id
+    assert claim_next() is None
+
+    job = db.session.get(Job, job.id)
+    assert job.status == "failed"
+    assert job.attempts == 2
+
+def test_worker_processes_use_the_parent_config(app, monkeypatch):
+    import app as app_module
+    built = []
+    monkeypatch.setattr(app_module, "create_app", lambda config_class: built.append(config_class) or app)
+
+    _worker_process(app.config["CONFIG_CLASS"], poll_interval=0, burst=True)
+    assert built == [TestingConfig]
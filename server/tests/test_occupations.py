@@ -0,0 +1,36 @@
+import pytest
+from models import db
+from occupations import occupation_key, refresh_user, similar_users
+
+@pytest.fixture
+def add_user(add_user):
+    def add_indexed_user(email, occupation):
+        user = add_user(email, occupation=occupation)
+        refresh_user(user)
+        db.session.commit()
+        return user
+    return add_indexed_user
+
+def test_occupation_key_is_normalized():
+    assert occupation_key("Software Engineer") == occupation_key("engineer, SOFTWARE")
+    assert occupation_key("  ") is None
+
+def test_similar_users_ranks_exact_matches_first(add_user):
+    me = add_user("me@example.com", "Software Engineer")
+    exact = add_user("exact@example.com", "software engineer")
+    partial = add_user("partial@example.com", "Civil Engineer")
+    add_user("other@example.com", "Teacher")
+
+    matches, has_more = similar_users(me)
+    assert [user.id for user, _ in matches] == [exact.id, partial.id]
+    assert not has_more
+
+def test_similar_users_follows_occupation_changes(add_user):
+    me = add_user("me@example.com", "Nurse")
+    other = add_user("other@example.com", "Nurse")
+
+    other.occupation = "Pilot"
+    refresh_user(other)
+    db.session.commit()
+
+    assert similar_users(me) == ([], False)
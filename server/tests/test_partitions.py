@@ -0,0 +1,89 @@
+from sqlalchemy import func, select
+from app import create_app
+from config import TestingConfig
+from models import db, User, Space, Discussion
+from partitions import partitions
+
+def partitioned_app(tmp_path):
+    class PartitionConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'primary.sqlite'}"
+        DISCUSSION_PARTITIONS = {
+            "shard_0": f"sqlite:///{tmp_path / 'shard_0.sqlite'}",
+            "shard_1": f"sqlite:///{tmp_path / 'shard_1.sqlite'}",
+            "big_space": f"sqlite:///{tmp_path / 'big_space.sqlite'}",
+        }
+        DISCUSSION_HASH_PARTITIONS = ["shard_0", "shard_1"]
+
+    app = create_app(PartitionConfig)
+    app.test_cli_runner().invoke(args=["init-db"])
+    return app
+
+def setup_space(app, client):
+    with app.app_context():
+        user = User(first_name="Test", last_name="User", email="me@example.com", password="x")
+        db.session.add(user)
+        db.session.flush()
+        space = Space(title="Space", creator_id=user.id)
+        db.session.add(space)
+        db.session.commit()
+        user_id, space_id = user.id, space.id
+    with client.session_transaction() as session:
+        session["user_id"] = user_id
+    return user_id, space_id
+
+def count(app, partition):
+    with app.app_context():
+        return partitions.session(partition).scalar(select(func.count()).select_from(Discussion))
+
+def test_discussions_live_in_their_space_partition(tmp_path):
+    app = partitioned_app(tmp_path)
+    client = app.test_client()
+    user_id, space_id = setup_space(app, client)
+
+    discussion = client.post(f"/spaces/{space_id}/discussions", json={"title": "Hi", "thoughts": "First"}).json
+    client.post(f"/discussions/{discussion['discussion_id']}/comments", json={"content": "Reply"})
+
+    with app.app_context():
+        home = partitions.hash_partition(space_id)
+    assert count(app, home) == 1
+    assert count(app, None) == 0
+
+    assert [d["title"] for d in client.get(f"/spaces/{space_id}/discussions").json] == ["Hi"]
+    assert client.get(f"/discussions/{discussion['discussion_id']}").json["content"] == "First"
+    assert [c["content"] for c in client.get(f"/discussions/{discussion['discussion_id']}/comments").json["comments"]] == ["Reply"]
+    assert [item["type"] for item in client.get(f"/users/{user_id}/activity").json] == ["comment", "discussion"]
+
+    exported = client.get("/export/discussions", headers={"Authorization": "Bearer test-export-token"})
+    assert discussion["discussion_id"] in exported.get_data(as_text=True)
+
+    assert client.delete(f"/spaces/{space_id}").status_code == 200
+    assert count(app, home) == 0
+
+def test_move_and_rebalance_keep_discussions_reachable(tmp_path):
+    app = partitioned_app(tmp_path)
+    client = app.test_client()
+    user_id, space_id = setup_space(app, client)
+
+    # Written before partitioning, so it starts on the primary
+    with app.app_context():
+        legacy = Discussion(user_id=user_id, space_id=space_id, title="Old", content="Legacy")
+        db.session.add(legacy)
+        db.session.commit()
+        legacy_id = legacy.id
+
+    runner = app.test_cli_runner()
+    assert runner.invoke(args=["discussions", "move", space_id, "big_space"]).exit_code == 0
+    assert count(app, None) == 0
+    assert count(app, "big_space") == 1
+    assert client.get(f"/discussions/{legacy_id}").json["title"] == "Old"
+
+    # Pinned spaces are left alone by rebalancing
+    result = runner.invoke(args=["discussions", "rebalance"])
+    assert space_id not in result.output
+    assert count(app, "big_space") == 1
+
+    assert runner.invoke(args=["discussions", "move", space_id, "primary"]).exit_code == 0
+    runner.invoke(args=["discussions", "rebalance"])
+    with app.app_context():
+        assert count(app, partitions.hash_partition(space_id)) == 1
+    assert [d["title"] for d in client.get(f"/spaces/{space_id}/discussions").json] == ["Old"]
@@ -0,0 +1,62 @@
+import json
+
+import pytest
+from models import db, User
+from profiler import RedisArming, profiler
+
+def test_profile_header_writes_stacks_memory_and_sql(app, client, tmp_path):
+    app.config["PROFILE_DIR"] = str(tmp_path)
+    app.config["PROFILE_INTERVAL"] = 0.0005
+    db.session.add(User(first_name="Test", last_name="User", email="me@example.com", password="x"))
+    db.session.commit()
+
+    response = client.post("/search", json={"query": "test"}, headers={"X-Profile": "test-profile-token"})
+    profile_id = response.headers["X-Profile-Id"]
+
+    summary = json.loads((tmp_path / f"{profile_id}.json").read_text())
+    assert summary["endpoint"] == "api.search"
+    assert summary["memory_peak_bytes"] > 0
+    assert any("FROM users" in entry["statement"] for entry in summary["sql"])
+
+    for line in (tmp_path / f"{profile_id}.collapsed").read_text().splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) > 0 and ";" in stack
+
+def test_only_authorized_or_armed_requests_are_profiled(app, client, tmp_path):
+    app.config["PROFILE_DIR"] = str(tmp_path)
+    assert "X-Profile-Id" not in client.get("/posts", headers={"X-Profile": "wrong"}).headers
+
+    assert app.test_cli_runner().invoke(args=["profile", "arm", "api.get_all_posts"]).exit_code == 0
+    assert "X-Profile-Id" in client.get("/posts").headers
+    assert "X-Profile-Id" not in client.get("/posts").headers
+
+def test_redis_arming_polls_instead_of_asking_per_request():
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis()
+    worker, other = RedisArming(client, poll_interval=60), RedisArming(client, poll_interval=60)
+    assert worker.take("api.search") is False
+
+    other.arm("api.search", 1)
+    # Seen on the next poll, not on the next request
+    assert worker.take("api.search") is False
+    worker.polled_at = 0.0
+    assert worker.take("api.search") is True
+    assert worker.take("api.search") is False
+    assert worker.armed == frozenset()
+
+def test_unreachable_store_skips_profiling(app, client, monkeypatch):
+    def unavailable(endpoint):
+        raise ConnectionError("store is down")
+
+    monkeypatch.setattr(profiler.arming, "take", unavailable)
+    response = client.get("/posts")
+    assert response.status_code == 200
+    assert "X-Profile-Id" not in response.headers
+
+def test_armed_slots_are_kept_while_another_request_is_profiled(app, client, tmp_path):
+    app.config["PROFILE_DIR"] = str(tmp_path)
+    app.test_cli_runner().invoke(args=["profile", "arm", "api.get_all_posts"])
+
+    with profiler.busy:
+        assert "X-Profile-Id" not in client.get("/posts").headers
+    assert "X-Profile-Id" in client.get("/posts").headers
@@ -0,0 +1,99 @@
+import json
+import os
+
+import pytest
+from models import db, User, Post, Comment, Space, Discussion, DiscussionComment
+from query_plans import compare_reports, plan_report, record_queries
+
+# Each route: (method, path, json body, query budget, tables it may scan and why).
+# Routes that check private spaces spend one query on the viewer's memberships,
+# because every test starts with a cold cache.
+ROUTES = [
+    ("GET", "/posts/{post_id}", None, 5, {}),
+    ("GET", "/posts", None, 5, {"posts": "returns every post"}),
+    ("GET", "/feed", None, 4, {}),
+    ("GET", "/users/{user_id}/friends", None, 2, {}),
+    ("GET", "/users/{user_id}/similar", None, 1, {}),
+    ("GET", "/users/{user_id}/spaces", None, 3, {}),
+    ("GET", "/users/{user_id}/activity", None, 3, {}),
+    ("GET", "/notifications/{user_id}", None, 8, {}),
+    ("GET", "/trending/posts", None, 1, {}),
+    ("GET", "/settings", None, 1, {}),
+    ("GET", "/spaces/{space_id}", None, 2, {}),
+    ("GET", "/spaces/{space_id}/discussions", None, 2, {}),
+    ("GET", "/discussions/{discussion_id}", None, 2, {}),
+    ("GET", "/discussions/{discussion_id}/comments", None, 3, {}),
+    ("GET", "/memberships?spaceId={space_id}&userId={user_id}", None, 3, {}),
+    ("PATCH", "/posts/{post_id}/like", None, 9, {}),
+    ("POST", "/posts/{post_id}/comment", None, 5, {}),
+    ("POST", "/search", {"query": "hello"}, 5, {"users": "substring search", "posts": "substring search"}),
+]
+
+REPORT = {}
+
+
+@pytest.fixture
+def seeded(app, client):
+    users = [
+        User(first_name=f"User{n}", last_name="Test", email=f"user{n}@example.com", password="x", occupation="Nurse")
+        for n in range(4)
+    ]
+    db.session.add_all(users)
+    db.session.flush()
+    me = users[0]
+    me.friends.extend(users[1:3])
+
+    posts = [Post(user_id=user.id, content=f"hello from {user.first_name}") for user in users for _ in range(3)]
+    db.session.add_all(posts)
+    db.session.flush()
+    for post in posts:
+        db.session.add(Comment(user_id=users[1].id, post_id=post.id, content="nice"))
+        post.likes.append(users[2])
+
+    space = Space(title="hello space", creator_id=me.id)
+    db.session.add(space)
+    db.session.flush()
+    space.members.append(me)
+    discussion = Discussion(user_id=me.id, space_id=space.id, title="Topic", content="hello")
+    db.session.add(discussion)
+    db.session.flush()
+    db.session.add(DiscussionComment(user_id=me.id, space_id=space.id, discussion_id=discussion.id, title="Topic", content="reply"))
+    db.session.commit()
+
+    with client.session_transaction() as session:
+        session["user_id"] = me.id
+    return {"user_id": me.id, "post_id": posts[-1].id, "space_id": space.id, "discussion_id": discussion.id}
+
+
+@pytest.mark.parametrize("method,path,body,budget,allowed_scans", ROUTES, ids=[f"{r[0]} {r[1]}" for r in ROUTES])
+def test_route_query_plans(app, client, seeded, method, path, body, budget, allowed_scans):
+    url = path.format(**seeded)
+    with record_queries(db.engine) as statements:
+        response = client.open(url, method=method, json=body, data=None if body else {"content": "hi"})
+    assert response.status_code < 400, response.get_data(as_text=True)
+
+    plans = plan_report(db.engine, statements)
+    scans = sorted({table for entry in plans for table in entry["scans"]})
+    REPORT[f"{method} {path}"] = {"queries": len(statements), "budget": budget, "scans": scans, "statements": plans}
+
+    unexpected = [entry for entry in plans if set(entry["scans"]) - set(allowed_scans)]
+    assert not unexpected, "\n".join(f"{entry['sql']}\n  {entry['plan']}" for entry in unexpected)
+    assert len(statements) <= budget, "\n".join(entry["sql"] for entry in plans)
+
+
+def test_compare_reports_flags_regressions():
+    old = {"GET /posts": {"queries": 3, "scans": []}}
+    new = {"GET /posts": {"queries": 5, "scans": ["posts"]}, "GET /feed": {"queries": 2, "scans": []}}
+    assert compare_reports(old, new) == [
+        "GET /feed: new route, 2 queries",
+        "GET /posts: 3 -> 5 queries",
+        "GET /posts: new full scans of posts",
+    ]
+
+
+def teardown_module(module):
+    # QUERY_PLAN_REPORT=path writes the per-route report for `flask compare-query-plans`
+    path = os.environ.get("QUERY_PLAN_REPORT")
+    if path and REPORT:
+        with open(path, "w") as file:
+            json.dump(REPORT, file, indent=2, sort_keys=True, default=str)
@@ -0,0 +1,77 @@
+import pytest
+from ratelimit import RedisBackend
+
+def test_login_is_rate_limited_with_retry_after(app, client):
+    app.config.update(RATELIMIT_ENABLED=True, RATELIMIT_CAPACITY=20, RATELIMIT_REFILL_PER_SECOND=1.0)
+
+    credentials = {"email": "nobody@example.com", "password": "wrong"}
+    assert client.post('/login', json=credentials).status_code == 401
+    assert client.post('/login', json=credentials).status_code == 401
+
+    response = client.post('/login', json=credentials)
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+
+def test_routes_without_a_cost_are_not_limited(app, client):
+    app.config.update(RATELIMIT_ENABLED=True, RATELIMIT_CAPACITY=1, RATELIMIT_COSTS={"api.get_spaces": 0})
+
+    for _ in range(5):
+        assert client.get('/spaces').status_code == 200
+
+def test_denied_user_requests_leave_the_ip_bucket_alone(app, client):
+    app.config.update(RATELIMIT_ENABLED=True, RATELIMIT_CAPACITY=2, RATELIMIT_REFILL_PER_SECOND=0.001)
+    with client.session_transaction() as session:
+        session["user_id"] = "someone"
+
+    assert client.get('/spaces').status_code == 200
+    assert client.get('/spaces').status_code == 200
+    for _ in range(3):
+        assert client.get('/spaces', environ_base={"REMOTE_ADDR": "10.0.0.2"}).status_code == 429
+
+    with client.session_transaction() as session:
+        session.clear()
+    assert client.get('/spaces', environ_base={"REMOTE_ADDR": "10.0.0.2"}).status_code == 200
+
+def test_trusted_proxies_limit_the_forwarded_client():
+    from app import create_app
+    from config import TestingConfig
+
+    class Config(TestingConfig):
+        RATELIMIT_ENABLED = True
+        RATELIMIT_CAPACITY = 1
+        RATELIMIT_REFILL_PER_SECOND = 0.001
+        RATELIMIT_TRUSTED_PROXIES = 1
+
+    app = create_app(Config)
+    with app.app_context():
+        from models import db
+        db.create_all()
+        client = app.test_client()
+        assert client.get('/spaces', headers={"X-Forwarded-For": "203.0.113.1"}).status_code == 200
+        assert client.get('/spaces', headers={"X-Forwarded-For": "203.0.113.1"}).status_code == 429
+        assert client.get('/spaces', headers={"X-Forwarded-For": "203.0.113.2"}).status_code == 200
+        db.drop_all()
+
+def test_requests_the_ip_bucket_denies_leave_the_user_bucket_alone(app, client):
+    app.config.update(RATELIMIT_ENABLED=True, RATELIMIT_CAPACITY=2, RATELIMIT_REFILL_PER_SECOND=0.001)
+    # A noisy neighbour empties the shared IP bucket
+    assert client.get('/spaces').status_code == 200
+    assert client.get('/spaces').status_code == 200
+
+    with client.session_transaction() as session:
+        session["user_id"] = "someone"
+    for _ in range(3):
+        assert client.get('/spaces').status_code == 429
+    assert client.get('/spaces', environ_base={"REMOTE_ADDR": "10.0.0.2"}).status_code == 200
+    assert client.get('/spaces', environ_base={"REMOTE_ADDR": "10.0.0.3"}).status_code == 200
+
+def test_redis_buckets_are_charged_together():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    backend = RedisBackend(fakeredis.FakeRedis())
+
+    assert backend.consume(["ip:a"], 2, 0.001, 2) == 0
+    assert backend.consume(["ip:a", "user:1"], 2, 0.001, 1) > 0
+    # The denied request above didn't touch the user bucket
+    assert backend.consume(["ip:b", "user:1"], 2, 0.001, 2) == 0
+    assert backend.consume(["ip:c", "user:1"], 2, 0.001, 1) > 0
@@ -0,0 +1,58 @@
+import os
+from app import create_app
+from config import TestingConfig
+from models import db, User, Post
+from replicas import STICKY_COOKIE, replicas
+
+def replica_app(tmp_path):
+    class ReplicaConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'primary.sqlite'}"
+        SQLALCHEMY_REPLICA_URIS = [f"sqlite:///{tmp_path / 'replica.sqlite'}"]
+        REPLICA_HEALTH_INTERVAL = 0
+
+    app = create_app(ReplicaConfig)
+    with app.app_context():
+        db.create_all()
+        author = User(first_name="Test", last_name="User", email="author@example.com", password="x")
+        db.session.add(author)
+        db.session.flush()
+        author_id = author.id
+        db.session.add(Post(user_id=author_id, content="replicated"))
+        db.session.commit()
+    app.test_cli_runner().invoke(args=["replicas", "sync"])
+
+    with app.app_context():
+        # Written after the copy, so only the primary has it
+        db.session.add(Post(user_id=author_id, content="primary only"))
+        db.session.commit()
+    return app
+
+def test_reads_use_replica_until_the_client_writes(tmp_path):
+    app = replica_app(tmp_path)
+    client = app.test_client()
+
+    assert [post["content"] for post in client.get("/posts").json] == ["replicated"]
+
+    response = client.post("/register", json={
+        "firstName": "New", "lastName": "User", "email": "new@example.com",
+        "password": "Secret#123", "confirmPassword": "Secret#123", "occupation": "Pilot",
+    })
+    assert response.status_code == 201
+    assert len(client.get("/posts").json) == 2
+
+def test_unhealthy_replica_falls_back_to_primary(tmp_path):
+    app = replica_app(tmp_path)
+    app.extensions["replicas"]["replica_0"].dispose()
+    os.remove(tmp_path / "replica.sqlite")
+
+    assert len(app.test_client().get("/posts").json) == 2
+    assert replicas.health["replica_0"][0] is False
+
+def test_search_reads_from_a_replica_without_pinning_the_client(tmp_path):
+    app = replica_app(tmp_path)
+    client = app.test_client()
+
+    response = client.post("/search", json={"query": "primary"})
+    assert response.json["posts"] == []
+    assert STICKY_COOKIE not in response.headers.get("Set-Cookie", "")
+    assert [post["content"] for post in client.get("/posts").json] == ["replicated"]
@@ -0,0 +1,16 @@
+import pytest
+
+serve = pytest.importorskip("serve")
+
+def test_options_come_from_the_config(app):
+    app.config["SERVER_WORKERS"] = 0
+    options = serve.options(app)
+    assert options["preload_app"] is True
+    assert options["workers"] >= 3
+    assert options["max_requests"] == app.config["SERVER_MAX_REQUESTS"]
+
+def test_post_fork_gives_the_worker_fresh_pools(app):
+    engine = serve.engines(app)[0]
+    pool = engine.pool
+    serve.options(app)["post_fork"](None, None)
+    assert engine.pool is not pool
@@ -0,0 +1,19 @@
+def test_unmodified_sessions_are_not_rewritten(app, client, user):
+    store = app.session_interface
+    (key, record), = store.records.items()
+
+    assert client.post("/@me").json["id"] == user.id
+    assert store.records[key] is record
+
+def test_sessions_are_refreshed_after_half_their_lifetime(app, client, user):
+    store = app.session_interface
+    (key, (expires_at, data)), = store.records.items()
+    lifetime = app.permanent_session_lifetime.total_seconds()
+    store.records[key] = (expires_at - lifetime * 0.6, data)
+
+    client.post("/@me")
+    assert store.records[key][0] > expires_at - 1
+
+def test_logout_deletes_the_stored_session(app, client, user):
+    client.post("/logout")
+    assert not app.session_interface.records
@@ -0,0 +1,68 @@
+from sqlalchemy import event, insert
+from models import db, UserSettings
+from settings import UserSettingsStore, merge_patch, user_settings
+
+def test_merge_patch_follows_rfc_7396():
+    assert merge_patch({"a": {"b": 1, "c": 2}, "d": 3}, {"a": {"b": None, "e": 4}, "d": [1]}) == {"a": {"c": 2, "e": 4}, "d": [1]}
+
+def test_settings_patch_is_versioned(client, user):
+    assert client.get("/settings").json["settings"]["notification_preferences"]["likes"] is True
+
+    response = client.patch("/settings", json={"notification_preferences": {"likes": False}, "theme": "dark"})
+    assert response.json["version"] == 1
+    assert response.json["settings"]["notification_preferences"] == {
+        "friends": True, "comments": True, "likes": False, "spaces": True, "occupation": True,
+    }
+
+    response = client.patch("/settings", json={"theme": None}, headers={"If-Match": '"1"'})
+    assert response.headers["ETag"] == '"2"'
+    assert "theme" not in response.json["settings"]
+
+    assert client.patch("/settings", json={"theme": "light"}, headers={"If-Match": '"1"'}).status_code == 412
+    assert client.patch("/settings", json={"theme": "light"}, headers={"If-Match": 'W/"2"'}).status_code == 200
+    assert client.patch("/settings", json={"theme": "light"}, headers={"If-Match": "3"}).status_code == 400
+
+def test_concurrent_first_writes_are_stale(client, user):
+
+    @event.listens_for(db.session, "before_flush", once=True)
+    def insert_first(session, flush_context, instances):
+        # Another request creates the row after this one found none
+        session.execute(insert(UserSettings).values(user_id=user.id, data={"theme": "dark"}, version=1))
+
+    assert client.patch("/settings", json={"theme": "light"}).status_code == 412
+
+def test_writes_invalidate_other_workers_caches(app, add_user):
+    user = add_user()
+
+    other_worker = UserSettingsStore(app)
+    other_worker.cache.versions = user_settings.cache.versions
+    assert other_worker.get(user.id)[1]["notification_preferences"]["likes"] is True
+
+    user_settings.patch(user.id, {"notification_preferences": {"likes": False}})
+    assert other_worker.get(user.id) == user_settings.get(user.id)
+    assert other_worker.get(user.id)[1]["notification_preferences"]["likes"] is False
+
+def test_notifications_skip_disabled_types(client, user, add_user):
+    friend = add_user("friend@example.com", first_name="Friend")
+    user.friends.append(friend)
+    db.session.commit()
+
+    assert [n["type"] for n in client.get(f"/notifications/{user.id}").json] == ["friend"]
+    client.post("/update-settings", json={"notificationPreferences": {"friends": False}})
+    assert client.get(f"/notifications/{user.id}").json == []
+    assert len(client.get(f"/notifications/{user.id}?type=friends").json) == 1
+
+def test_update_settings_reports_racing_writes(client, user):
+
+    raced = []
+
+    @event.listens_for(db.session, "before_flush")
+    def insert_first(session, flush_context, instances):
+        # The names flush first; race only the flush that creates the settings row
+        if not raced and any(isinstance(obj, UserSettings) for obj in session.new):
+            raced.append(True)
+            session.execute(insert(UserSettings).values(user_id=user.id, data={"theme": "dark"}, version=1))
+
+    response = client.post("/update-settings", json={"notificationPreferences": {"likes": False}})
+    event.remove(db.session, "before_flush", insert_first)
+    assert response.status_code == 409
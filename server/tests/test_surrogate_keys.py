@@ -0,0 +1,60 @@
+import os
+import shutil
+import sqlite3
+
+import pytest
+from models import db, User, Post, Space, Discussion, SpaceMembership, likes_association
+
+LEGACY_DB = os.path.join(os.path.dirname(__file__), "..", "..", "instance", "db.sqlite")
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    # The string-keyed schema the app shipped with, filled with a few rows
+    path = tmp_path / "legacy.sqlite"
+    shutil.copy(LEGACY_DB, path)
+    with sqlite3.connect(path) as connection:
+        connection.executemany(
+            "INSERT INTO users (id, first_name, email, password, occupation) VALUES (?, ?, ?, 'x', ?)",
+            [("u1", "Ada", "ada@example.com", "Software Engineer"), ("u2", "Bob", "bob@example.com", None)],
+        )
+        connection.execute("INSERT INTO posts (id, user_id, content) VALUES ('p1', 'u1', 'hello')")
+        connection.execute("INSERT INTO likes_association (user_id, post_id) VALUES ('u2', 'p1')")
+        connection.executemany("INSERT INTO spaces (id, title, is_public) VALUES (?, ?, 1)", [("s1", "One"), ("s2", "Two")])
+        connection.execute("INSERT INTO space_memberships (user_id, space_id) VALUES ('u2', 's1')")
+        connection.execute("INSERT INTO discussions (id, user_id, space_id, title, content) VALUES ('d1', 'u1', 's2', 'Hi', 'there')")
+    return path
+
+def migrate(app, *args):
+    return app.test_cli_runner().invoke(args=["keys", "migrate", *map(str, args)])
+
+def test_migration_copies_every_table(app, legacy_db):
+    result = migrate(app, legacy_db, "--default-creator", "u1")
+    assert result.exit_code == 0, result.output
+    for line in ("users: 2 rows copied", "posts: 1 rows copied", "spaces: 2 rows copied",
+                 "space_memberships: 1 rows copied", "discussions: 1 rows copied", "likes_association: 1 rows copied"):
+        assert line in result.output
+
+    assert {space.creator_id for space in Space.query} == {"u1"}
+    assert SpaceMembership.query.count() == Discussion.query.count() == Post.query.count() == 1
+    assert db.session.scalar(db.select(db.func.count()).select_from(likes_association)) == 1
+    assert {user.id: user.occupation_key for user in User.query} == {"u1": "engineer software", "u2": None}
+
+    # A repeated run skips what is already there
+    assert "users: 0 rows copied" in migrate(app, legacy_db, "--default-creator", "u1").output
+    assert User.query.count() == 2
+
+def test_migration_needs_a_creator_for_legacy_spaces(app, legacy_db):
+    result = migrate(app, legacy_db)
+    assert result.exit_code != 0
+    assert "2 spaces have no creator" in result.output
+    assert User.query.count() == 0
+
+def test_migration_stops_on_rows_that_break_constraints(app, legacy_db):
+    # Only rows already copied under the same id are skipped, not other conflicts
+    db.session.add(User(id="u3", first_name="Eve", email="ada@example.com", password="x"))
+    db.session.commit()
+
+    result = migrate(app, legacy_db, "--default-creator", "u1")
+    assert result.exit_code != 0
+    assert "users:" in result.output and "not copied" in result.output
+    assert Space.query.count() == 0
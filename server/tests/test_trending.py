@@ -0,0 +1,44 @@
+import pytest
+
+from trending import RedisWindows, SlidingWindow
+
+def test_sliding_window_decays_and_expires_buckets():
+    window = SlidingWindow(bucket_seconds=60, bucket_count=3, half_life=60)
+    window.add("old", 4.0, now=0)
+    window.add("new", 1.0, now=120)
+
+    scores = window.scores(now=120)
+    assert scores == {"old": 1.0, "new": 1.0}
+
+    assert window.scores(now=180) == {"new": 0.5}
+
+def test_trending_posts_ranks_recent_activity(app):
+    from trending import trending
+    trending.record("posts", "quiet", "like")
+    trending.record("posts", "busy", "comment")
+    trending.record("posts", "busy", "like")
+
+    assert [post_id for post_id, _ in trending.top("posts")] == ["busy", "quiet"]
+
+def test_redis_windows_are_shared_between_workers():
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis()
+    first = RedisWindows(client, bucket_seconds=60, bucket_count=3, half_life=60)
+    second = RedisWindows(client, bucket_seconds=60, bucket_count=3, half_life=60)
+    first.add("posts", "old", 4.0, now=0)
+    second.add("posts", "new", 1.0, now=120)
+
+    assert first.scores("posts", now=120) == second.scores("posts", now=120) == {"old": 1.0, "new": 1.0}
+    assert first.scores("posts", now=180) == {"new": 0.5}
+
+def test_trending_rankings_refresh_on_read(app):
+    from trending import trending
+    trending.record("posts", "quiet", "like")
+    assert [post_id for post_id, _ in trending.top("posts")] == ["quiet"]
+
+    trending.refresh_interval = 60
+    trending.record("posts", "busy", "comment")
+    assert [post_id for post_id, _ in trending.top("posts")] == ["quiet"]
+
+    trending.refreshed_at -= 60
+    assert [post_id for post_id, _ in trending.top("posts")] == ["busy", "quiet"]
@@ -0,0 +1,68 @@
+import hashlib
+import os
+
+import pytest
+from models import Post
+
+DATA = os.urandom(300 * 1024)
+
+@pytest.fixture
+def logged_in(app, user, tmp_path):
+    app.config["UPLOAD_ROOT"] = str(tmp_path)
+    app.config["UPLOAD_PARTS_DIR"] = str(tmp_path / "parts")
+    app.config["UPLOAD_BUFFER_SIZE"] = 4096
+    return user
+
+def send(client, upload_id, offset, chunk, **headers):
+    return client.patch(
+        f"/uploads/{upload_id}", data=chunk, content_type="application/offset+octet-stream",
+        headers={"Upload-Offset": str(offset), **headers},
+    )
+
+def test_chunked_upload_resumes_and_finalizes(client, logged_in, tmp_path):
+    sha256 = hashlib.sha256(DATA).hexdigest()
+    upload = client.post("/uploads", json={"filename": "photo.PNG", "size": len(DATA), "sha256": sha256}).json
+
+    assert send(client, upload["id"], 0, DATA[:100 * 1024]).json["offset"] == 100 * 1024
+    assert os.listdir(tmp_path) == ["parts"]
+
+    # A retried or out-of-order chunk is refused with the offset to resume from
+    response = send(client, upload["id"], 200 * 1024, DATA[200 * 1024:])
+    assert response.status_code == 409
+    assert response.headers["Upload-Offset"] == str(100 * 1024)
+
+    bad = send(client, upload["id"], 100 * 1024, DATA[100 * 1024:], **{"Upload-Checksum": "0" * 64})
+    assert bad.status_code == 422
+    assert client.get(f"/uploads/{upload['id']}").json["offset"] == 100 * 1024
+
+    part = tmp_path / "parts" / f"{upload['id']}.part"
+    assert part.stat().st_size == 100 * 1024
+
+    done = send(client, upload["id"], 100 * 1024, DATA[100 * 1024:]).json
+    assert done["status"] == "complete"
+    assert done["path"] == f"{upload['id']}.png"
+    assert (tmp_path / done["path"]).read_bytes() == DATA
+    assert not part.exists()
+
+    response = client.post("/posts", data={"description": "hello", "upload_id": upload["id"]})
+    assert response.status_code == 200
+    assert Post.query.one().post_image == done["path"]
+
+def test_checksum_mismatch_fails_the_upload(client, logged_in, tmp_path):
+    upload = client.post("/uploads", json={"filename": "a.jpg", "size": 10, "sha256": "0" * 64}).json
+
+    assert send(client, upload["id"], 0, b"0123456789").status_code == 422
+    assert client.get(f"/uploads/{upload['id']}").json["status"] == "failed"
+    assert not os.listdir(tmp_path / "parts")
+
+    response = client.post("/posts", data={"description": "hello", "upload_id": upload["id"]})
+    assert response.status_code == 400
+
+def test_idempotent_retries_do_not_read_the_chunk(client, logged_in):
+    upload = client.post("/uploads", json={"filename": "a.jpg", "size": 20}).json
+    first = send(client, upload["id"], 0, b"x" * 10, **{"Idempotency-Key": "chunk-1"})
+    retry = send(client, upload["id"], 0, b"x" * 10, **{"Idempotency-Key": "chunk-1"})
+
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json == first.json
+    assert client.get(f"/uploads/{upload['id']}").json["offset"] == 10
@@ -0,0 +1,218 @@
+import atexit
+import json
+import os
+import threading
+import time
+
+from redis_store import redis_for
+
+
+# ---------------- Trending ----------------
+#
+# Routes report like, dislike, comment and join events. Each kind of item
+# (posts, spaces) has a sliding window of fixed-width time buckets, and an
+# item's score is the sum of its bucket totals, halved every half-life. Scores
+# are re-ranked at most once per refresh interval when the lists are read, so
+# rankings keep decaying while nothing new happens. With the redis backend
+# every worker adds to and ranks the same shared buckets; the memory backend
+# keeps them in the process and checkpoints them to a file, so it is only
+# suited to a single process.
+
+EVENT_WEIGHTS = {
+    "like": 1.0,
+    "dislike": -0.5,
+    "comment": 2.0,
+    "join": 1.0,
+}
+
+KINDS = ("posts", "spaces")
+
+
+def _decayed_totals(buckets, current, bucket_seconds, half_life):
+    totals = {}
+    for index, bucket in buckets.items():
+        decay = 0.5 ** ((current - index) * bucket_seconds / half_life)
+        for item_id, score in bucket.items():
+            totals[item_id] = totals.get(item_id, 0.0) + score * decay
+    return totals
+
+
+class SlidingWindow:
+    def __init__(self, bucket_seconds, bucket_count, half_life):
+        self.bucket_seconds = bucket_seconds
+        self.bucket_count = bucket_count
+        self.half_life = half_life
+        self.buckets = {}
+
+    def _expire(self, current):
+        oldest = current - self.bucket_count + 1
+        for index in [index for index in self.buckets if index < oldest]:
+            del self.buckets[index]
+
+    def add(self, item_id, weight, now):
+        current = int(now // self.bucket_seconds)
+        bucket = self.buckets.setdefault(current, {})
+        bucket[item_id] = bucket.get(item_id, 0.0) + weight
+        self._expire(current)
+
+    def scores(self, now):
+        current = int(now // self.bucket_seconds)
+        self._expire(current)
+        return _decayed_totals(self.buckets, current, self.bucket_seconds, self.half_life)
+
+    def to_dict(self):
+        return {str(index): bucket for index, bucket in self.buckets.items()}
+
+    def load(self, data):
+        self.buckets = {int(index): bucket for index, bucket in data.items()}
+
+
+class RedisWindows:
+    def __init__(self, client, bucket_seconds, bucket_count, half_life, prefix="trending:"):
+        self.client = client
+        self.bucket_seconds = bucket_seconds
+        self.bucket_count = bucket_count
+        self.half_life = half_life
+        self.prefix = prefix
+
+    def _key(self, kind, index):
+        return f"{self.prefix}{kind}:{index}"
+
+    def add(self, kind, item_id, weight, now):
+        key = self._key(kind, int(now // self.bucket_seconds))
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hincrbyfloat(key, item_id, weight)
+        # A bucket outlives the window by one bucket, so no reader finds it half-expired
+        pipe.expire(key, self.bucket_seconds * (self.bucket_count + 1))
+        pipe.execute()
+
+    def scores(self, kind, now):
+        current = int(now // self.bucket_seconds)
+        indexes = range(current - self.bucket_count + 1, current + 1)
+        pipe = self.client.pipeline(transaction=False)
+        for index in indexes:
+            pipe.hgetall(self._key(kind, index))
+        buckets = {
+            index: {item_id.decode(): float(score) for item_id, score in bucket.items()}
+            for index, bucket in zip(indexes, pipe.execute()) if bucket
+        }
+        return _decayed_totals(buckets, current, self.bucket_seconds, self.half_life)
+
+
+class Trending:
+    def __init__(self, app=None):
+        self.lock = threading.Lock()
+        self.windows = {}
+        self.rankings = {}
+        self.refreshed_at = 0.0
+        self.checkpointed_at = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.bucket_seconds = app.config["TRENDING_BUCKET_SECONDS"]
+        self.bucket_count = app.config["TRENDING_BUCKET_COUNT"]
+        self.half_life = app.config["TRENDING_HALF_LIFE"]
+        self.refresh_interval = app.config["TRENDING_REFRESH_SECONDS"]
+        self.checkpoint_interval = app.config["TRENDING_CHECKPOINT_SECONDS"]
+        self.top_n = app.config["TRENDING_TOP_N"]
+        self.redis = None
+        self.checkpoint_path = None
+
+        if app.config["TRENDING_BACKEND"] == "redis":
+            client = app.config.get("SESSION_REDIS") or redis_for(app)
+            self.redis = RedisWindows(client, self.bucket_seconds, self.bucket_count, self.half_life)
+        else:
+            self.checkpoint_path = app.config["TRENDING_CHECKPOINT_PATH"]
+            if self.checkpoint_path and not os.path.isabs(self.checkpoint_path):
+                os.makedirs(app.instance_path, exist_ok=True)
+                self.checkpoint_path = os.path.join(app.instance_path, self.checkpoint_path)
+
+        with self.lock:
+            self.windows = {}
+            self.rankings = {}
+            self.refreshed_at = 0.0
+            self._load()
+
+        if self.checkpoint_path:
+            atexit.register(self.checkpoint)
+
+    def _window(self, kind):
+        window = self.windows.get(kind)
+        if window is None:
+            window = self.windows[kind] = SlidingWindow(self.bucket_seconds, self.bucket_count, self.half_life)
+        return window
+
+    def record(self, kind, item_id, event, now=None):
+        now = time.time() if now is None else now
+        if self.redis is not None:
+            try:
+                self.redis.add(kind, item_id, EVENT_WEIGHTS[event], now)
+            except Exception as e:
+                # Losing one event is better than failing the like or comment that caused it
+                print(f"Trending store unavailable: {e}")
+            return
+
+        with self.lock:
+            self._window(kind).add(item_id, EVENT_WEIGHTS[event], now)
+            if self.checkpoint_path and now - self.checkpointed_at >= self.checkpoint_interval:
+                self._checkpoint(now)
+
+    def top(self, kind, limit=20):
+        now = time.time()
+        # One reader re-ranks while the others keep serving the previous ranking
+        if now - self.refreshed_at >= self.refresh_interval and self.lock.acquire(blocking=False):
+            try:
+                self._refresh(now)
+            finally:
+                self.lock.release()
+        return self.rankings.get(kind, [])[:limit]
+
+    def refresh(self, now=None):
+        with self.lock:
+            self._refresh(time.time() if now is None else now)
+
+    def _scores(self, kind, now):
+        if self.redis is not None:
+            return self.redis.scores(kind, now)
+        return self._window(kind).scores(now)
+
+    def _refresh(self, now):
+        rankings = {}
+        for kind in KINDS:
+            try:
+                scores = self._scores(kind, now)
+            except Exception as e:
+                # Keep serving the last ranking and try again next interval
+                print(f"Trending store unavailable: {e}")
+                self.refreshed_at = now
+                return
+            ranked = sorted((item for item in scores.items() if item[1] > 0), key=lambda item: item[1], reverse=True)
+            rankings[kind] = ranked[:self.top_n]
+        # Swapped in one assignment so readers never see a half-built ranking
+        self.rankings = rankings
+        self.refreshed_at = now
+
+    def checkpoint(self):
+        with self.lock:
+            self._checkpoint(time.time())
+
+    def _checkpoint(self, now):
+        data = {kind: window.to_dict() for kind, window in self.windows.items()}
+        temp_path = f"{self.checkpoint_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as checkpoint:
+            json.dump(data, checkpoint)
+        os.replace(temp_path, self.checkpoint_path)
+        self.checkpointed_at = now
+
+    def _load(self):
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return
+
+        with open(self.checkpoint_path) as checkpoint:
+            data = json.load(checkpoint)
+        for kind, buckets in data.items():
+            self._window(kind).load(buckets)
+
+
+trending = Trending()
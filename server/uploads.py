@@ -0,0 +1,197 @@
+import hashlib
+import os
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no flock; part files are locked through msvcrt instead
+    fcntl = None
+    import msvcrt
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from werkzeug.utils import secure_filename
+from models import db, Upload
+from tasks import ASSETS_DIR
+
+
+# ---------------- Chunked uploads ----------------
+#
+# A client creates an upload with the file's name, size and optionally its
+# SHA-256, then PATCHes the bytes in chunks, each starting at the offset the
+# server last committed. Chunks are streamed to a .part file through a buffer
+# of UPLOAD_BUFFER_SIZE bytes and fsynced before the offset moves, so a dropped
+# connection resumes from the last whole chunk. Part files live in
+# UPLOAD_PARTS_DIR, outside the served assets, so nobody can fetch a file
+# before it is checked. When the last byte arrives the file is checked and
+# renamed into the assets directory in one step, and posts and profiles refer
+# to it by upload id.
+
+class UploadError(Exception):
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def upload_root():
+    return current_app.config["UPLOAD_ROOT"] or ASSETS_DIR
+
+
+def parts_dir():
+    return current_app.config["UPLOAD_PARTS_DIR"] or os.path.join(current_app.instance_path, "uploads")
+
+
+def _part_path(upload):
+    return os.path.join(parts_dir(), f"{upload.id}.part")
+
+
+@contextmanager
+def _locked(part):
+    # Exclusive and non-blocking, so a second writer is refused rather than queued
+    if fcntl is not None:
+        try:
+            fcntl.flock(part, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadError("Another chunk is being written", 409)
+        yield
+        return
+
+    part.seek(0)
+    try:
+        msvcrt.locking(part.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        raise UploadError("Another chunk is being written", 409)
+    try:
+        yield
+    finally:
+        part.seek(0)
+        msvcrt.locking(part.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _final_name(upload):
+    _, extension = os.path.splitext(secure_filename(upload.filename))
+    return f"{upload.id}{extension.lower()}"
+
+
+def create_upload(user_id, filename, size, sha256=None):
+    if not filename or not secure_filename(filename):
+        raise UploadError("A filename is required", 400)
+    if not isinstance(size, int) or size <= 0:
+        raise UploadError("Size must be a positive number of bytes", 400)
+    if size > current_app.config["UPLOAD_MAX_SIZE"]:
+        raise UploadError("File is too large", 413)
+
+    upload = Upload(user_id=user_id, filename=filename, size=size, sha256=sha256.lower() if sha256 else None)
+    db.session.add(upload)
+    db.session.commit()
+
+    os.makedirs(os.path.dirname(_part_path(upload)), exist_ok=True)
+    open(_part_path(upload), "wb").close()
+    return upload
+
+
+def write_chunk(upload, offset, stream, length, checksum=None):
+    """Append length bytes read from stream at offset and return the upload.
+
+    The chunk is only committed once all of it has arrived, matched checksum
+    (hex SHA-256, when given) and reached the disk; anything else leaves the
+    upload at its previous offset.
+    """
+    config = current_app.config
+    if upload.status != "pending":
+        raise UploadError(f"Upload is {upload.status}", 409)
+    if length is None:
+        raise UploadError("Content-Length is required", 411)
+    if length > config["UPLOAD_MAX_CHUNK"]:
+        raise UploadError("Chunk is too large", 413)
+    if offset + length > upload.size:
+        raise UploadError("Chunk runs past the end of the file", 400)
+
+    with open(_part_path(upload), "r+b") as part, _locked(part):
+        # Another worker may have committed a chunk while this one waited
+        db.session.refresh(upload)
+        if offset != upload.offset:
+            raise UploadError(f"Expected offset {upload.offset}", 409)
+
+        # Bytes past the committed offset belong to an interrupted chunk
+        part.truncate(offset)
+        part.seek(offset)
+
+        digest = hashlib.sha256()
+        remaining = length
+        while remaining:
+            data = stream.read(min(config["UPLOAD_BUFFER_SIZE"], remaining))
+            if not data:
+                break
+            part.write(data)
+            digest.update(data)
+            remaining -= len(data)
+
+        if remaining:
+            part.truncate(offset)
+            raise UploadError("Chunk ended early", 400)
+        if checksum and digest.hexdigest() != checksum.lower():
+            part.truncate(offset)
+            raise UploadError("Chunk checksum mismatch", 422)
+
+        part.flush()
+        os.fsync(part.fileno())
+        upload.offset = offset + length
+        db.session.commit()
+
+    if upload.offset == upload.size:
+        finalize(upload)
+    return upload
+
+
+def finalize(upload):
+    part_path = _part_path(upload)
+    final_name = _final_name(upload)
+    final_path = os.path.join(upload_root(), final_name)
+
+    # A crash after the rename leaves the row pending with the file in place
+    if os.path.exists(part_path):
+        digest = hashlib.sha256()
+        with open(part_path, "rb") as part:
+            while data := part.read(current_app.config["UPLOAD_BUFFER_SIZE"]):
+                digest.update(data)
+
+        if upload.sha256 and digest.hexdigest() != upload.sha256:
+            os.remove(part_path)
+            upload.status = "failed"
+            db.session.commit()
+            raise UploadError("File checksum mismatch", 422)
+
+        os.replace(part_path, final_path)
+
+    upload.status = "complete"
+    upload.path = final_name
+    db.session.commit()
+
+
+def completed_upload(user_id, upload_id):
+    """Return the asset name of a finished upload owned by user_id, or None."""
+    upload = Upload.query.filter_by(id=upload_id, user_id=user_id, status="complete").first()
+    return upload.path if upload else None
+
+
+# ---------------- CLI ----------------
+
+uploads_cli = AppGroup("uploads", help="Maintain chunked uploads.")
+
+
+@uploads_cli.command("prune")
+@click.option("--older-than", default=24, help="Hours without progress before an upload is abandoned.")
+def prune_command(older_than):
+    cutoff = datetime.utcnow() - timedelta(hours=older_than)
+    stale = Upload.query.filter(Upload.status.in_(("pending", "failed")), Upload.updated_at < cutoff).all()
+
+    for upload in stale:
+        if os.path.exists(_part_path(upload)):
+            os.remove(_part_path(upload))
+        db.session.delete(upload)
+    db.session.commit()
+    click.echo(f"Pruned {len(stale)} uploads.", err=True)
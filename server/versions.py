@@ -0,0 +1,95 @@
+import threading
+from collections import OrderedDict
+
+
+# ---------------- Versioned caches ----------------
+#
+# A VersionedCache is a per-worker LRU whose entries are only trusted while
+# their version matches the one in a store every worker can see (Redis, or the
+# process itself in memory mode). Writers publish the new version after they
+# commit, which invalidates every worker's copy without any messaging; readers
+# fetch all the versions they need in one round trip and reload the
+# mismatches from the database in one batch.
+
+class MemoryVersions:
+    def __init__(self):
+        self.versions = {}
+
+    def get_many(self, keys):
+        return [self.versions.get(key) for key in keys]
+
+    def publish(self, key, version, only_if_missing=False):
+        if only_if_missing:
+            self.versions.setdefault(key, version)
+        else:
+            self.versions[key] = version
+
+
+class RedisVersions:
+    def __init__(self, client, ttl, prefix):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get_many(self, keys):
+        values = self.client.mget([self.prefix + key for key in keys])
+        return [int(value) if value is not None else None for value in values]
+
+    def publish(self, key, version, only_if_missing=False):
+        # Readers only fill gaps, so a slow reader can never roll back a writer's version
+        self.client.set(self.prefix + key, version, ex=self.ttl, nx=only_if_missing)
+
+
+class VersionedCache:
+    def __init__(self, versions, max_entries):
+        self.versions = versions
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _remember(self, key, version, value):
+        with self.lock:
+            self.entries[key] = (version, value)
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def publish(self, key, version, only_if_missing=False):
+        try:
+            self.versions.publish(key, version, only_if_missing)
+        except Exception as e:
+            print(f"Version store unavailable: {e}")
+
+    def get_many(self, keys, load):
+        """Return {key: (version, value)}, calling load(missing_keys) for the
+        entries that are absent or stale. load returns the same mapping and
+        may leave out keys that do not exist."""
+        keys = list(dict.fromkeys(keys))
+        try:
+            versions = self.versions.get_many(keys)
+        except Exception as e:
+            # Without the version store the cache can't be trusted; read through
+            print(f"Version store unavailable: {e}")
+            versions = [None] * len(keys)
+
+        found, misses = {}, []
+        with self.lock:
+            for key, version in zip(keys, versions):
+                entry = self.entries.get(key)
+                if entry is not None and version is not None and entry[0] == version:
+                    self.entries.move_to_end(key)
+                    found[key] = entry
+                else:
+                    misses.append(key)
+
+        if misses:
+            for key, (version, value) in load(misses).items():
+                found[key] = (version, value)
+                self._remember(key, version, value)
+                self.publish(key, version, only_if_missing=True)
+
+        return {key: found[key] for key in keys if key in found}
+
+    def update(self, key, version, value):
+        self._remember(key, version, value)
+        self.publish(key, version)